@@ -0,0 +1,113 @@
+"""
+Archival of past appointments.
+
+``ghl_appointments`` only needs to hold appointments that are upcoming or
+recent; everything the list, availability and feed endpoints read lives
+there. Appointments that ended more than APPOINTMENT_ARCHIVE_AFTER_DAYS ago
+are moved, in batches, to ``ghl_appointments_archive`` (same ids), keeping
+the hot table and its indexes bounded.
+
+A row is left in place while something still depends on it:
+
+- tombstones GHL hasn't confirmed yet (the reconciliation worker needs them)
+  or that change feed cursors may not have seen yet
+- occurrences of recurring groups that are still running, being deleted or
+  not fully materialized, since series state (EXDATEs, overrides,
+  materialized_count) is derived from the group's rows
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from . import changes
+from .caching import bump_location_version
+from .models import ArchivedAppointment, GHLAppointment
+
+
+ARCHIVE_FIELDS = [
+    'id', 'ghl_appointment_id', 'contact_id', 'recurring_group_id', 'occurrence_number',
+    'assigned_to', 'calendar_id', 'location_id', 'title', 'description', 'start_time',
+    'end_time', 'status', 'created_at', 'updated_at', 'is_active', 'deleted_at', 'ghl_deleted_at',
+]
+
+
+def archive_cutoff(now=None):
+    return (now or timezone.now()) - timedelta(days=settings.APPOINTMENT_ARCHIVE_AFTER_DAYS)
+
+
+def archivable(cutoff, now=None):
+    """Appointments that ended before ``cutoff`` and nothing depends on anymore"""
+    now = now or timezone.now()
+    running = GHLAppointment.objects.filter(
+        recurring_group_id=OuterRef('recurring_group_id'),
+        end_time__gte=cutoff
+    )
+    finished_group = Q(recurring_group__is_deleting=False) & (
+        Q(recurring_group__is_active=False) |
+        Q(recurring_group__materialized_count__gte=F('recurring_group__total_count'))
+    )
+
+    return GHLAppointment.objects.filter(
+        Q(is_active=True) |
+        Q(ghl_deleted_at__isnull=False, updated_at__lt=now - changes.RETENTION),
+        end_time__lt=cutoff,
+    ).filter(
+        Q(recurring_group__isnull=True) | (finished_group & ~Exists(running))
+    )
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Move up to ``batch_size`` archivable appointments in one transaction.
+
+    Rows locked by other transactions are skipped and picked up by a later
+    batch.
+
+    Returns:
+        Number of appointments moved
+    """
+    with transaction.atomic():
+        ids = list(
+            archivable(cutoff)
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        rows = list(GHLAppointment.objects.filter(id__in=ids).values(*ARCHIVE_FIELDS))
+        # Rows already archived by an interrupted run are kept as they are
+        ArchivedAppointment.objects.bulk_create(
+            [ArchivedAppointment(**row) for row in rows],
+            ignore_conflicts=True
+        )
+        GHLAppointment.objects.filter(id__in=ids).delete()
+
+        location_ids = {row['location_id'] for row in rows}
+        transaction.on_commit(lambda: bump_location_version(*location_ids))
+    return len(ids)
+
+
+def archive_appointments(cutoff=None, batch_size=None, max_batches=None):
+    """
+    Archive appointments that ended before ``cutoff`` batch by batch, each
+    batch committing on its own so locks stay short.
+
+    Returns:
+        Number of appointments moved
+    """
+    cutoff = cutoff or archive_cutoff()
+    batch_size = batch_size or settings.APPOINTMENT_ARCHIVE_BATCH_SIZE
+
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        moved += count
+        batches += 1
+        if count < batch_size:
+            break
+    return moved
@@ -0,0 +1,173 @@
+"""
+Availability index over local appointments.
+
+Busy time per assigned user comes from a single range query on
+``ghl_appointments`` backed by the (assigned_to, start_time, end_time)
+partial index. Overlaps between proposed and existing intervals are then
+found with a sweep line per user, so checking a whole recurring series
+costs one query no matter how many occurrences it has.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+from .models import GHLAppointment
+
+
+class AppointmentConflictError(ValueError):
+    """Raised when a booking overlaps existing appointments of its users"""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f"{len(conflicts)} scheduling conflict(s) found")
+
+
+def get_busy_intervals(user_ids, window_start, window_end, exclude_ids=(), location_id=None):
+    """
+    Active appointments of ``user_ids`` overlapping [window_start, window_end).
+
+    Returns:
+        Dict of user_id -> list of (start, end, appointment_id) sorted by start
+    """
+    busy = defaultdict(list)
+    if not user_ids:
+        return busy
+
+    rows = GHLAppointment.objects.filter(
+        assigned_to__in=user_ids,
+        is_active=True,
+        start_time__lt=window_end,
+        end_time__gt=window_start
+    )
+    if location_id:
+        rows = rows.filter(location_id=location_id)
+    rows = rows.exclude(
+        id__in=exclude_ids
+    ).order_by('assigned_to', 'start_time').values_list('assigned_to', 'start_time', 'end_time', 'id')
+
+    for user_id, start, end, appointment_id in rows:
+        busy[user_id].append((start, end, appointment_id))
+    return busy
+
+
+def _overlaps(proposed, existing):
+    """
+    Sweep two start-sorted interval lists and yield overlapping pairs.
+
+    ``proposed`` holds (start, end) tuples, ``existing`` (start, end, id).
+    """
+    active = []
+    j = 0
+    for proposed_start, proposed_end in proposed:
+        while j < len(existing) and existing[j][0] < proposed_end:
+            heapq.heappush(active, (existing[j][1], j))
+            j += 1
+        # Proposals are start-sorted, so anything ending before this one starts is done
+        while active and active[0][0] <= proposed_start:
+            heapq.heappop(active)
+        for _, index in active:
+            if existing[index][0] < proposed_end:
+                yield (proposed_start, proposed_end), existing[index]
+
+
+def find_conflicts(user_ids, intervals, exclude_ids=()):
+    """
+    Check proposed (start, end) intervals for every user against existing
+    appointments with one query.
+
+    Returns:
+        List of conflict dicts, empty when the booking is free
+    """
+    intervals = sorted(intervals)
+    if not intervals or not user_ids:
+        return []
+
+    window_start = intervals[0][0]
+    window_end = max(end for _, end in intervals)
+    busy = get_busy_intervals(user_ids, window_start, window_end, exclude_ids)
+
+    conflicts = []
+    for user_id in user_ids:
+        for (start, end), (busy_start, busy_end, appointment_id) in _overlaps(intervals, busy.get(user_id, [])):
+            conflicts.append({
+                'user_id': user_id,
+                'start_time': start.isoformat(),
+                'end_time': end.isoformat(),
+                'conflicting_appointment_id': appointment_id,
+                'conflicting_start_time': busy_start.isoformat(),
+                'conflicting_end_time': busy_end.isoformat(),
+            })
+    return conflicts
+
+
+def merge_intervals(intervals, window_start=None, window_end=None):
+    """
+    Merge start-sorted (start, end, ...) intervals into disjoint (start, end)
+    blocks, clipped to the window when given. Touching intervals are joined.
+    """
+    merged = []
+    for start, end, *_ in intervals:
+        if window_start is not None:
+            start = max(start, window_start)
+        if window_end is not None:
+            end = min(end, window_end)
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_intervals(busy, window_start, window_end):
+    """Gaps between merged busy blocks inside [window_start, window_end)"""
+    free = []
+    cursor = window_start
+    for start, end in busy:
+        if start > cursor:
+            free.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < window_end:
+        free.append((cursor, window_end))
+    return free
+
+
+def split_slots(free, slot_length):
+    """Cut free intervals into back-to-back slots of ``slot_length``"""
+    slots = []
+    for start, end in free:
+        while start + slot_length <= end:
+            slots.append((start, start + slot_length))
+            start += slot_length
+    return slots
+
+
+def get_free_busy(user_ids, window_start, window_end, location_id=None, slot_minutes=None):
+    """
+    Merged busy blocks and open time per user, plus the union across all of
+    them, computed from a single indexed query.
+
+    Returns:
+        Dict with 'users' (user_id -> {'busy', 'free'[, 'slots']}) and
+        'combined' ({'busy', 'free'[, 'slots']} where every user is free)
+    """
+    busy_by_user = get_busy_intervals(user_ids, window_start, window_end, location_id=location_id)
+    slot_length = timedelta(minutes=slot_minutes) if slot_minutes else None
+
+    def describe(busy):
+        free = free_intervals(busy, window_start, window_end)
+        result = {'busy': busy, 'free': free}
+        if slot_length:
+            result['slots'] = split_slots(free, slot_length)
+        return result
+
+    users = {}
+    for user_id in user_ids:
+        users[user_id] = describe(merge_intervals(busy_by_user.get(user_id, []), window_start, window_end))
+
+    # Every user's blocks are already merged and sorted; k-way merge them
+    combined_busy = merge_intervals(heapq.merge(*(result['busy'] for result in users.values())))
+
+    return {'users': users, 'combined': describe(combined_busy)}
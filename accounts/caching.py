@@ -0,0 +1,149 @@
+"""
+Versioned response cache for read-heavy endpoints.
+
+Cached responses are keyed by endpoint, location, query parameters and the
+location's cache version. Service writes (booking, update, delete, webhook,
+sync) call ``bump_location_version`` instead of deleting keys, which
+retires every cached response of that location at once. Endpoints not
+scoped to a location use the global version, which every bump also
+increments.
+
+List endpoints also answer conditional requests: ``conditional_list``
+derives an ETag and Last-Modified from max(updated_at) and the row count of
+the view's filtered queryset, so unchanged lists cost one aggregate query
+and return 304 without serializing anything.
+
+Responses read from the replica (see calendar_app.db_routing) right after
+a bump may predate the write that caused it; they are served but not
+cached, so a lagging replica can't pin stale data under a fresh version.
+"""
+import functools
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from calendar_app.db_routing import pin_to_primary, pinned_to_primary, reading_from_replica
+
+
+RESPONSE_CACHE_TIMEOUT = 300
+
+
+def _version_key(location_id=None):
+    return f"cache-version:{location_id or 'all'}"
+
+
+def get_location_version(location_id=None):
+    version = cache.get(_version_key(location_id))
+    if version is None:
+        # Start from the clock so a lost counter never reuses an old version
+        cache.add(_version_key(location_id), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(location_id))
+    return version
+
+
+def bump_location_version(*location_ids):
+    """Invalidate cached responses of the given locations and all unscoped ones"""
+    keys = {_version_key(location_id) for location_id in location_ids if location_id}
+    keys.add(_version_key())
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+    # Reads of these locations go to the primary until the replica caught up
+    pin_to_primary(location_ids={*filter(None, location_ids), None})
+
+
+def recently_bumped(location_id=None):
+    """Whether the version changed within the replica lag allowance"""
+    return pinned_to_primary(location_ids={location_id, None})
+
+
+def response_cache_key(prefix, request, location_id=None):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f"response:{prefix}:{location_id or 'all'}:{get_location_version(location_id)}:{digest}"
+
+
+def cache_response(prefix, location_kwarg=None, location_param='location_id', timeout=RESPONSE_CACHE_TIMEOUT):
+    """
+    Cache successful responses of a view's ``get``.
+
+    The location comes from the URL kwarg ``location_kwarg`` or else the
+    ``location_param`` query parameter; without one the global version is used.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            location_id = (kwargs.get(location_kwarg) if location_kwarg else None) or request.query_params.get(location_param)
+            key = response_cache_key(prefix, request, location_id)
+
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200 and not (reading_from_replica() and recently_bumped(location_id)):
+                cache.set(key, response.data, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def list_validator(queryset, request, location_id=None):
+    """
+    (etag, last_modified) of a filtered list.
+
+    The location's cache version is folded in so writes that don't touch
+    the listed rows (e.g. user renames shown next to appointments) still
+    change the ETag.
+    """
+    stats = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    last_modified = stats['last_modified']
+
+    raw = "|".join([
+        request.get_full_path(),
+        str(stats['count']),
+        last_modified.isoformat() if last_modified else '',
+        str(get_location_version(location_id)),
+    ])
+    return f'"{hashlib.md5(raw.encode()).hexdigest()}"', last_modified
+
+
+def conditional_list(location_param='location_id'):
+    """
+    ETag/Last-Modified support for a list view's ``get``.
+
+    The view must provide ``get_queryset`` (and ``filter_queryset`` when it
+    has one) returning exactly the rows the response lists. Apply it outside
+    ``cache_response`` so cached responses carry the validators too.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            queryset = view.get_queryset()
+            if hasattr(view, 'filter_queryset'):
+                queryset = view.filter_queryset(queryset)
+            etag, last_modified = list_validator(queryset, request, request.query_params.get(location_param))
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            # Clients may keep the list but must revalidate before using it
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
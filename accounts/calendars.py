@@ -0,0 +1,138 @@
+"""
+Calendar discovery for GHL locations.
+
+One ``/calendars/`` request per location returns every calendar with its
+team members. From that a user -> calendar map is built, cached, and written
+to ``GHLUser.calendar_id`` in bulk for users that don't have a calendar yet,
+so bookings no longer depend on calendars being assigned by hand.
+"""
+import requests
+from django.core.cache import cache
+from django.db import transaction
+
+from ghl_auth import token_provider
+from .caching import bump_location_version
+from .locations import fan_out_locations
+from .models import GHLUser
+
+
+CALENDARS_URL = "https://services.leadconnectorhq.com/calendars/"
+
+# Discovery runs hourly; the cached map outlives one missed run
+CALENDAR_MAP_TIMEOUT = 2 * 60 * 60
+
+
+def calendar_map_key(location_id):
+    return f"calendar-map:{location_id}"
+
+
+def fetch_location_calendars(location_id):
+    """Every calendar of a location, including its team members"""
+    headers = {
+        "Accept": "application/json",
+        "Authorization": f"Bearer {token_provider.get_access_token(location_id)}",
+        "Version": "2021-04-15"
+    }
+
+    response = requests.get(CALENDARS_URL, headers=headers, params={"locationId": location_id})
+    if response.status_code != 200:
+        raise ValueError(f"Failed to fetch calendars: {response.status_code} - {response.text}")
+
+    return response.json().get("calendars", [])
+
+
+def build_user_calendar_map(calendars):
+    """
+    Pick one calendar per team member.
+
+    A user's personal calendar wins, then a calendar listing them as primary,
+    then the first active calendar they belong to.
+    """
+    ranked = {}
+    for calendar in calendars:
+        if calendar.get("isActive") is False:
+            continue
+
+        members = calendar.get("teamMembers") or []
+        for member in members:
+            user_id = member.get("userId")
+            if not user_id:
+                continue
+
+            if calendar.get("calendarType") == "personal" and len(members) == 1:
+                rank = 0
+            elif member.get("isPrimary"):
+                rank = 1
+            else:
+                rank = 2
+
+            if user_id not in ranked or rank < ranked[user_id][0]:
+                ranked[user_id] = (rank, calendar["id"])
+
+    return {user_id: calendar_id for user_id, (_, calendar_id) in ranked.items()}
+
+
+def apply_calendar_map(location_id, calendar_map, overwrite=False):
+    """
+    Write discovered calendars to the location's users in one bulk update.
+
+    Calendars assigned by hand are kept unless ``overwrite`` is set.
+
+    Returns:
+        Number of users updated
+    """
+    users = GHLUser.objects.filter(location_id=location_id, user_id__in=list(calendar_map))
+    if not overwrite:
+        users = users.filter(calendar_id__isnull=True) | users.filter(calendar_id='')
+
+    changed = []
+    for user in users:
+        if user.calendar_id != calendar_map[user.user_id]:
+            user.calendar_id = calendar_map[user.user_id]
+            changed.append(user)
+
+    if changed:
+        with transaction.atomic():
+            GHLUser.objects.bulk_update(changed, ['calendar_id'], batch_size=500)
+        bump_location_version(location_id)
+
+    return len(changed)
+
+
+def discover_calendars(location_id, calendars=None, overwrite=False):
+    """
+    Map a location's users to calendars, cache the map and fill in missing
+    ``GHLUser.calendar_id`` values.
+
+    Returns:
+        (calendar_map, users_updated)
+    """
+    if calendars is None:
+        calendars = fetch_location_calendars(location_id)
+
+    calendar_map = build_user_calendar_map(calendars)
+    cache.set(calendar_map_key(location_id), calendar_map, CALENDAR_MAP_TIMEOUT)
+
+    return calendar_map, apply_calendar_map(location_id, calendar_map, overwrite)
+
+
+def get_user_calendar_map(location_id):
+    """Cached user -> calendar map of a location, discovered on a miss"""
+    calendar_map = cache.get(calendar_map_key(location_id))
+    if calendar_map is None:
+        calendar_map, _ = discover_calendars(location_id)
+    return calendar_map
+
+
+def discover_all_calendars(location_ids=None):
+    """
+    Run discovery for every approved location (or ``location_ids``),
+    fetching calendars from GHL concurrently.
+
+    Returns:
+        Dict of location_id -> users updated, or the error message
+    """
+    def write(location_id, calendars):
+        return discover_calendars(location_id, calendars=calendars)[1]
+
+    return fan_out_locations(fetch_location_calendars, write, location_ids)
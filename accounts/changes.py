@@ -0,0 +1,157 @@
+"""
+Appointment change feed.
+
+Clients poll ``appointments/changes/?location_id=...&since=<cursor>`` and get
+the appointments of a location created or updated after the cursor, plus
+deletions. Soft-deleted rows show up as tombstones through their
+``updated_at``; rows removed outright come from ``appointment_deletion_log``.
+
+The cursor is opaque to clients. It holds a keyset position per stream,
+(updated_at, id) for appointments and (deleted_at, id) for the log, so rows
+sharing a timestamp (bulk updates stamp them alike) are never skipped or
+repeated across pages. Rows younger than SETTLE_DELAY are held back so a
+transaction that commits late cannot land behind a cursor.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AppointmentDeletionLog, GHLAppointment
+
+
+PAGE_SIZE = 200
+SETTLE_DELAY = timedelta(seconds=5)
+
+# Tombstones and deletion log entries are kept this long; older cursors
+# may have missed deletions and must reload
+RETENTION = timedelta(days=30)
+
+
+class CursorError(ValueError):
+    """Raised for cursors that can't be decoded"""
+
+
+class CursorExpired(CursorError):
+    """Raised for cursors older than RETENTION"""
+
+
+def encode_cursor(position):
+    payload = {stream: [ts.isoformat(), pk] for stream, (ts, pk) in position.items()}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position = {
+            stream: (datetime.fromisoformat(payload[stream][0]), int(payload[stream][1]))
+            for stream in ('appointments', 'deletions')
+        }
+    except (ValueError, TypeError, KeyError, IndexError):
+        raise CursorError("Invalid cursor")
+
+    if any(timezone.is_naive(ts) for ts, _ in position.values()):
+        raise CursorError("Invalid cursor")
+    return position
+
+
+def _after(queryset, field, position):
+    ts, pk = position
+    return queryset.filter(Q(**{f'{field}__gt': ts}) | Q(**{field: ts, 'id__gt': pk}))
+
+
+def _page(queryset, field, position, settled, limit):
+    """
+    Up to ``limit`` rows after ``position`` and the position to resume from.
+
+    A stream that was read to the end resumes from ``settled``, so idle
+    cursors keep moving forward.
+    """
+    rows = list(
+        _after(queryset.filter(**{f'{field}__lt': settled}), field, position)
+        .order_by(field, 'id')[:limit + 1]
+    )
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (getattr(rows[-1], field), rows[-1].id), True
+    return rows, (settled, 0), False
+
+
+def get_changes(location_id, cursor=None, limit=PAGE_SIZE):
+    """
+    Changes of a location since ``cursor``.
+
+    Without a cursor nothing is returned, only a cursor for "now", to be
+    taken right before the client loads the full list.
+
+    Returns:
+        Dict with 'changed' (active GHLAppointments), 'deleted' (dicts with
+        id, ghl_appointment_id and deleted_at), 'cursor' and 'has_more'
+    """
+    now = timezone.now()
+    settled = now - SETTLE_DELAY
+
+    if not cursor:
+        position = {'appointments': (settled, 0), 'deletions': (settled, 0)}
+        return {'changed': [], 'deleted': [], 'cursor': encode_cursor(position), 'has_more': False}
+
+    position = decode_cursor(cursor)
+    if min(ts for ts, _ in position.values()) < now - RETENTION:
+        raise CursorExpired("Cursor expired, reload the full list")
+
+    appointments, appointments_position, more_appointments = _page(
+        GHLAppointment.objects.filter(location_id=location_id),
+        'updated_at', position['appointments'], settled, limit
+    )
+    logs, deletions_position, more_deletions = _page(
+        AppointmentDeletionLog.objects.filter(location_id=location_id),
+        'deleted_at', position['deletions'], settled, limit
+    )
+
+    deleted = [
+        {
+            'id': appointment.id,
+            'ghl_appointment_id': appointment.ghl_appointment_id,
+            'deleted_at': appointment.deleted_at or appointment.updated_at,
+        }
+        for appointment in appointments if not appointment.is_active
+    ] + [
+        {
+            'id': log.appointment_id,
+            'ghl_appointment_id': log.ghl_appointment_id,
+            'deleted_at': log.deleted_at,
+        }
+        for log in logs
+    ]
+
+    return {
+        'changed': [appointment for appointment in appointments if appointment.is_active],
+        'deleted': deleted,
+        'cursor': encode_cursor({'appointments': appointments_position, 'deletions': deletions_position}),
+        'has_more': more_appointments or more_deletions,
+    }
+
+
+def log_deletions(appointments):
+    """Record appointments that are about to be deleted outright"""
+    now = timezone.now()
+    AppointmentDeletionLog.objects.bulk_create([
+        AppointmentDeletionLog(
+            appointment_id=appointment_id,
+            ghl_appointment_id=ghl_appointment_id,
+            location_id=location_id,
+            deleted_at=now
+        )
+        for appointment_id, ghl_appointment_id, location_id
+        in appointments.values_list('id', 'ghl_appointment_id', 'location_id')
+    ], batch_size=1000)
+
+
+def prune_deletion_log():
+    """Drop log entries no valid cursor can still need"""
+    deleted, _ = AppointmentDeletionLog.objects.filter(deleted_at__lt=timezone.now() - RETENTION).delete()
+    return deleted
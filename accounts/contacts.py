@@ -0,0 +1,101 @@
+"""
+Mapping and upsert of GHL contact payloads.
+
+Webhook events and the bulk contact sync both go through ``upsert_contacts``
+so they store the same fields (including tags and custom fields) and write
+with the same single-statement ``INSERT ... ON CONFLICT (contact_id) DO
+UPDATE`` per batch. Only fields present in a payload are updated.
+"""
+from collections import defaultdict
+
+from django.utils.dateparse import parse_datetime
+
+from .caching import bump_location_version
+from .models import Contact
+
+
+UPSERT_BATCH_SIZE = 500
+
+# Payload key -> Contact fields it sets
+PAYLOAD_FIELDS = {
+    'firstName': ['first_name'],
+    'lastName': ['last_name'],
+    'phone': ['phone'],
+    'email': ['email'],
+    'dnd': ['dnd'],
+    'country': ['country'],
+    'dateAdded': ['date_added', 'timestamp'],
+    'tags': ['tags'],
+    'customFields': ['custom_fields'],
+    'locationId': ['location_id'],
+}
+
+
+def contact_from_payload(item):
+    """Unsaved Contact for a GHL contact payload (API page item or webhook body)"""
+    date_added = item.get("dateAdded")
+    if isinstance(date_added, str):
+        date_added = parse_datetime(date_added)
+
+    return Contact(
+        contact_id=item.get("id"),
+        first_name=item.get("firstName"),
+        last_name=item.get("lastName"),
+        phone=item.get("phone"),
+        email=item.get("email"),
+        dnd=item.get("dnd") or False,
+        country=item.get("country"),
+        date_added=date_added or None,
+        tags=item.get("tags") or [],
+        custom_fields=item.get("customFields") or [],
+        location_id=item.get("locationId"),
+        timestamp=date_added or None
+    )
+
+
+def payload_update_fields(item):
+    """
+    Contact fields a payload carries. Partial payloads (e.g. webhook events
+    without tags) must leave the fields they don't mention as stored.
+    """
+    return tuple(field for key, fields in PAYLOAD_FIELDS.items() if key in item for field in fields)
+
+
+def upsert_contacts(items, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Insert or update contacts keyed on contact_id.
+
+    Existing contacts only get the fields present in their payload; payloads
+    carrying the same keys share one upsert statement per batch. Payloads
+    without an id are skipped; when an id repeats the last payload wins,
+    since one upsert statement cannot touch the same row twice. Cached
+    responses of the touched locations are retired afterwards.
+
+    Returns:
+        Number of contacts written
+    """
+    payloads = {}
+    for item in items:
+        if item.get("id"):
+            payloads[item["id"]] = item
+
+    by_fields = defaultdict(list)
+    for item in payloads.values():
+        by_fields[payload_update_fields(item)].append(contact_from_payload(item))
+
+    for update_fields, contacts in by_fields.items():
+        if not update_fields:
+            # Nothing to update; only contacts we don't know yet are stored
+            Contact.objects.bulk_create(contacts, batch_size=batch_size, ignore_conflicts=True)
+            continue
+        Contact.objects.bulk_create(
+            contacts,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['contact_id'],
+            update_fields=list(update_fields)
+        )
+
+    if payloads:
+        bump_location_version(*{item.get("locationId") for item in payloads.values()})
+    return len(payloads)
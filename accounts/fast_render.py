@@ -0,0 +1,112 @@
+"""
+Opt-in fast path for large appointment pages.
+
+With ``?fast=1`` the list endpoints skip ModelSerializer: rows are fetched
+with ``.values()`` into plain dicts shaped like the serializer output and
+rendered by orjson when it is installed, falling back to the standard
+library encoder. Datetimes are rendered the way DRF renders them (ISO 8601,
+UTC as ``Z``), so both paths produce the same JSON.
+"""
+import json
+from datetime import timedelta
+
+from django.db.models import F
+from rest_framework.renderers import BaseRenderer
+
+from .models import GHLAppointment, GHLUser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+APPOINTMENT_FIELDS = [field.name for field in GHLAppointment._meta.concrete_fields]
+
+# Matches the hard-coded shift of the serializers' adjusted_*_time fields
+ADJUSTED_TIME_SHIFT = timedelta(hours=5)
+
+USER_NOT_FOUND = "N/A - User Not Found"
+
+
+def is_fast(request):
+    return request.query_params.get('fast', '').lower() in ('1', 'true', 'yes')
+
+
+def _default(value):
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """Encode plain rows to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+class FastRenderMixin:
+    """Render ``?fast=1`` responses of a view with FastJSONRenderer"""
+
+    def perform_content_negotiation(self, request, force=False):
+        if is_fast(request):
+            renderer = FastJSONRenderer()
+            return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+
+
+def appointment_values(queryset):
+    """Rows shaped like AppointmentResponseSerializer"""
+    return queryset.values(*APPOINTMENT_FIELDS)
+
+
+def group_appointment_values(queryset):
+    """Rows shaped like GHLAppointmentSerializer, finished by ``with_adjusted_times``"""
+    return queryset.values(
+        'id', 'ghl_appointment_id', 'contact_id', 'recurring_group',
+        'occurrence_number', 'assigned_to', 'calendar_id', 'location_id',
+        'title', 'description', 'start_time', 'end_time', 'status',
+        'created_at', 'updated_at', 'is_active',
+        recurring_group_title=F('recurring_group__title')
+    )
+
+
+def appointment_with_user_values(queryset):
+    """Rows shaped like AppointmentWithUserSerializer, finished by ``with_user_names``"""
+    return queryset.values(
+        'id', 'ghl_appointment_id', 'contact_id', 'assigned_to', 'calendar_id',
+        'location_id', 'title', 'description', 'start_time', 'end_time',
+        'status', 'created_at', 'updated_at', 'is_active'
+    )
+
+
+def with_adjusted_times(rows):
+    # Same output as the serializers' isoformat() of the shifted value
+    for row in rows:
+        row['adjusted_start_time'] = (row['start_time'] - ADJUSTED_TIME_SHIFT).isoformat() if row['start_time'] else None
+        row['adjusted_end_time'] = (row['end_time'] - ADJUSTED_TIME_SHIFT).isoformat() if row['end_time'] else None
+    return rows
+
+
+def with_user_names(rows):
+    """Adjusted times plus assigned user names, looked up with one query"""
+    names = dict(GHLUser.objects.filter(
+        user_id__in={row['assigned_to'] for row in rows}
+    ).values_list('user_id', 'name'))
+
+    for row in with_adjusted_times(rows):
+        row['assigned_user_name'] = names.get(row['assigned_to'], USER_NOT_FOUND)
+    return rows
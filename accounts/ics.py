@@ -0,0 +1,235 @@
+"""
+iCalendar (RFC 5545) feeds of a user's or a location's appointments.
+
+Recurring groups are emitted as one RRULE VEVENT per (group, assigned user)
+instead of one VEVENT per occurrence. Occurrences that were deleted become
+EXDATEs, and occurrences that were edited on their own become override
+VEVENTs with a RECURRENCE-ID. Single appointments are plain VEVENTs.
+
+Rendered feeds are cached under a validator made of max(updated_at) and
+row counts of the feed's rows, so a feed is rebuilt only when its own
+appointments change. The same validator is the ETag that calendar apps
+revalidate with.
+"""
+import hashlib
+from datetime import date, timedelta
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from . import recurrence
+from .models import GHLAppointment
+from .services import GHLAppointmentService
+
+
+PRODID = "-//calendar_app//Appointments//EN"
+UID_DOMAIN = "calendar-app"
+
+# Single appointments that ended longer ago than this are left out
+FEED_PAST_DAYS = 90
+FEED_CACHE_TIMEOUT = 24 * 60 * 60
+
+_signer = signing.Signer(salt='accounts.ics')
+
+
+def feed_token(kind, key):
+    """Secret for a feed URL; calendar apps can't send auth headers"""
+    return _signer.signature(f"{kind}:{key}")
+
+
+def check_feed_token(kind, key, token):
+    return bool(token) and constant_time_compare(feed_token(kind, key), token)
+
+
+def _escape(text):
+    return (
+        (text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    """Fold a content line at 75 octets without splitting UTF-8 characters"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Back off to a character boundary
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return "\r\n ".join(parts)
+
+
+def _utc(dt):
+    return dt.astimezone(recurrence.as_zoneinfo('UTC')).strftime('%Y%m%dT%H%M%SZ')
+
+
+class _Series:
+    """Date-time properties in a group's zone, or UTC when it has none"""
+
+    def __init__(self, recurring_group):
+        self.tzid = recurring_group.timezone or None
+        self.tz = recurrence.as_zoneinfo(self.tzid or 'UTC')
+
+    def prop(self, name, dt):
+        if self.tzid:
+            return f"{name};TZID={self.tzid}:{dt.astimezone(self.tz).strftime('%Y%m%dT%H%M%S')}"
+        return f"{name}:{_utc(dt)}"
+
+    def exdate(self, starts):
+        if self.tzid:
+            values = ",".join(start.astimezone(self.tz).strftime('%Y%m%dT%H%M%S') for start in starts)
+            return f"EXDATE;TZID={self.tzid}:{values}"
+        return f"EXDATE:{','.join(_utc(start) for start in starts)}"
+
+
+def _event(uid, stamp, lines):
+    return ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{_utc(stamp)}", *lines, "END:VEVENT"]
+
+
+def _single_event(appointment):
+    return _event(f"appointment-{appointment.id}@{UID_DOMAIN}", appointment.updated_at, [
+        f"DTSTART:{_utc(appointment.start_time)}",
+        f"DTEND:{_utc(appointment.end_time)}",
+        f"SUMMARY:{_escape(appointment.title)}",
+        f"DESCRIPTION:{_escape(appointment.description)}",
+    ])
+
+
+def _series_events(recurring_group, user_id, rows):
+    """Series VEVENT for one user's occurrences of a group plus its overrides"""
+    series = _Series(recurring_group)
+    uid = f"{recurring_group.group_id}-{user_id.strip() or 'shared'}@{UID_DOMAIN}"
+    start_local = recurring_group.original_start_time.astimezone(series.tz)
+    rule = (recurring_group.rrule or recurrence.build_rrule(
+        recurring_group.interval, recurring_group.every, recurring_group.total_count, start_local
+    )).strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[len("RRULE:"):]
+
+    rows_by_number = {row.occurrence_number: row for row in rows}
+    materialized = max([recurring_group.materialized_count, *rows_by_number.keys()])
+
+    # Excluded dates keep the series' local start time
+    excluded = [
+        start_local.replace(year=day.year, month=day.month, day=day.day)
+        for day in (date.fromisoformat(value) for value in recurring_group.exdates)
+    ]
+    overrides = []
+    for number, start, end in GHLAppointmentService.iter_group_occurrences(recurring_group):
+        if number > materialized:
+            break
+        row = rows_by_number.get(number)
+        if row is None or not row.is_active:
+            excluded.append(start)
+        elif (row.start_time, row.end_time, row.title, row.description or "") != (
+            start, end, recurring_group.title, recurring_group.description or ""
+        ):
+            overrides.append(_event(uid, row.updated_at, [
+                series.prop("RECURRENCE-ID", start),
+                series.prop("DTSTART", row.start_time),
+                series.prop("DTEND", row.end_time),
+                f"SUMMARY:{_escape(row.title)}",
+                f"DESCRIPTION:{_escape(row.description)}",
+            ]))
+
+    lines = [
+        series.prop("DTSTART", recurring_group.original_start_time),
+        series.prop("DTEND", recurring_group.original_end_time),
+        f"RRULE:{rule}",
+    ]
+    if excluded:
+        lines.append(series.exdate(sorted(excluded)))
+    lines += [
+        f"SUMMARY:{_escape(recurring_group.title)}",
+        f"DESCRIPTION:{_escape(recurring_group.description)}",
+    ]
+    stamp = max([recurring_group.updated_at, *(row.updated_at for row in rows)])
+    events = _event(uid, stamp, lines)
+    for override in overrides:
+        events += override
+    return events
+
+
+def feed_rows(user_id=None, location_id=None):
+    """
+    Appointments a feed is built from: active single appointments that are
+    recent or upcoming, and every row of active recurring groups (inactive
+    ones too, they become EXDATEs).
+    """
+    rows = GHLAppointment.objects.all()
+    if user_id is not None:
+        rows = rows.filter(assigned_to=user_id)
+    if location_id is not None:
+        rows = rows.filter(location_id=location_id)
+
+    cutoff = timezone.now() - timedelta(days=FEED_PAST_DAYS)
+    return rows.filter(
+        Q(recurring_group__isnull=True, is_active=True, end_time__gte=cutoff) |
+        Q(recurring_group__is_active=True, recurring_group__is_deleting=False)
+    )
+
+
+def feed_validator(rows):
+    """Cheap fingerprint of a feed's rows and their groups"""
+    stats = rows.order_by().aggregate(
+        count=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+        last_modified=Max('updated_at'),
+        group_modified=Max('recurring_group__updated_at')
+    )
+    raw = "|".join(str(stats[key]) for key in ('count', 'active', 'last_modified', 'group_modified'))
+    return hashlib.md5(raw.encode()).hexdigest(), stats['last_modified']
+
+
+def render_feed(name, rows):
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(name)}",
+    ]
+
+    series = {}
+    for row in rows.select_related('recurring_group').order_by('start_time', 'id').iterator(chunk_size=2000):
+        if row.recurring_group_id is None:
+            lines += _single_event(row)
+        else:
+            series.setdefault((row.recurring_group_id, row.assigned_to), (row.recurring_group, []))[1].append(row)
+
+    for (_, user_id), (recurring_group, group_rows) in series.items():
+        lines += _series_events(recurring_group, user_id, group_rows)
+
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
+
+
+def get_feed(kind, key, name, rows):
+    """
+    (body, etag, last_modified) of a feed, rendering it only when the
+    validator changed since it was last cached.
+    """
+    validator, last_modified = feed_validator(rows)
+    cache_key = f"ics:{kind}:{key}:{validator}"
+
+    body = cache.get(cache_key)
+    if body is None:
+        body = render_feed(name, rows)
+        cache.set(cache_key, body, FEED_CACHE_TIMEOUT)
+    return body, f'"{validator}"', last_modified
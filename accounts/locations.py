@@ -0,0 +1,46 @@
+"""
+Per-location jobs across every connected GHL location.
+
+Periodic syncs (users, calendars) fetch one location's data from GHL and
+write it locally. ``fan_out_locations`` runs the fetches concurrently, at
+most LOCATION_MAX_WORKERS locations at a time so a sync stays well inside
+GHL's rate limits, and keeps every write on the calling thread.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ghl_auth.models import GHLAuthCredentials
+
+
+# Locations fetched from GHL at the same time
+LOCATION_MAX_WORKERS = 4
+
+
+def approved_location_ids():
+    return list(GHLAuthCredentials.objects.filter(
+        is_approved=True
+    ).exclude(location_id__isnull=True).values_list('location_id', flat=True))
+
+
+def fan_out_locations(fetch, write, location_ids=None):
+    """
+    Call ``fetch(location_id)`` for every approved location (or
+    ``location_ids``) in a thread pool, then ``write(location_id, fetched)``
+    on this thread as each fetch completes.
+
+    Returns:
+        Dict of location_id -> what ``write`` returned, or the error message
+        when the fetch or the write raised
+    """
+    if location_ids is None:
+        location_ids = approved_location_ids()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=LOCATION_MAX_WORKERS) as executor:
+        futures = {executor.submit(fetch, location_id): location_id for location_id in location_ids}
+        for future in as_completed(futures):
+            location_id = futures[future]
+            try:
+                results[location_id] = write(location_id, future.result())
+            except Exception as e:
+                results[location_id] = str(e)
+    return results
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move appointments that ended more than --days ago from ghl_appointments "
+        "to ghl_appointments_archive, one transaction per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.APPOINTMENT_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.APPOINTMENT_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true', help="Only count archivable appointments")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = archive.archivable(cutoff).count()
+            self.stdout.write(f"{count} appointments ended before {cutoff:%Y-%m-%d} can be archived")
+            return
+
+        moved = archive.archive_appointments(cutoff, options['batch_size'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} appointments ended before {cutoff:%Y-%m-%d}"))
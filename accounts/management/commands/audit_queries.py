@@ -0,0 +1,149 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+
+from accounts import exports, ics
+from accounts.models import Contact, GHLAppointment, GHLUser, RecurringAppointmentGroup
+from accounts.views import (
+    AppointmentListView,
+    ContactSearchView,
+    GHLUserSearchView,
+    NonRecurringAppointmentsView,
+    RecurringAppointmentGroupListView,
+    RecurringGroupAppointmentsView,
+)
+
+# Full table scans in EXPLAIN output, per database vendor
+FULL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING)'),
+}
+
+PAGE = 20
+
+
+def view_queryset(view_class, params=None, **kwargs):
+    """The queryset a view builds for a GET with ``params``"""
+    view = view_class()
+    view.request = Request(RequestFactory().get('/', params or {}))
+    view.kwargs = kwargs
+    view.format_kwarg = None
+    queryset = view.get_queryset()
+    if hasattr(view, 'filter_queryset'):
+        queryset = view.filter_queryset(queryset)
+    return queryset
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the querysets behind the list, search, stats, export "
+        "and feed endpoints and flag sequential scans. Small tables are "
+        "scanned whatever indexes exist; use --no-seqscan (Postgres) to see "
+        "whether an index could serve each query."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location-id', help="Location to build filtered queries for")
+        parser.add_argument('--analyze', action='store_true', help="EXPLAIN ANALYZE (runs the queries)")
+        parser.add_argument('--no-seqscan', action='store_true', help="Plan with enable_seqscan off (Postgres)")
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every plan, not only flagged ones")
+        parser.add_argument('--strict', action='store_true', help="Exit with an error when a scan is flagged")
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Unsupported database vendor: {connection.vendor}")
+
+        location_id = options['location_id'] or self.sample_location()
+        flagged = []
+
+        for name, queryset in self.endpoint_querysets(location_id):
+            plan = self.explain(queryset, options)
+            scans = sorted(set(pattern.findall(plan)))
+
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f"SCAN  {name}: {', '.join(scans)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK    {name}"))
+
+            if scans or options['verbose_plans']:
+                self.stdout.write("      " + plan.replace("\n", "\n      "))
+
+        self.stdout.write(f"{len(flagged)} of the audited queries scan a whole table")
+        if flagged and options['strict']:
+            raise CommandError(f"Sequential scans in: {', '.join(flagged)}")
+
+    def explain(self, queryset, options):
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        if not (options['no_seqscan'] and connection.vendor == 'postgresql'):
+            return queryset.explain(**explain_options)
+
+        # SET LOCAL only lasts for this transaction
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            return queryset.explain(**explain_options)
+
+    @staticmethod
+    def sample_location():
+        return (
+            GHLAppointment.objects.order_by().values_list('location_id', flat=True).first()
+            or GHLUser.objects.exclude(location_id='').order_by().values_list('location_id', flat=True).first()
+            or 'audit-location'
+        )
+
+    @staticmethod
+    def endpoint_querysets(location_id):
+        """(name, queryset) of each audited endpoint query, as the endpoint runs it"""
+        now = timezone.now()
+        appointment = GHLAppointment.objects.filter(location_id=location_id).first()
+        contact_id = appointment.contact_id if appointment else 'audit-contact'
+        assigned_to = appointment.assigned_to if appointment else 'audit-user'
+
+        yield 'appointments (all)', view_queryset(AppointmentListView)
+        yield 'appointments by location', view_queryset(AppointmentListView, {'location_id': location_id})
+        yield 'appointments by contact', view_queryset(AppointmentListView, {'contact_id': contact_id})
+        yield 'appointments by user', view_queryset(AppointmentListView, {'assigned_to': assigned_to})
+        yield 'non-recurring appointments', view_queryset(NonRecurringAppointmentsView)[:PAGE]
+
+        yield 'recurring groups', view_queryset(RecurringAppointmentGroupListView)[:PAGE]
+        yield 'recurring groups by location', view_queryset(
+            RecurringAppointmentGroupListView, {'location_id': location_id}
+        )[:PAGE]
+        yield 'recurring groups by location and interval', view_queryset(
+            RecurringAppointmentGroupListView, {'location_id': location_id, 'interval': 'weekly'}
+        )[:PAGE]
+
+        group = RecurringAppointmentGroup.objects.filter(is_active=True).first()
+        if group:
+            yield 'recurring group appointments', view_queryset(
+                RecurringGroupAppointmentsView, group_id=group.group_id
+            )[:PAGE]
+
+        yield 'calendar stats users', GHLUser.objects.filter(location_id=location_id).order_by('name', 'id')[:PAGE]
+        yield 'user search', view_queryset(GHLUserSearchView, {'search': 'a'})[:PAGE]
+        yield 'contact search', view_queryset(ContactSearchView, {'search': 'a'})[:PAGE]
+
+        yield 'appointment changes', GHLAppointment.objects.filter(
+            location_id=location_id, updated_at__gt=now - timedelta(hours=1), updated_at__lt=now
+        ).order_by('updated_at', 'id')[:PAGE]
+        yield 'free/busy', GHLAppointment.objects.filter(
+            assigned_to__in=[assigned_to], is_active=True, start_time__lt=now + timedelta(days=7), end_time__gt=now
+        )
+        yield 'booking rollups window', GHLAppointment.objects.filter(
+            location_id=location_id, is_active=True,
+            start_time__gte=now - timedelta(days=7), start_time__lt=now + timedelta(days=90)
+        )
+        yield 'appointment export', GHLAppointment.objects.filter(
+            location_id=location_id, is_active=True
+        ).order_by('id').values(*exports.APPOINTMENT_EXPORT_FIELDS)
+        yield 'contact export', Contact.objects.filter(
+            location_id=location_id
+        ).order_by('id').values(*exports.CONTACT_EXPORT_FIELDS)
+        yield 'user calendar feed', ics.feed_rows(user_id=assigned_to)
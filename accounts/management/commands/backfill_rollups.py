@@ -0,0 +1,52 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+
+from accounts import rollups
+from accounts.models import ArchivedAppointment, GHLAppointment
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild appointment_daily_rollups for a range of days, e.g. after "
+        "deploying the rollups or changing what they count. Days are rebuilt "
+        "in chunks so each GROUP BY stays bounded. Defaults to everything from "
+        "the earliest appointment, archived ones included, to the end of the "
+        "periodic window."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='first_day', type=date.fromisoformat, help="First day (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='last_day', type=date.fromisoformat, help="Last day (YYYY-MM-DD)")
+        parser.add_argument('--location-id', action='append', dest='location_ids', help="Repeat for several")
+        parser.add_argument('--chunk-days', type=int, default=31)
+
+    def handle(self, *args, **options):
+        default_first, default_last = rollups.default_window()
+        first_day = options['first_day']
+        if first_day is None:
+            starts = [
+                model.objects.aggregate(earliest=Min('start_time'))['earliest']
+                for model in (GHLAppointment, ArchivedAppointment)
+            ]
+            earliest = min(filter(None, starts), default=None)
+            # A day early: the earliest local day can precede the UTC one
+            first_day = min(earliest.date() - timedelta(days=1), default_first) if earliest else default_first
+        last_day = options['last_day'] or default_last
+
+        if first_day > last_day:
+            raise CommandError("--from must not be after --to")
+        if options['chunk_days'] < 1:
+            raise CommandError("--chunk-days must be at least 1")
+
+        written = 0
+        chunk_start = first_day
+        while chunk_start <= last_day:
+            chunk_end = min(chunk_start + timedelta(days=options['chunk_days'] - 1), last_day)
+            counts = rollups.recompute_rollups(chunk_start, chunk_end, options['location_ids'])
+            written += sum(counts.values())
+            self.stdout.write(f"{chunk_start} to {chunk_end}: {sum(counts.values())} rows")
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {written} rollup rows from {first_day} to {last_day}"))
@@ -0,0 +1,84 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from accounts import fast_render
+from accounts.models import GHLAppointment
+from accounts.serializers import AppointmentResponseSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare serialization time per 1k appointments: ModelSerializer + "
+        "JSONRenderer against .values() rows + the fast renderer. Rows are "
+        "built in memory, so no database access is measured."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        instances, dicts = self.build_rows(rows)
+
+        def serializer_path():
+            return JSONRenderer().render(AppointmentResponseSerializer(instances, many=True).data)
+
+        def fast_path():
+            return fast_render.dumps([dict(row) for row in dicts])
+
+        encoder = 'orjson' if fast_render.orjson is not None else 'json (orjson not installed)'
+        self.stdout.write(f"{rows} rows, best of {repeat}, fast encoder: {encoder}")
+
+        results = {}
+        for name, path in (('serializer', serializer_path), ('fast', fast_path)):
+            best = min(self.time(path) for _ in range(repeat))
+            results[name] = best
+            self.stdout.write(f"  {name:<10} {best / rows * 1000 * 1000:8.2f} ms per 1k rows")
+
+        self.stdout.write(f"  speedup    {results['serializer'] / results['fast']:8.1f}x")
+
+    @staticmethod
+    def time(path):
+        start = time.perf_counter()
+        path()
+        return time.perf_counter() - start
+
+    @staticmethod
+    def build_rows(count):
+        now = timezone.now().replace(microsecond=0)
+        instances = []
+        for i in range(count):
+            start = now + timedelta(hours=i)
+            instances.append(GHLAppointment(
+                id=i + 1,
+                ghl_appointment_id=f"ghl-{i}",
+                contact_id=f"contact-{i % 50}",
+                recurring_group_id=(i % 10) or None,
+                occurrence_number=i % 12 + 1,
+                assigned_to=f"user-{i % 8}",
+                calendar_id=f"calendar-{i % 8}",
+                location_id="location-1",
+                title=f"Appointment {i}",
+                description="Benchmark appointment",
+                start_time=start,
+                end_time=start + timedelta(minutes=45),
+                status='new',
+                created_at=now,
+                updated_at=now,
+                is_active=True
+            ))
+
+        # What .values(*APPOINTMENT_FIELDS) yields for the same rows
+        dicts = [
+            {
+                field: getattr(instance, 'recurring_group_id' if field == 'recurring_group' else field)
+                for field in fast_render.APPOINTMENT_FIELDS
+            }
+            for instance in instances
+        ]
+        return instances, dicts
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:19
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_recurringappointmentgroup_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='is_deleting',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='RecurringGroupDeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('retrying', 'Retrying'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('total_count', models.PositiveIntegerField(default=0)),
+                ('deleted_count', models.PositiveIntegerField(default=0)),
+                ('failed_appointment_ids', models.JSONField(blank=True, default=list)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('recurring_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deletion_jobs', to='accounts.recurringappointmentgroup')),
+            ],
+            options={
+                'db_table': 'recurring_group_deletion_jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
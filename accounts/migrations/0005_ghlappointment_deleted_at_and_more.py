@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The tombstone index is built without locking ghl_appointments, which
+    # can't happen inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0004_recurringappointmentgroup_is_deleting_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ghlappointment',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ghlappointment',
+            name='ghl_delete_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ghlappointment',
+            name='ghl_deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='ghlappointment',
+            index=models.Index(condition=models.Q(('ghl_deleted_at__isnull', True), ('is_active', False)), fields=['deleted_at'], name='ghl_appt_pending_ghl_del_idx'),
+        ),
+    ]
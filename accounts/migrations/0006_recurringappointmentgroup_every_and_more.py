@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_ghlappointment_deleted_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='every',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='materialization',
+            field=models.CharField(choices=[('all', 'All occurrences'), ('window', 'Rolling window')], default='all', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='materialized_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='materialized_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='user_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_recurringappointmentgroup_every_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='exdates',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='rrule',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_recurringappointmentgroup_exdates_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='timezone',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
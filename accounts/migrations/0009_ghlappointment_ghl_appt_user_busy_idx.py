@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:25
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0008_recurringappointmentgroup_timezone'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ghlappointment',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['assigned_to', 'start_time', 'end_time'], name='ghl_appt_user_busy_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_ghlappointment_ghl_appt_user_busy_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location_id', models.CharField(max_length=100)),
+                ('user_id', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('appointment_count', models.PositiveIntegerField(default=0)),
+                ('booked_minutes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'appointment_daily_rollups',
+                'ordering': ['day', 'user_id'],
+                'indexes': [models.Index(fields=['location_id', 'day'], name='appt_rollup_location_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('location_id', 'user_id', 'day'), name='appt_rollup_location_user_day_uniq')],
+            },
+        ),
+    ]
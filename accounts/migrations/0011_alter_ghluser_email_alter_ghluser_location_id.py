@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_appointmentdailyrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ghluser',
+            name='email',
+            field=models.EmailField(blank=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='ghluser',
+            name='location_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=50, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:33
+
+import django.utils.timezone
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # ghl_appointments is indexed concurrently, which needs to run outside a transaction
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0011_alter_ghluser_email_alter_ghluser_location_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDeletionLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_id', models.BigIntegerField()),
+                ('ghl_appointment_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('location_id', models.CharField(max_length=100)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'appointment_deletion_log',
+            },
+        ),
+        AddIndexConcurrently(
+            model_name='ghlappointment',
+            index=models.Index(fields=['location_id', 'updated_at'], name='ghl_appt_location_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentdeletionlog',
+            index=models.Index(fields=['location_id', 'deleted_at'], name='appt_del_log_location_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_appointmentdeletionlog_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('ghl_appointment_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('contact_id', models.CharField(max_length=100)),
+                ('recurring_group_id', models.BigIntegerField(blank=True, null=True)),
+                ('occurrence_number', models.PositiveIntegerField(blank=True, null=True)),
+                ('assigned_to', models.CharField(max_length=100)),
+                ('calendar_id', models.CharField(max_length=100)),
+                ('location_id', models.CharField(max_length=100)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('status', models.CharField(default='new', max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('ghl_deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'ghl_appointments_archive',
+                'ordering': ['-start_time'],
+                'indexes': [models.Index(fields=['location_id', 'start_time'], name='appt_archive_location_idx'), models.Index(fields=['assigned_to', 'start_time'], name='appt_archive_user_idx'), models.Index(fields=['ghl_appointment_id'], name='appt_archive_ghl_id_idx')],
+            },
+        ),
+    ]
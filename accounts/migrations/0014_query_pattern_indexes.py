@@ -0,0 +1,53 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Concurrent builds keep these tables writable while their indexes are created
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0013_archivedappointment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ghluser',
+            name='location_id',
+            field=models.CharField(blank=True, default='', max_length=50, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='contact',
+            index=models.Index(fields=['location_id', 'id'], name='contact_location_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ghlappointment',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='ghl_appt_active_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ghlappointment',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['location_id', '-created_at'], name='ghl_appt_loc_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ghlappointment',
+            index=models.Index(condition=models.Q(('is_active', True), ('recurring_group__isnull', True)), fields=['-created_at'], name='ghl_appt_single_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ghlappointment',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['location_id', 'start_time'], name='ghl_appt_loc_start_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ghluser',
+            index=models.Index(fields=['location_id', 'name'], name='ghl_user_location_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recurringappointmentgroup',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='recurring_group_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recurringappointmentgroup',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['location_id', 'interval', '-created_at'], name='recurring_group_list_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringappointmentgroup',
+            name='allow_conflicts',
+            field=models.BooleanField(default=False),
+        ),
+    ]
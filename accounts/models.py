@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 
 
@@ -16,6 +17,12 @@ class Contact(models.Model):
     location_id = models.CharField(max_length=100)
     timestamp = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Exports and syncs walk a location's contacts in id order
+            models.Index(fields=['location_id', 'id'], name='contact_location_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
     
@@ -25,11 +32,18 @@ class GHLUser(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     name = models.CharField(max_length=200)
-    email = models.EmailField(unique=True)
+    # Not unique: the same person can be a user in several locations
+    email = models.EmailField(blank=True)
     phone = models.CharField(max_length=20)
     calendar_id = models.CharField(max_length=50, null=True, blank=True)
     location_id = models.CharField(max_length=50, null=True, blank=True, default="")
 
+    class Meta:
+        indexes = [
+            # A location's users, listed by name in the calendar stats
+            models.Index(fields=['location_id', 'name'], name='ghl_user_location_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -45,18 +59,50 @@ class RecurringAppointmentGroup(models.Model):
         ('monthly', 'Monthly'),
         ('yearly', 'Yearly')
     ])
+    every = models.PositiveIntegerField(default=1)
+    # RFC 5545 rule the occurrences are expanded from, e.g. FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=12
+    rrule = models.TextField(blank=True, default='')
+    # ISO dates whose occurrences are skipped
+    exdates = models.JSONField(default=list, blank=True)
     total_count = models.PositiveIntegerField()
     original_start_time = models.DateTimeField()
     original_end_time = models.DateTimeField()
+    # Zone the rule is expanded in; empty for series booked before DST-aware expansion (UTC)
+    timezone = models.CharField(max_length=100, blank=True, default='')
     contact_id = models.CharField(max_length=255)
     location_id = models.CharField(max_length=255)
+    user_ids = models.JSONField(default=list, blank=True)
+
+    # 'window' series only materialize occurrences inside a rolling horizon
+    materialization = models.CharField(max_length=10, default='all', choices=[
+        ('all', 'All occurrences'),
+        ('window', 'Rolling window')
+    ])
+    materialized_count = models.PositiveIntegerField(default=0)
+    materialized_until = models.DateTimeField(null=True, blank=True)
+    # Booked with allowConflicts: later occurrences skip the double-booking check too
+    allow_conflicts = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    is_deleting = models.BooleanField(default=False)
     
     class Meta:
         db_table = 'recurring_appointment_groups'
         ordering = ['-created_at']
+        indexes = [
+            # Group list: active groups, newest first, overall or per location and interval
+            models.Index(
+                fields=['-created_at'],
+                name='recurring_group_active_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(
+                fields=['location_id', 'interval', '-created_at'],
+                name='recurring_group_list_idx',
+                condition=models.Q(is_active=True)
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.interval} ({self.total_count} occurrences)"
@@ -86,6 +132,11 @@ class GHLAppointment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
 
+    # Soft-delete tombstone, pushed to GHL by the reconciliation worker
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    ghl_deleted_at = models.DateTimeField(null=True, blank=True)
+    ghl_delete_attempts = models.PositiveIntegerField(default=0)
+
     class Meta:
         db_table = 'ghl_appointments'
         ordering = ['-created_at']
@@ -94,8 +145,159 @@ class GHLAppointment(models.Model):
             models.Index(fields=['contact_id']),
             models.Index(fields=['assigned_to']),
             models.Index(fields=['start_time']),
+            # Availability index: busy time per assigned user
+            models.Index(
+                fields=['assigned_to', 'start_time', 'end_time'],
+                name='ghl_appt_user_busy_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(
+                fields=['deleted_at'],
+                name='ghl_appt_pending_ghl_del_idx',
+                condition=models.Q(is_active=False, ghl_deleted_at__isnull=True)
+            ),
+            # Change feed: rows of a location modified after a cursor
+            models.Index(fields=['location_id', 'updated_at'], name='ghl_appt_location_changes_idx'),
+            # Appointment lists: active rows, newest first, overall and per location
+            models.Index(
+                fields=['-created_at'],
+                name='ghl_appt_active_created_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(
+                fields=['location_id', '-created_at'],
+                name='ghl_appt_loc_created_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(
+                fields=['-created_at'],
+                name='ghl_appt_single_created_idx',
+                condition=models.Q(is_active=True, recurring_group__isnull=True)
+            ),
+            # Rollups and feeds: a location's active appointments in a time range
+            models.Index(
+                fields=['location_id', 'start_time'],
+                name='ghl_appt_loc_start_idx',
+                condition=models.Q(is_active=True)
+            ),
+        ]
+
+
+    def __str__(self):
+        return self.title
+
+
+class RecurringGroupDeletionJob(models.Model):
+    """Background job deleting a recurring group and its occurrences from GHL"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('retrying', 'Retrying'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    ACTIVE_STATUSES = ['pending', 'running', 'retrying']
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    recurring_group = models.ForeignKey(
+        RecurringAppointmentGroup,
+        on_delete=models.CASCADE,
+        related_name='deletion_jobs'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_count = models.PositiveIntegerField(default=0)
+    deleted_count = models.PositiveIntegerField(default=0)
+    # Appointments whose GHL delete failed; the next attempt only retries these
+    failed_appointment_ids = models.JSONField(default=list, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'recurring_group_deletion_jobs'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Deletion of {self.recurring_group_id} ({self.status})"
+
+
+class AppointmentDailyRollup(models.Model):
+    """Active appointments and booked time per location, user and local day"""
+    location_id = models.CharField(max_length=100)
+    user_id = models.CharField(max_length=100)
+    # Day in the location's timezone
+    day = models.DateField()
+    appointment_count = models.PositiveIntegerField(default=0)
+    booked_minutes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'appointment_daily_rollups'
+        ordering = ['day', 'user_id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['location_id', 'user_id', 'day'],
+                name='appt_rollup_location_user_day_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['location_id', 'day'], name='appt_rollup_location_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.location_id}/{self.user_id} {self.day}: {self.appointment_count}"
+
+
+class AppointmentDeletionLog(models.Model):
+    """Appointments removed from ghl_appointments outright, for the change feed"""
+    appointment_id = models.BigIntegerField()
+    ghl_appointment_id = models.CharField(max_length=100, null=True, blank=True)
+    location_id = models.CharField(max_length=100)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'appointment_deletion_log'
+        indexes = [
+            models.Index(fields=['location_id', 'deleted_at'], name='appt_del_log_location_idx'),
         ]
 
+    def __str__(self):
+        return f"Deleted appointment {self.appointment_id} ({self.location_id})"
+
+
+class ArchivedAppointment(models.Model):
+    """Past appointments moved out of ghl_appointments by accounts.archive"""
+    # Same id the row had in ghl_appointments
+    id = models.BigIntegerField(primary_key=True)
+    ghl_appointment_id = models.CharField(max_length=100, null=True, blank=True)
+    contact_id = models.CharField(max_length=100)
+    recurring_group_id = models.BigIntegerField(null=True, blank=True)
+    occurrence_number = models.PositiveIntegerField(null=True, blank=True)
+    assigned_to = models.CharField(max_length=100)
+    calendar_id = models.CharField(max_length=100)
+    location_id = models.CharField(max_length=100)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True, null=True)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    status = models.CharField(max_length=50, default='new')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    ghl_deleted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'ghl_appointments_archive'
+        ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['location_id', 'start_time'], name='appt_archive_location_idx'),
+            models.Index(fields=['assigned_to', 'start_time'], name='appt_archive_user_idx'),
+            models.Index(fields=['ghl_appointment_id'], name='appt_archive_ghl_id_idx'),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"{self.title} (archived)"
@@ -0,0 +1,220 @@
+"""
+RFC 5545 recurrence rules for recurring appointment groups.
+
+Groups store an RRULE (``FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=12``) plus a list
+of excluded dates. Occurrences are produced lazily by dateutil's rrule
+evaluator, so expanding a long series only costs what the caller consumes.
+
+Rules are evaluated in the location's zone: wall-clock times (and BYDAY,
+BYMONTHDAY, EXDATE dates) are local, and each occurrence is converted to UTC
+on its own, so a weekly 10:00 series stays at 10:00 across DST transitions.
+"""
+import itertools
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from dateutil.rrule import rrule, rrulestr, DAILY, WEEKLY, MONTHLY, YEARLY
+
+
+# Hard cap on occurrences per series, matching the booking serializer's max count
+MAX_OCCURRENCES = 365
+
+FREQ_TO_INTERVAL = {
+    DAILY: 'daily',
+    WEEKLY: 'weekly',
+    MONTHLY: 'monthly',
+    YEARLY: 'yearly',
+}
+INTERVAL_TO_FREQ = {interval: freq for freq, interval in FREQ_TO_INTERVAL.items()}
+
+
+def build_rrule(interval, every, count, dtstart):
+    """
+    Build the RRULE equivalent of the legacy interval/every/count booking.
+
+    Monthly and yearly series starting on a day some months lack (e.g. the
+    31st or Feb 29th) fall back to the last day of the month instead of
+    skipping it, as the old relativedelta stepping did.
+    """
+    if interval not in INTERVAL_TO_FREQ:
+        raise ValueError(f"Unsupported interval: {interval}")
+    if every < 1:
+        raise ValueError("Parameter 'every' must be a positive integer greater than 0.")
+
+    parts = [f"FREQ={interval.upper()}", f"INTERVAL={every}", f"COUNT={count}"]
+
+    if interval == 'monthly' and dtstart.day > 28:
+        days = ",".join(str(day) for day in range(28, dtstart.day + 1))
+        parts += [f"BYMONTHDAY={days}", "BYSETPOS=-1"]
+    elif interval == 'yearly' and dtstart.month == 2 and dtstart.day == 29:
+        parts += ["BYMONTH=2", "BYMONTHDAY=28,29", "BYSETPOS=-1"]
+
+    return ";".join(parts)
+
+
+def parse_rrule(rule, dtstart):
+    """
+    Parse and validate an RRULE string (with or without the ``RRULE:`` prefix).
+
+    Raises ValueError for unparsable rules, sub-daily frequencies and rules
+    without COUNT or UNTIL.
+    """
+    rule = (rule or "").strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[len("RRULE:"):]
+    if not rule:
+        raise ValueError("Recurrence rule is empty")
+
+    try:
+        parsed = rrulestr(rule, dtstart=dtstart)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid recurrence rule: {e}")
+    if not isinstance(parsed, rrule):
+        raise ValueError("Recurrence rule must be a single RRULE")
+
+    if parsed._freq not in FREQ_TO_INTERVAL:
+        raise ValueError("Recurrence frequency must be DAILY, WEEKLY, MONTHLY or YEARLY")
+    if parsed._count is None and parsed._until is None:
+        raise ValueError("Recurrence rule must set COUNT or UNTIL")
+
+    return parsed
+
+
+def rrule_frequency(rule, dtstart):
+    """(interval, every) of a rule, e.g. ('weekly', 2) for FREQ=WEEKLY;INTERVAL=2"""
+    parsed = parse_rrule(rule, dtstart)
+    return FREQ_TO_INTERVAL[parsed._freq], parsed._interval
+
+
+def as_zoneinfo(tz):
+    """ZoneInfo for a zone name, ZoneInfo or pytz timezone; None stays None"""
+    if tz is None or isinstance(tz, ZoneInfo):
+        return tz
+    return ZoneInfo(getattr(tz, 'zone', None) or str(tz))
+
+
+def iter_occurrences(rule, dtstart, duration, exdates=(), limit=MAX_OCCURRENCES, tz=None):
+    """
+    Lazily yield (start, end) in UTC for each occurrence of ``rule``.
+
+    Args:
+        rule: RRULE string
+        dtstart: first occurrence start (timezone-aware)
+        duration: timedelta of each occurrence, in elapsed time
+        exdates: local dates (or ISO date strings) whose occurrences are skipped
+        limit: maximum number of occurrences yielded
+        tz: zone the rule is evaluated in; defaults to dtstart's own zone
+    """
+    tz = as_zoneinfo(tz)
+    if tz is not None:
+        dtstart = dtstart.astimezone(tz)
+
+    excluded = {
+        date.fromisoformat(day) if isinstance(day, str) else day
+        for day in exdates
+    }
+
+    # zoneinfo resolves the UTC offset of each local occurrence on its own
+    starts = (start for start in parse_rrule(rule, dtstart) if start.date() not in excluded)
+    for start in itertools.islice(starts, limit):
+        start = start.astimezone(dt_timezone.utc)
+        yield start, start + duration
+
+
+def count_occurrences(rule, dtstart, exdates=(), limit=MAX_OCCURRENCES, tz=None):
+    """Number of occurrences a rule produces, capped at ``limit``"""
+    occurrences = iter_occurrences(rule, dtstart, timedelta(0), exdates=exdates, limit=limit, tz=tz)
+    return sum(1 for _ in occurrences)
+
+
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+
+def _shift_weekday(day, offset):
+    return WEEKDAYS[(WEEKDAYS.index(day) + offset) % 7]
+
+
+def shift_rrule(rule, dtstart, shift, tz=None):
+    """
+    Rewrite a rule for a series whose occurrences all move by ``shift`` of
+    local wall-clock time, ``dtstart`` being the series' current start.
+
+    Moves that keep every occurrence on its local date only touch UNTIL.
+    Moves to other days rotate BYDAY (and WKST) of daily and weekly rules and
+    shift BYMONTHDAY days that stay inside 1-28; rules whose dates can't be
+    shifted that way (BYSETPOS, ordinal BYDAY, month ends, ...) raise
+    ValueError.
+    """
+    tz = as_zoneinfo(tz) or dtstart.tzinfo
+    start = dtstart.astimezone(tz).replace(tzinfo=None)
+    new_start = start + shift
+    day_offset = (new_start.date() - start.date()).days
+    time_moved = new_start.time() != start.time()
+
+    rule = (rule or "").strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[len("RRULE:"):]
+    parts = [part.split("=", 1) for part in rule.split(";") if part]
+    parts = [(key.upper(), value.upper()) for key, value in parts]
+    keys = {key for key, _ in parts}
+    freq = dict(parts).get('FREQ')
+
+    def unsupported(key):
+        return ValueError(f"Cannot move a series with {key} in its recurrence rule to another day")
+
+    shifted = []
+    for key, value in parts:
+        if key == 'UNTIL':
+            value = _shift_until(value, shift, day_offset, tz)
+        elif key in ('BYHOUR', 'BYMINUTE', 'BYSECOND') and time_moved:
+            raise ValueError(f"Cannot move the time of a series with {key} in its recurrence rule")
+        elif not day_offset:
+            pass
+        elif key == 'BYDAY':
+            days = value.split(",")
+            if freq not in ('DAILY', 'WEEKLY') or any(day not in WEEKDAYS for day in days):
+                raise unsupported(key)
+            value = ",".join(_shift_weekday(day, day_offset) for day in days)
+        elif key == 'WKST':
+            value = _shift_weekday(value, day_offset) if 'BYDAY' in keys else value
+        elif key == 'BYMONTHDAY':
+            days = [int(day) for day in value.split(",")]
+            if not all(1 <= day <= 28 and 1 <= day + day_offset <= 28 for day in days):
+                raise unsupported(key)
+            value = ",".join(str(day + day_offset) for day in days)
+        elif key == 'BYMONTH':
+            if new_start.month != start.month:
+                raise unsupported(key)
+        elif key in ('BYSETPOS', 'BYYEARDAY', 'BYWEEKNO'):
+            raise unsupported(key)
+        shifted.append((key, value))
+
+    # Weeks of multi-day rules must start on the shifted week start too
+    if day_offset and 'BYDAY' in keys and 'WKST' not in keys and dict(parts).get('INTERVAL', '1') != '1':
+        shifted.append(('WKST', _shift_weekday('MO', day_offset)))
+
+    return ";".join(f"{key}={value}" for key, value in shifted)
+
+
+def _shift_until(value, shift, day_offset, tz):
+    if "T" not in value:
+        until = date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+        return (until + timedelta(days=day_offset)).strftime('%Y%m%d')
+
+    until = datetime.strptime(value.rstrip("Z"), '%Y%m%dT%H%M%S')
+    if not value.endswith("Z"):
+        return (until + shift).strftime('%Y%m%dT%H%M%S')
+    # UTC UNTIL: shift in local time like the occurrences themselves
+    local = until.replace(tzinfo=dt_timezone.utc).astimezone(tz).replace(tzinfo=None) + shift
+    return local.replace(tzinfo=tz).astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def shift_exdates(exdates, dtstart, shift, tz=None):
+    """Excluded local dates of a series moved by ``shift`` (see ``shift_rrule``)"""
+    tz = as_zoneinfo(tz) or dtstart.tzinfo
+    start_time = dtstart.astimezone(tz).time()
+    return [
+        (datetime.combine(date.fromisoformat(day) if isinstance(day, str) else day, start_time) + shift)
+        .date().isoformat()
+        for day in exdates
+    ]
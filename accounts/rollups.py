@@ -0,0 +1,172 @@
+"""
+Daily booking rollups.
+
+Dashboards read per-location, per-user, per-day appointment counts and
+booked minutes from ``appointment_daily_rollups`` instead of scanning
+``ghl_appointments``. A periodic task rebuilds a sliding window of days;
+each location costs one GROUP BY over its appointments in that window, and
+days are bucketed in the location's own timezone.
+
+Appointments moved to ``ghl_appointments_archive`` keep counting: days old
+enough to hold archived appointments are rebuilt from both tables.
+"""
+from datetime import datetime, time, timedelta
+
+import pytz
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ghl_auth.models import GHLAuthCredentials
+from .archive import archive_cutoff
+from .models import AppointmentDailyRollup, ArchivedAppointment, GHLAppointment
+
+
+def location_timezones(location_ids=None):
+    """location_id -> pytz timezone for connected locations, UTC when unset"""
+    credentials = GHLAuthCredentials.objects.exclude(location_id__isnull=True)
+    if location_ids is not None:
+        credentials = credentials.filter(location_id__in=location_ids)
+
+    zones = {}
+    for location_id, tz in credentials.values_list('location_id', 'timezone'):
+        try:
+            zones[location_id] = pytz.timezone(tz or 'UTC')
+        except pytz.exceptions.UnknownTimeZoneError:
+            zones[location_id] = pytz.UTC
+    return zones
+
+
+def default_window(today=None):
+    """(first_day, last_day) the periodic rebuild covers"""
+    today = today or timezone.now().date()
+    return (
+        today - timedelta(days=settings.APPOINTMENT_ROLLUP_LOOKBACK_DAYS),
+        today + timedelta(days=settings.APPOINTMENT_ROLLUP_LOOKAHEAD_DAYS)
+    )
+
+
+def shared_assignees():
+    """
+    ``assigned_to`` values of shared-calendar copies of bookings, which
+    would count every booking a second time under a pseudo user
+    """
+    return [" ", *([settings.GHL_SHARED_CALENDAR_ASSIGNEE_ID] if settings.GHL_SHARED_CALENDAR_ASSIGNEE_ID else [])]
+
+
+def recompute_location(location_id, first_day, last_day, tz=pytz.UTC):
+    """
+    Rebuild one location's rollups for local days [first_day, last_day].
+
+    Days that no longer have active appointments lose their rows. Shared
+    calendar copies are left out.
+
+    Returns:
+        Number of rollup rows written
+    """
+    window_start = tz.localize(datetime.combine(first_day, time.min))
+    window_end = tz.localize(datetime.combine(last_day + timedelta(days=1), time.min))
+
+    sources = [GHLAppointment]
+    # Archived appointments all ended before the current cutoff
+    if window_start < archive_cutoff():
+        sources.append(ArchivedAppointment)
+
+    totals = {}
+    for model in sources:
+        rows = model.objects.filter(
+            location_id=location_id,
+            is_active=True,
+            start_time__gte=window_start,
+            start_time__lt=window_end
+        ).exclude(
+            assigned_to__in=shared_assignees()
+        ).annotate(
+            day=TruncDate('start_time', tzinfo=tz)
+        ).values('assigned_to', 'day').annotate(
+            appointment_count=Count('id'),
+            booked=Sum(F('end_time') - F('start_time'))
+        ).order_by()
+
+        for row in rows:
+            count, booked = totals.get((row['assigned_to'], row['day']), (0, timedelta()))
+            totals[row['assigned_to'], row['day']] = (
+                count + row['appointment_count'],
+                booked + (row['booked'] or timedelta())
+            )
+
+    rollups = [
+        AppointmentDailyRollup(
+            location_id=location_id,
+            user_id=user_id,
+            day=day,
+            appointment_count=count,
+            booked_minutes=int(booked.total_seconds() // 60)
+        )
+        for (user_id, day), (count, booked) in totals.items()
+    ]
+
+    with transaction.atomic():
+        AppointmentDailyRollup.objects.filter(
+            location_id=location_id,
+            day__gte=first_day,
+            day__lte=last_day
+        ).delete()
+        AppointmentDailyRollup.objects.bulk_create(rollups, batch_size=1000)
+
+    return len(rollups)
+
+
+def recompute_rollups(first_day=None, last_day=None, location_ids=None):
+    """
+    Rebuild rollups of every connected location (or ``location_ids``) for
+    the given days, defaulting to the periodic window.
+
+    Returns:
+        Dict of location_id -> rollup rows written
+    """
+    if first_day is None or last_day is None:
+        default_first, default_last = default_window()
+        first_day = first_day or default_first
+        last_day = last_day or default_last
+
+    return {
+        location_id: recompute_location(location_id, first_day, last_day, tz)
+        for location_id, tz in location_timezones(location_ids).items()
+    }
+
+
+def query_rollups(location_id, first_day, last_day, user_ids=None, group_by='day'):
+    """
+    Rollup rows of a location for [first_day, last_day].
+
+    ``group_by`` is 'day' (summed over users), 'user' (summed over days) or
+    'user_day' (stored rows as-is).
+
+    Returns:
+        (rows, totals) where totals sums the whole selection
+    """
+    rollups = AppointmentDailyRollup.objects.filter(
+        location_id=location_id,
+        day__gte=first_day,
+        day__lte=last_day
+    )
+    if user_ids:
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    if group_by == 'user_day':
+        rows = rollups.order_by('day', 'user_id').values('day', 'user_id', 'appointment_count', 'booked_minutes')
+    else:
+        key = 'day' if group_by == 'day' else 'user_id'
+        rows = rollups.order_by(key).values(key).annotate(
+            appointment_count=Sum('appointment_count'),
+            booked_minutes=Sum('booked_minutes')
+        )
+
+    totals = rollups.aggregate(
+        appointment_count=Sum('appointment_count'),
+        booked_minutes=Sum('booked_minutes')
+    )
+    return list(rows), {key: value or 0 for key, value in totals.items()}
@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from datetime import datetime, timedelta
 from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY
-from .models import GHLAppointment, Contact, GHLUser, RecurringAppointmentGroup
+from .models import GHLAppointment, Contact, GHLUser, RecurringAppointmentGroup, RecurringGroupDeletionJob
 from ghl_auth.models import GHLAuthCredentials
+from .recurrence import MAX_OCCURRENCES, parse_rrule, count_occurrences
 from django.utils import timezone
 import pytz
 from rest_framework import serializers
@@ -88,6 +89,20 @@ class AppointmentBookingSerializer(serializers.Serializer):
         max_value=365,
         default=1
     )
+    # RFC 5545 rule, e.g. FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=12; overrides interval/every/count
+    rrule = serializers.CharField(max_length=500, required=False, allow_blank=True)
+    exdates = serializers.ListField(
+        child=serializers.DateField(),
+        required=False,
+        max_length=MAX_OCCURRENCES
+    )
+    # Book even when the users already have overlapping appointments
+    allowConflicts = serializers.BooleanField(required=False, default=False)
+    # Defaults to settings.RECURRING_MATERIALIZATION_MODE
+    materialization = serializers.ChoiceField(
+        choices=[('all', 'All occurrences'), ('window', 'Rolling window')],
+        required=False
+    )
     # frequency = serializers.IntegerField(
     #     required=False,
     #     min_value=1,
@@ -142,8 +157,18 @@ class AppointmentBookingSerializer(serializers.Serializer):
         
         # Validate recurring appointment fields
         if attrs['type'] == 'recurring':
-            if not attrs.get('interval'):
-                raise serializers.ValidationError("Interval is required for recurring appointments")
+            if attrs.get('rrule'):
+                try:
+                    parse_rrule(attrs['rrule'], start_dt)
+                    occurrence_count = count_occurrences(
+                        attrs['rrule'], start_dt, attrs.get('exdates', []), tz=location_tz
+                    )
+                except ValueError as e:
+                    raise serializers.ValidationError(str(e))
+                if not occurrence_count:
+                    raise serializers.ValidationError("Recurrence rule produces no occurrences")
+            elif not attrs.get('interval'):
+                raise serializers.ValidationError("Interval or rrule is required for recurring appointments")
         
         # Validate contact exists
         if not Contact.objects.filter(contact_id=attrs['contactId']).exists():
@@ -210,6 +235,149 @@ class AppointmentUpdateSerializer(serializers.Serializer):
         return attrs
 
 
+class FreeBusyQuerySerializer(serializers.Serializer):
+    MAX_WINDOW = timedelta(days=31)
+
+    location_id = serializers.CharField(max_length=100, required=False)
+    # Comma separated; defaults to every user of the location
+    user_ids = serializers.CharField(required=False)
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    slot_minutes = serializers.IntegerField(required=False, min_value=5, max_value=480)
+
+    def validate_user_ids(self, value):
+        return [user_id.strip() for user_id in value.split(',') if user_id.strip()]
+
+    def validate(self, attrs):
+        location_id = attrs.get('location_id')
+
+        if not attrs.get('user_ids'):
+            if not location_id:
+                raise serializers.ValidationError("user_ids or location_id is required")
+            attrs['user_ids'] = list(
+                GHLUser.objects.filter(location_id=location_id).values_list('user_id', flat=True)
+            )
+
+        # Naive datetimes are in the location's timezone
+        location_tz = pytz.UTC
+        if location_id:
+            try:
+                auth_creds = GHLAuthCredentials.objects.get(location_id=location_id, is_approved=True)
+                location_tz = pytz.timezone(auth_creds.timezone or 'UTC')
+            except (GHLAuthCredentials.DoesNotExist, pytz.exceptions.UnknownTimeZoneError):
+                pass
+
+        for field in ('start', 'end'):
+            if timezone.is_naive(attrs[field]):
+                attrs[field] = location_tz.localize(attrs[field])
+
+        if attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError("start must be before end")
+        if attrs['end'] - attrs['start'] > self.MAX_WINDOW:
+            raise serializers.ValidationError(f"Window cannot exceed {self.MAX_WINDOW.days} days")
+        return attrs
+
+
+class AppointmentChangesQuerySerializer(serializers.Serializer):
+    location_id = serializers.CharField(max_length=100)
+    # Cursor returned by the previous call; omit it to start a new feed
+    since = serializers.CharField(required=False, allow_blank=True)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1000, default=200)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    location_id = serializers.CharField(max_length=100)
+    # Not `format`, which DRF reserves for renderer selection
+    file_format = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    include_inactive = serializers.BooleanField(default=False)
+
+
+class BookingRollupQuerySerializer(serializers.Serializer):
+    MAX_DAYS = 366
+    GROUP_BY_CHOICES = [
+        ('day', 'Per day'),
+        ('user', 'Per user'),
+        ('user_day', 'Per user and day'),
+    ]
+
+    location_id = serializers.CharField(max_length=100)
+    start = serializers.DateField()
+    end = serializers.DateField()
+    # Comma separated; defaults to every user with rollups
+    user_ids = serializers.CharField(required=False)
+    group_by = serializers.ChoiceField(choices=GROUP_BY_CHOICES, default='day')
+
+    def validate_user_ids(self, value):
+        return [user_id.strip() for user_id in value.split(',') if user_id.strip()]
+
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("start must not be after end")
+        if (attrs['end'] - attrs['start']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"Range cannot exceed {self.MAX_DAYS} days")
+        return attrs
+
+
+class RecurringSeriesUpdateSerializer(serializers.Serializer):
+    SCOPE_CHOICES = [
+        ('all', 'All occurrences'),
+        ('following', 'This and following occurrences'),
+    ]
+
+    scope = serializers.ChoiceField(choices=SCOPE_CHOICES, default='all')
+    occurrence_number = serializers.IntegerField(required=False, min_value=1)
+    title = serializers.CharField(max_length=200, required=False)
+    description = serializers.CharField(max_length=1000, required=False, allow_blank=True)
+    # New times of the first affected occurrence (for 'all', the first upcoming one);
+    # the others move by the same shift
+    startDateTime = serializers.DateTimeField(required=False)
+    endDateTime = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        # Get the series timezone for naive datetimes
+        recurring_group = self.context.get('recurring_group')
+        try:
+            if recurring_group and recurring_group.timezone:
+                location_tz = pytz.timezone(recurring_group.timezone)
+            elif recurring_group:
+                auth_creds = GHLAuthCredentials.objects.get(
+                    location_id=recurring_group.location_id,
+                    is_approved=True
+                )
+                location_tz = pytz.timezone(auth_creds.timezone or 'UTC')
+            else:
+                location_tz = pytz.UTC
+        except (GHLAuthCredentials.DoesNotExist, pytz.exceptions.UnknownTimeZoneError):
+            location_tz = pytz.UTC
+
+        if attrs['scope'] == 'following' and not attrs.get('occurrence_number'):
+            raise serializers.ValidationError("occurrence_number is required when updating following occurrences")
+
+        if 'endDateTime' in attrs and 'startDateTime' not in attrs:
+            raise serializers.ValidationError("endDateTime requires startDateTime")
+
+        if not any(field in attrs for field in ('title', 'description', 'startDateTime')):
+            raise serializers.ValidationError("Nothing to update")
+
+        # Handle timezone for datetime fields
+        for field in ('startDateTime', 'endDateTime'):
+            if field in attrs and timezone.is_naive(attrs[field]):
+                attrs[field] = location_tz.localize(attrs[field])
+
+        # Validate datetime order
+        if 'startDateTime' in attrs and 'endDateTime' in attrs:
+            if attrs['startDateTime'] >= attrs['endDateTime']:
+                raise serializers.ValidationError("Start time must be before end time")
+
+        # Validate past appointments
+        if 'startDateTime' in attrs:
+            now = timezone.now().astimezone(location_tz)
+            if attrs['startDateTime'] < (now + timedelta(minutes=5)):
+                raise serializers.ValidationError("Cannot schedule appointments in the past or within 5 minutes from now")
+
+        return attrs
+
+
 class AppointmentResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = GHLAppointment
@@ -223,10 +391,11 @@ class RecurringAppointmentGroupSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecurringAppointmentGroup
         fields = [
-            'id', 'group_id', 'title', 'description', 'interval', 
+            'id', 'group_id', 'title', 'description', 'interval', 'every', 'rrule', 'exdates', 'timezone',
             'total_count', 'original_start_time', 'original_end_time',
+            'materialization', 'materialized_count', 'materialized_until',
             'contact_id', 'location_id', 'created_at', 'updated_at',
-            'is_active', 'appointments_count'
+            'is_active', 'is_deleting', 'appointments_count'
         ]
         read_only_fields = ['id', 'group_id', 'created_at', 'updated_at']
     
@@ -234,6 +403,25 @@ class RecurringAppointmentGroupSerializer(serializers.ModelSerializer):
         return obj.appointments.filter(is_active=True).count()
 
 
+class RecurringGroupDeletionJobSerializer(serializers.ModelSerializer):
+    group_id = serializers.UUIDField(source='recurring_group.group_id', read_only=True)
+    progress_percentage = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecurringGroupDeletionJob
+        fields = [
+            'job_id', 'group_id', 'status', 'total_count', 'deleted_count',
+            'failed_appointment_ids', 'errors', 'attempts', 'progress_percentage',
+            'created_at', 'updated_at', 'completed_at'
+        ]
+        read_only_fields = fields
+
+    def get_progress_percentage(self, obj):
+        if not obj.total_count:
+            return 100.0 if obj.status == 'completed' else 0.0
+        return round(min(obj.deleted_count / obj.total_count * 100, 100), 2)
+
+
 class GHLAppointmentSerializer(serializers.ModelSerializer):
     recurring_group_title = serializers.CharField(
         source='recurring_group.title', 
@@ -4,13 +4,19 @@ from typing import List, Dict, Any, Optional
 from django.utils.dateparse import parse_datetime
 from django.db import transaction
 from ghl_auth.models import GHLAuthCredentials
+from ghl_auth import token_provider
 from django.utils.timezone import make_aware
 from zoneinfo import ZoneInfo
 import math
 from datetime import datetime, timedelta
-from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY
 from django.conf import settings
-from .models import GHLAppointment, GHLUser, Contact, RecurringAppointmentGroup
+from . import availability, calendars, changes, recurrence
+from .caching import bump_location_version
+from .contacts import upsert_contacts
+from .locations import approved_location_ids, fan_out_locations
+from .models import GHLAppointment, GHLUser, Contact, RecurringAppointmentGroup, RecurringGroupDeletionJob
+from django.db.models import F
+from django.core.cache import cache
 import logging
 from django.utils import timezone
 import pytz
@@ -18,6 +24,9 @@ import pytz
 from dateutil.relativedelta import relativedelta
 
 import json
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 
@@ -43,6 +52,9 @@ def fetch_all_contacts(location_id: str, access_token: str = None) -> List[Dict[
     
     
     
+    if not access_token:
+        access_token = token_provider.get_access_token(location_id)
+
     base_url = "https://services.leadconnectorhq.com/contacts/"
     headers = {
         "Accept": "application/json",
@@ -50,7 +62,7 @@ def fetch_all_contacts(location_id: str, access_token: str = None) -> List[Dict[
         "Version": "2021-07-28"
     }
     
-    all_contacts = []
+    fetched = 0
     start_after = None
     start_after_id = None
     page_count = 0
@@ -87,8 +99,9 @@ def fetch_all_contacts(location_id: str, access_token: str = None) -> List[Dict[
                 print("No more contacts found.")
                 break
                 
-            all_contacts.extend(contacts)
-            print(f"Retrieved {len(contacts)} contacts. Total so far: {len(all_contacts)}")
+            sync_contacts_to_db(contacts)
+            fetched += len(contacts)
+            print(f"Retrieved {len(contacts)} contacts. Total so far: {fetched}")
             
             # Check if there are more pages
             # GoHighLevel API uses cursor-based pagination
@@ -139,7 +152,7 @@ def fetch_all_contacts(location_id: str, access_token: str = None) -> List[Dict[
             
             # Check if we've reached the end
             total_count = meta.get("total", 0)
-            if total_count > 0 and len(all_contacts) >= total_count:
+            if total_count > 0 and fetched >= total_count:
                 print(f"Retrieved all {total_count} contacts.")
                 break
                 
@@ -163,10 +176,7 @@ def fetch_all_contacts(location_id: str, access_token: str = None) -> List[Dict[
             print("Warning: Stopped after 1000 pages to prevent infinite loop")
             break
     
-    print(f"\nTotal contacts retrieved: {len(all_contacts)}")
-
-    sync_contacts_to_db(all_contacts)
-    # return all_contacts
+    print(f"\nTotal contacts retrieved: {fetched}")
 
 
 
@@ -178,73 +188,39 @@ def sync_contacts_to_db(contact_data):
     Args:
         contact_data (list): List of contact dicts from GoHighLevel API
     """
-    contacts_to_create = []
-    existing_ids = set(Contact.objects.filter(contact_id__in=[c['id'] for c in contact_data]).values_list('contact_id', flat=True))
+    written = upsert_contacts(contact_data)
+    print(f"{written} contacts upserted.")
 
-    for item in contact_data:
-        date_added = parse_datetime(item.get("dateAdded")) if item.get("dateAdded") else None
-        
-
-        contact_obj = Contact(
-            contact_id=item.get("id"),
-            first_name=item.get("firstName"),
-            last_name=item.get("lastName"),
-            phone=item.get("phone"),
-            email=item.get("email"),
-            dnd=item.get("dnd", False),
-            country=item.get("country"),
-            date_added=date_added,
-            tags=item.get("tags", []),
-            custom_fields=item.get("customFields", []),
-            location_id=item.get("locationId"),
-            timestamp=date_added
-        )
 
-        if item.get("id") in existing_ids:
-            # Update existing contact
-            Contact.objects.filter(contact_id=item["id"]).update(
-                first_name=contact_obj.first_name,
-                last_name=contact_obj.last_name,
-                phone=contact_obj.phone,
-                email=contact_obj.email,
-                dnd=contact_obj.dnd,
-                country=contact_obj.country,
-                date_added=contact_obj.date_added,
-                tags=contact_obj.tags,
-                custom_fields=contact_obj.custom_fields,
-                location_id=contact_obj.location_id,
-                timestamp=contact_obj.timestamp
-            )
-        else:
-            contacts_to_create.append(contact_obj)
-
-    if contacts_to_create:
-        with transaction.atomic():
-            Contact.objects.bulk_create(contacts_to_create, ignore_conflicts=True)
 
-    print(f"{len(contacts_to_create)} new contacts created.")
-    print(f"{len(existing_ids)} existing contacts updated.")
 
 
 
 
 
+# location_id is only set on insert: users of several locations keep the one
+# they were first synced from instead of flipping with every location's sync
+USER_UPDATE_FIELDS = ['first_name', 'last_name', 'name', 'email', 'phone']
 
 
+def fetch_location_users(locationId):
+    """
+    Fetch a location's users from GHL.
 
+    The location users endpoint has no paging parameters and returns every
+    user of the location in one response, so a single call is complete.
 
-def pull_users(locationId):
-    token = GHLAuthCredentials.objects.get(location_id=locationId)
+    Returns None when the request fails so callers never mistake an API
+    error for a location without users.
+    """
+    access_token = token_provider.get_access_token(locationId)
     headers = {
         'Accept': 'application/json',
-        'Authorization': f'Bearer {token.access_token}',
+        'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json',
         'Version': '2021-07-28'  # or '2021-04-15' for calendars endpoint
     }
 
-    calendars = []
-
-    # Step 2: Fetch users and save/update GHLUser entries
     user_response = requests.get(
         f"https://services.leadconnectorhq.com/users/?locationId={locationId}",
         headers=headers
@@ -252,24 +228,128 @@ def pull_users(locationId):
 
     if user_response.status_code != 200:
         print(f"Error fetching users: {user_response.status_code} - {user_response.text}")
-        return
-
-    users_data = user_response.json().get("users", [])
-
-    for user in users_data:
-        user_id = user["id"]
-        GHLUser.objects.update_or_create(
-            user_id=user_id,
-            defaults={
-                "first_name": user.get("firstName", ""),
-                "last_name": user.get("lastName", ""),
-                "name": user.get("name", ""),
-                "email": user.get("email", ""),
-                "phone": user.get("phone", ""),
-                "location_id": locationId,
-                # "calendar_id": user_calendar_map.get(user_id)  # Map calendar if exists
-            }
+        return None
+
+    return user_response.json().get("users", [])
+
+
+def upsert_location_users(locationId, users_data):
+    """
+    Insert or update a location's users in one statement keyed on user_id.
+
+    Users already known keep their location_id, so a user of several
+    locations stays with the first one it was synced from. calendar_id is
+    local configuration and is left untouched. Users are never deleted
+    here: whether a user left every location is only known once all of
+    them were fetched (see prune_location_users).
+
+    Returns:
+        Number of users upserted
+    """
+    users = {
+        user["id"]: GHLUser(
+            user_id=user["id"],
+            first_name=user.get("firstName") or "",
+            last_name=user.get("lastName") or "",
+            name=user.get("name") or "",
+            email=user.get("email") or "",
+            phone=user.get("phone") or "",
+            location_id=locationId
         )
+        for user in users_data if user.get("id")
+    }
+
+    if users:
+        GHLUser.objects.bulk_create(
+            list(users.values()),
+            update_conflicts=True,
+            unique_fields=['user_id'],
+            update_fields=USER_UPDATE_FIELDS
+        )
+        bump_location_version(locationId)
+    return len(users)
+
+
+def prune_location_users(seen, complete):
+    """
+    Reconcile the users owned by synced locations with GHL's responses.
+
+    ``seen`` maps each location fetched in this sync to the user ids GHL
+    returned for it; empty responses are ignored so a bad response can't
+    wipe a location. A user missing from its own location's response moves
+    to another location that still returned it, keeping its calendar_id.
+    Users no location returned are deleted only when ``complete``, i.e.
+    every location was fetched successfully.
+
+    Returns:
+        Dict of owning location_id -> (moved, deleted)
+    """
+    seen = {location_id: set(user_ids) for location_id, user_ids in seen.items() if user_ids}
+    owners = {location_id: set() for location_id in seen}
+    for location_id, user_id in GHLUser.objects.filter(location_id__in=list(seen)).values_list('location_id', 'user_id'):
+        if user_id not in seen[location_id]:
+            owners[location_id].add(user_id)
+
+    results = {}
+    with transaction.atomic():
+        for location_id, missing in owners.items():
+            moves = {}
+            for user_id in missing:
+                # Deterministic pick among the locations that still have the user
+                other = min((other for other, user_ids in seen.items() if user_id in user_ids), default=None)
+                if other is not None:
+                    moves.setdefault(other, []).append(user_id)
+
+            for other, user_ids in moves.items():
+                GHLUser.objects.filter(user_id__in=user_ids).update(location_id=other)
+
+            moved = sum(len(user_ids) for user_ids in moves.values())
+            deleted = 0
+            gone = missing.difference(*moves.values())
+            if complete and gone:
+                deleted, _ = GHLUser.objects.filter(location_id=location_id, user_id__in=gone).delete()
+
+            if moved or deleted:
+                transaction.on_commit(lambda ids=(location_id, *moves): bump_location_version(*ids))
+            results[location_id] = (moved, deleted)
+    return results
+
+
+def pull_users(locationId):
+    users_data = fetch_location_users(locationId)
+    if users_data is None:
+        return None
+    return upsert_location_users(locationId, users_data)
+
+
+def sync_all_users(location_ids=None):
+    """
+    Sync users of every approved location (or ``location_ids``), fetching
+    from GHL concurrently and writing each location in bulk, then prune
+    users that left their location (see prune_location_users). Deletions
+    need every approved location to have been fetched, so a partial sync
+    only moves users between locations.
+
+    Returns:
+        Dict of location_id -> (upserted, moved, deleted), or the error message
+    """
+    seen = {}
+
+    def write(location_id, users_data):
+        if users_data is None:
+            return "Failed to fetch users"
+        upserted = upsert_location_users(location_id, users_data)
+        seen[location_id] = {user["id"] for user in users_data if user.get("id")}
+        return upserted
+
+    results = fan_out_locations(fetch_location_users, write, location_ids)
+
+    approved = approved_location_ids()
+    pruned = prune_location_users(seen, complete=all(seen.get(location_id) for location_id in approved))
+    for location_id, upserted in list(results.items()):
+        if isinstance(upserted, int):
+            results[location_id] = (upserted, *pruned.get(location_id, (0, 0)))
+    return results
 
 
 
@@ -279,8 +359,42 @@ def pull_users(locationId):
 logger = logging.getLogger('accounts.services')
 
 
+class RateLimiter:
+    """Thread-safe limiter spacing calls so at most `rate` start per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
 class GHLAppointmentService:
     BASE_URL = "https://services.leadconnectorhq.com"
+
+    # GHL allows 100 requests per 10 seconds per location
+    GHL_REQUESTS_PER_SECOND = 10
+    GHL_MAX_WORKERS = 8
+
+    # Occurrences deleted per batch by background deletion jobs
+    DELETION_BATCH_SIZE = 100
+    # Active deletion jobs untouched this long were lost (crashed worker,
+    # dropped message) and get resumed; longer than the largest retry backoff
+    DELETION_JOB_STALE_AFTER = timedelta(minutes=30)
+
+    # Soft-delete reconciliation with GHL
+    RECONCILE_DELAY = 5
+    RECONCILE_BATCH_SIZE = 200
+    RECONCILE_MAX_ATTEMPTS = 10
+    # Change feed cursors expire together with the tombstones they rely on
+    TOMBSTONE_RETENTION = changes.RETENTION
     
     @staticmethod
     def get_location_timezone(location_id):
@@ -313,39 +427,12 @@ class GHLAppointmentService:
     
     @staticmethod
     def get_auth_credentials(location_id):
-        """Get authentication credentials for a location"""
+        """Get authentication credentials for a location from the shared token cache"""
         try:
-            return GHLAuthCredentials.objects.get(
-                location_id=location_id,
-                is_approved=True
-            )
+            return token_provider.get_credentials(location_id)
         except GHLAuthCredentials.DoesNotExist:
             raise ValueError(f"No valid credentials found for location {location_id}")
     
-    # @staticmethod
-    # def generate_rrule(interval, count, start_date):
-    #     """Generate RRULE string for recurring appointments"""
-    #     freq_map = {
-    #         'daily': DAILY,
-    #         'weekly': WEEKLY,
-    #         'monthly': MONTHLY
-    #     }
-        
-    #     if interval not in freq_map:
-    #         raise ValueError(f"Invalid interval: {interval}")
-        
-    #     # Ensure start_date is timezone-aware
-    #     if timezone.is_naive(start_date):
-    #         start_date = timezone.make_aware(start_date)
-        
-    #     rule = rrule(
-    #         freq=freq_map[interval],
-    #         count=count,
-    #         dtstart=start_date
-    #     )
-        
-    #     return f"RRULE:FREQ={interval.upper()};INTERVAL=1;COUNT={count}"
-    
     @staticmethod
     def create_ghl_appointment(appointment_data, access_token):
         """Create appointment in GHL via API"""
@@ -393,7 +480,7 @@ class GHLAppointmentService:
             raise ValueError(f"Failed to update appointment in GHL: {str(e)}")
     
     @staticmethod
-    def delete_ghl_appointment(appointment_id, access_token):
+    def delete_ghl_appointment(appointment_id, access_token, missing_ok=False):
         """Delete appointment in GHL via API"""
         url = f"{GHLAppointmentService.BASE_URL}/calendars/events/{appointment_id}"
         
@@ -405,9 +492,12 @@ class GHLAppointmentService:
         
         try:
             response = requests.delete(url, headers=headers)
-            print("hereeee: deleted appointment: ", response)
 
+            if missing_ok and response.status_code == 404:
+                logger.debug(f"GHL appointment {appointment_id} already deleted")
+                return True
             response.raise_for_status()
+            logger.debug(f"Deleted GHL appointment {appointment_id}")
             return True
         except requests.exceptions.RequestException as e:
             logger.error(f"GHL API Error: {e}")
@@ -415,7 +505,19 @@ class GHLAppointmentService:
         
 
     @classmethod
-    def calculate_occurrence_dates(cls, start_datetime, end_datetime, interval, every, count):
+    def iter_occurrence_dates(cls, start_datetime, end_datetime, interval, every, count, tz=None):
+        """
+        Lazily yield (start_datetime, end_datetime) in UTC for each occurrence
+        of a recurring appointment, so callers can stop at a horizon without
+        building the whole series. Steps are taken in ``tz`` local time.
+        """
+        if tz is not None:
+            start_datetime = start_datetime.astimezone(recurrence.as_zoneinfo(tz))
+        rule = recurrence.build_rrule(interval, every, count, start_datetime)
+        return recurrence.iter_occurrences(rule, start_datetime, end_datetime - start_datetime, tz=tz)
+
+    @classmethod
+    def calculate_occurrence_dates(cls, start_datetime, end_datetime, interval, every, count, tz=None):
         """
         Calculate all occurrence dates for a recurring appointment
         
@@ -425,41 +527,155 @@ class GHLAppointmentService:
             interval: 'daily', 'weekly', 'monthly', 'yearly'
             every: How often the appointment should repeat (e.g., every 2 weeks)
             count: Number of occurrences
+            tz: Location timezone the series is expanded in (DST-aware)
 
         Returns:
-            List of tuples (start_datetime, end_datetime) for each occurrence
+            List of UTC tuples (start_datetime, end_datetime) for each occurrence
         """
-        if every < 1:
-            raise ValueError("Parameter 'every' must be a positive integer greater than 0.")
-
-        occurrences = []
-        duration = end_datetime - start_datetime
-
-        for i in range(count):
-            if interval == 'daily':
-                occurrence_start = start_datetime + timedelta(days=i * every)
-            elif interval == 'weekly':
-                occurrence_start = start_datetime + timedelta(weeks=i * every)
-            elif interval == 'monthly':
-                occurrence_start = start_datetime + relativedelta(months=i * every)
-            elif interval == 'yearly':
-                occurrence_start = start_datetime + relativedelta(years=i * every)
-            else:
-                raise ValueError(f"Unsupported interval: {interval}")
+        return list(cls.iter_occurrence_dates(start_datetime, end_datetime, interval, every, count, tz=tz))
 
-            occurrence_end = occurrence_start + duration
-            occurrences.append((occurrence_start, occurrence_end))
+    @classmethod
+    def iter_group_occurrences(cls, recurring_group):
+        """Yield (occurrence_number, start, end) for a group's full series"""
+        tz = recurrence.as_zoneinfo(recurring_group.timezone or 'UTC')
+        start = recurring_group.original_start_time.astimezone(tz)
+        rule = recurring_group.rrule or recurrence.build_rrule(
+            recurring_group.interval,
+            recurring_group.every,
+            recurring_group.total_count,
+            start
+        )
+        occurrences = recurrence.iter_occurrences(
+            rule,
+            start,
+            recurring_group.original_end_time - start,
+            exdates=recurring_group.exdates,
+            tz=tz
+        )
+        for occurrence_number, (occurrence_start, occurrence_end) in enumerate(occurrences, 1):
+            yield occurrence_number, occurrence_start, occurrence_end
+
+    @classmethod
+    def get_materialization_horizon(cls):
+        """End of the rolling window inside which windowed series are materialized"""
+        return timezone.now() + settings.RECURRING_MATERIALIZATION_HORIZON
+
+    @classmethod
+    def create_occurrences(cls, booking, user_ids, occurrences, access_token, recurring_group=None, skip=()):
+        """
+        Create appointments in GHL and locally for every user and occurrence.
+
+        Args:
+            booking: dict with title, description, locationId, contactId and type
+            user_ids: GHL user ids to book
+            occurrences: iterable of (occurrence_number, start_utc, end_utc)
+            access_token: GHL access token for the location
+            recurring_group: RecurringAppointmentGroup or None
+            skip: (user_id, occurrence_number) pairs to leave out
+
+        Returns:
+            Tuple (created_appointments, errors)
+        """
+        created_appointments = []
+        errors = []
+        occurrences = list(occurrences)
+
+        # Resolve every user's calendar up front: (assigned_to, calendar_id, GHL assignee)
+        targets = []
+        users = GHLUser.objects.in_bulk(user_ids, field_name='user_id')
+        calendar_map = None
+        for user_id in user_ids:
+            user = users.get(user_id)
+            if user is None:
+                error_msg = f"User {user_id} not found"
+                logger.error(error_msg)
+                errors.append(error_msg)
+                continue
+
+            calendar_id = user.calendar_id
+            if not calendar_id:
+                if calendar_map is None:
+                    try:
+                        calendar_map = calendars.get_user_calendar_map(booking['locationId'])
+                    except Exception as e:
+                        logger.error(f"Calendar discovery failed for location {booking['locationId']}: {e}")
+                        calendar_map = {}
+                calendar_id = calendar_map.get(user_id)
+
+            if not calendar_id:
+                errors.append(f"User {user_id} has no calendar assigned")
+                continue
+            targets.append((user_id, calendar_id, user_id))
+
+        # The shared calendar booking is only made when one is configured
+        if booking['type'] == "recurring":
+            shared_calendar_id = settings.GHL_SHARED_RECURRING_CALENDAR_ID
+        else:
+            shared_calendar_id = settings.GHL_SHARED_SINGLE_CALENDAR_ID
+        if shared_calendar_id:
+            targets.append((" ", shared_calendar_id, settings.GHL_SHARED_CALENDAR_ASSIGNEE_ID))
 
-        return occurrences
+        # Create appointments for each user and occurrence
+        for user_id, calendar_id, assignee_id in targets:
+            # Create appointments for each occurrence
+            for occurrence_number, occurrence_start_utc, occurrence_end_utc in occurrences:
+                if (user_id, occurrence_number) in skip:
+                    continue
+                try:
+                    # Prepare appointment data for GHL
+                    appointment_data = {
+                        "title": booking.get('title', 'Appointment'),
+                        "description": booking.get('description', ''),
+                        "appointmentStatus": "confirmed",
+                        "calendarId": calendar_id,
+                        "locationId": booking['locationId'],
+                        "contactId": booking['contactId'],
+                        "startTime": occurrence_start_utc.isoformat(),
+                        "endTime": occurrence_end_utc.isoformat(),
+                        "ignoreFreeSlotValidation": True
+                    }
+                    
+                    if assignee_id:
+                        appointment_data["assignedUserId"] = assignee_id
+                    
+                    # Create appointment in GHL
+                    ghl_response = cls.create_ghl_appointment(
+                        appointment_data,
+                        access_token
+                    )
+                    
+                    # Save to local database
+                    local_appointment = GHLAppointment.objects.create(
+                        ghl_appointment_id=ghl_response.get('id'),
+                        recurring_group=recurring_group,
+                        occurrence_number=occurrence_number if recurring_group else None,
+                        contact_id=booking['contactId'],
+                        assigned_to=user_id,
+                        calendar_id=calendar_id,
+                        location_id=booking['locationId'],
+                        title=booking.get('title', 'Appointment'),
+                        description=booking.get('description', ''),
+                        start_time=occurrence_start_utc,
+                        end_time=occurrence_end_utc
+                    )
+                    
+                    created_appointments.append(local_appointment)
+                    logger.info(f"Created appointment {local_appointment.id} for user {user_id}, occurrence {occurrence_number}")
+                    
+                except Exception as e:
+                    error_msg = f"Error creating occurrence {occurrence_number} for user {user_id}: {str(e)}"
+                    logger.error(error_msg)
+                    errors.append(error_msg)
+                    continue
+
+        bump_location_version(booking['locationId'])
+        return created_appointments, errors
     
     @classmethod
     def book_appointments(cls, validated_data):
         from datetime import timezone as dt_timezone
         
         """Book single or recurring appointments"""
-        created_appointments = []
-        errors = []
-        
         try:
             # Get auth credentials and timezone
             auth_creds = cls.get_auth_credentials(validated_data['locationId'])
@@ -475,135 +691,166 @@ class GHLAppointmentService:
             # Convert to UTC for GHL API (GHL expects UTC)
             start_dt_utc = start_dt_local.astimezone(pytz.UTC)
             end_dt_utc = end_dt_local.astimezone(pytz.UTC)
-            
-            # ... rest of the method remains the same
+
+            # Recurrence is expanded in the location's wall-clock time and each
+            # occurrence converted to UTC separately, so series survive DST
+            series_start = start_dt_utc.astimezone(recurrence.as_zoneinfo(location_tz))
             
             recurring_group = None
             if validated_data['type'] == 'recurring':
                 try:
-                    recurring_group = RecurringAppointmentGroup.objects.create(
+                    rule = validated_data.get('rrule') or recurrence.build_rrule(
+                        validated_data['interval'],
+                        validated_data.get('every', 1),
+                        validated_data.get('count', 12),
+                        series_start
+                    )
+                    interval, every = recurrence.rrule_frequency(rule, series_start)
+                    exdates = [day.isoformat() for day in validated_data.get('exdates', [])]
+
+                    recurring_group = RecurringAppointmentGroup(
                         title=validated_data.get('title', 'Recurring Appointment'),
                         description=validated_data.get('description', ''),
-                        interval=validated_data['interval'],
-                        total_count=validated_data.get('count', 12),
+                        interval=interval,
+                        every=every,
+                        rrule=rule,
+                        exdates=exdates,
+                        total_count=recurrence.count_occurrences(rule, series_start, exdates),
                         original_start_time=start_dt_utc,
                         original_end_time=end_dt_utc,
+                        timezone=location_tz.zone,
                         contact_id=validated_data['contactId'],
-                        location_id=validated_data['locationId']
+                        location_id=validated_data['locationId'],
+                        user_ids=validated_data['userIds'],
+                        materialization=validated_data.get('materialization') or settings.RECURRING_MATERIALIZATION_MODE,
+                        allow_conflicts=bool(validated_data.get('allowConflicts'))
                     )
-                    logger.info(f"Created recurring group: {recurring_group.group_id}")
                 except Exception as e:
                     logger.error(f"Failed to create recurring group: {str(e)}")
                     return [], [f"Failed to create recurring group: {str(e)}"]
             
             # Calculate occurrences
-            if validated_data['type'] == 'recurring':
-                occurrences = cls.calculate_occurrence_dates(
-                    start_dt_utc,
-                    end_dt_utc,
-                    validated_data['interval'],
-                    validated_data.get('every', 1),
-                    validated_data.get('count', 12)
-                )
+            if recurring_group:
+                occurrences = list(cls.iter_group_occurrences(recurring_group))
             else:
-                occurrences = [(start_dt_utc, end_dt_utc)]
+                occurrences = [(None, start_dt_utc, end_dt_utc)]
 
-            print("validated_data['userIds']:    ,", validated_data['userIds'])
-            
-            # Create appointments for each user and occurrence
-            for user_id in validated_data['userIds']+[" "]:
+            # Check the whole series for double-bookings before any GHL call
+            if not validated_data.get('allowConflicts'):
+                conflicts = availability.find_conflicts(
+                    validated_data['userIds'],
+                    [(occurrence_start, occurrence_end) for _, occurrence_start, occurrence_end in occurrences]
+                )
+                if conflicts:
+                    raise availability.AppointmentConflictError(conflicts)
+
+            if recurring_group:
+                if recurring_group.materialization == 'window':
+                    # Only book what falls inside the rolling horizon; the rest is
+                    # materialized later by extend_recurring_windows
+                    horizon_end = cls.get_materialization_horizon()
+                    occurrences = [occurrence for occurrence in occurrences if occurrence[1] < horizon_end]
+                    recurring_group.materialized_until = horizon_end
+                recurring_group.materialized_count = len(occurrences)
                 try:
-                    recurring_calendar_id = ""
-                    print("user id : ", user_id)
-                    # Get user details
-                    if user_id == " " and validated_data['type'] == "recurring":
-                        recurring_calendar_id = "wF51PIbLM1nKPjraUEKv"
-                    elif validated_data['type'] == "single" and user_id == " ":
-                        recurring_calendar_id = "1rwE7cUSN5MxPeI1CHiB"
-                    else:
-                        user = GHLUser.objects.get(user_id=user_id)
-                        
-                        if not user.calendar_id:
-                            errors.append(f"User {user_id} has no calendar assigned")
-                            continue
-                    
-                    # Create appointments for each occurrence
-                    for occurrence_number, (occurrence_start, occurrence_end) in enumerate(occurrences, 1):
-                        try:
-                            # MODIFIED: These are already in UTC, no need to convert again
-                            occurrence_start_utc = occurrence_start
-                            occurrence_end_utc = occurrence_end
-                            
-                            # Prepare appointment data for GHL
-                            appointment_data = {
-                                "title": validated_data.get('title', 'Appointment'),
-                                "description": validated_data.get('description', ''),
-                                "appointmentStatus": "confirmed",
-                                "calendarId": recurring_calendar_id if recurring_calendar_id else user.calendar_id,
-                                "locationId": validated_data['locationId'],
-                                "contactId": validated_data['contactId'],
-                                "startTime": occurrence_start_utc.isoformat(),
-                                "endTime": occurrence_end_utc.isoformat(),
-                                "ignoreFreeSlotValidation": True
-                            }
-                            
-                            if not recurring_calendar_id:
-                                appointment_data["assignedUserId"] = user_id
-                            else:
-                                appointment_data["assignedUserId"] = "qS7XxuUlhlrcyUUtmdGU"
-                            
-                            # Create appointment in GHL
-                            ghl_response = cls.create_ghl_appointment(
-                                appointment_data,
-                                auth_creds.access_token
-                            )
-                            
-                            # Save to local database (store in local timezone)
-                            local_appointment = GHLAppointment.objects.create(
-                                ghl_appointment_id=ghl_response.get('id'),
-                                recurring_group=recurring_group,
-                                occurrence_number=occurrence_number if recurring_group else None,
-                                contact_id=validated_data['contactId'],
-                                assigned_to=user_id,
-                                calendar_id=user.calendar_id if not recurring_calendar_id else recurring_calendar_id,
-                                location_id=validated_data['locationId'],
-                                title=validated_data.get('title', 'Appointment'),
-                                description=validated_data.get('description', ''),
-                                start_time=start_dt_local,  # Store in local timezone
-                                end_time=end_dt_local       # Store in local timezone
-                            )
-                            
-                            created_appointments.append(local_appointment)
-                            logger.info(f"Created appointment {local_appointment.id} for user {user_id}, occurrence {occurrence_number}")
-                            
-                        except Exception as e:
-                            error_msg = f"Error creating occurrence {occurrence_number} for user {user_id}: {str(e)}"
-                            logger.error(error_msg)
-                            errors.append(error_msg)
-                            continue
-                    
-                except GHLUser.DoesNotExist:
-                    error_msg = f"User {user_id} not found"
-                    logger.error(error_msg)
-                    errors.append(error_msg)
+                    recurring_group.save()
+                    logger.info(f"Created recurring group: {recurring_group.group_id}")
                 except Exception as e:
-                    error_msg = f"Error processing user {user_id}: {str(e)}"
-                    logger.error(error_msg)
-                    errors.append(error_msg)
-            
-            return created_appointments, errors
+                    logger.error(f"Failed to create recurring group: {str(e)}")
+                    return [], [f"Failed to create recurring group: {str(e)}"]
+
+            return cls.create_occurrences(
+                validated_data,
+                validated_data['userIds'],
+                occurrences,
+                auth_creds.access_token,
+                recurring_group=recurring_group
+            )
             
+        except availability.AppointmentConflictError:
+            raise
         except Exception as e:
             logger.error(f"Failed to book appointments: {str(e)}")
             raise ValueError(f"Failed to book appointments: {str(e)}")
 
+    @classmethod
+    def extend_materialization_window(cls, recurring_group, horizon_end=None):
+        """
+        Materialize the occurrences of a windowed series that have entered the
+        rolling horizon since it was last extended.
+
+        New occurrences get the same double-booking check as the original
+        booking (unless it allowed conflicts); conflicting ones are not
+        created for the users they conflict for and are reported in errors.
+
+        Returns (created_appointments, errors).
+        """
+        horizon_end = horizon_end or cls.get_materialization_horizon()
+        if recurring_group.materialized_count >= recurring_group.total_count:
+            return [], []
+
+        remaining = itertools.islice(
+            cls.iter_group_occurrences(recurring_group),
+            recurring_group.materialized_count,
+            None
+        )
+        occurrences = list(itertools.takewhile(lambda o: o[1] < horizon_end, remaining))
+
+        created_appointments, errors = [], []
+        if occurrences:
+            # Slots may have been taken since the series was booked; those
+            # occurrences are left out for the users they conflict for
+            skip = set()
+            if not recurring_group.allow_conflicts:
+                numbers = {start.isoformat(): number for number, start, _ in occurrences}
+                for conflict in availability.find_conflicts(
+                    list(recurring_group.user_ids),
+                    [(start, end) for _, start, end in occurrences]
+                ):
+                    number = numbers[conflict['start_time']]
+                    skip.add((conflict['user_id'], number))
+                    error_msg = (
+                        f"Occurrence {number} for user {conflict['user_id']} skipped: conflicts with "
+                        f"appointment {conflict['conflicting_appointment_id']}"
+                    )
+                    logger.warning(f"Recurring group {recurring_group.group_id}: {error_msg}")
+                    errors.append(error_msg)
+
+            access_token = cls.get_auth_credentials(recurring_group.location_id).access_token
+            booking = {
+                'type': 'recurring',
+                'title': recurring_group.title,
+                'description': recurring_group.description,
+                'locationId': recurring_group.location_id,
+                'contactId': recurring_group.contact_id,
+            }
+            created_appointments, create_errors = cls.create_occurrences(
+                booking,
+                list(recurring_group.user_ids),
+                occurrences,
+                access_token,
+                recurring_group=recurring_group,
+                skip=skip
+            )
+            errors += create_errors
+
+        recurring_group.materialized_count += len(occurrences)
+        recurring_group.materialized_until = horizon_end
+        recurring_group.save(update_fields=['materialized_count', 'materialized_until', 'updated_at'])
+
+        logger.info(
+            f"Extended recurring group {recurring_group.group_id} by {len(occurrences)} occurrence(s) "
+            f"to {recurring_group.materialized_count}/{recurring_group.total_count}"
+        )
+        return created_appointments, errors
+
     
     @classmethod
     def update_appointment(cls, appointment_id, validated_data):
         """Update an existing appointment"""
         try:
             # Get local appointment
-            appointment = GHLAppointment.objects.get(id=appointment_id)
+            appointment = GHLAppointment.objects.get(id=appointment_id, is_active=True)
             
             # Get auth credentials and timezone
             auth_creds = cls.get_auth_credentials(appointment.location_id)
@@ -649,6 +896,7 @@ class GHLAppointmentService:
             
             # Save local changes
             appointment.save()
+            bump_location_version(appointment.location_id)
             
             return appointment
             
@@ -660,35 +908,427 @@ class GHLAppointmentService:
 
     
     @classmethod
-    def delete_appointment(cls, appointment_id):
-        """Delete an appointment"""
-        try:
-            # Get local appointment
-            appointment = GHLAppointment.objects.get(id=appointment_id)
-            print("hereeee: got 1")
-            # Get auth credentials
-            auth_creds = cls.get_auth_credentials(appointment.location_id)
+    def update_series(cls, recurring_group, validated_data):
+        """
+        Update every occurrence (scope 'all') or an occurrence and all that
+        follow it (scope 'following') of a recurring group in one operation.
 
-            
-            # Delete from GHL
-            if appointment.ghl_appointment_id:
-                print("hereeee: ")
-                cls.delete_ghl_appointment(
-                    appointment.ghl_appointment_id,
-                    auth_creds.access_token
+        New times are given for the first affected occurrence; every other
+        occurrence is moved by the same local wall-clock shift, so the change
+        stays correct across DST. Moving 'all' occurrences of a series that
+        already started leaves the past ones where they are and anchors the
+        shift on the first upcoming one; the group's rule and excluded dates
+        move along so later materialization follows. GHL updates run
+        concurrently and the local rows are written with one bulk_update.
+
+        Only occurrences GHL accepted change locally. When any update fails
+        the series definition is left as it was and the failed occurrences
+        are returned, so they can be retried before the series is edited.
+
+        Returns:
+            Tuple (updated_appointments, failed)
+        """
+        scope = validated_data['scope']
+        tz = recurrence.as_zoneinfo(
+            recurring_group.timezone or cls.get_location_timezone(recurring_group.location_id)
+        )
+        moving = 'startDateTime' in validated_data
+
+        now = timezone.now()
+        appointments = recurring_group.appointments.filter(is_active=True)
+        if scope == 'following':
+            # Later occurrences would be materialized from the unchanged rule
+            if moving and recurring_group.materialized_count < recurring_group.total_count:
+                raise ValueError(
+                    f"Cannot move following occurrences of a series that is not fully materialized "
+                    f"({recurring_group.materialized_count} of {recurring_group.total_count} booked); "
+                    f"move all occurrences instead"
                 )
-            
-            # Delete from local database
-            appointment.delete()
-            
-            return True
-            
-        except GHLAppointment.DoesNotExist:
+            appointments = appointments.filter(occurrence_number__gte=validated_data['occurrence_number'])
+        appointments = list(appointments.order_by('occurrence_number', 'start_time'))
+        if not appointments:
+            raise ValueError("No occurrences to update")
+
+        # Occurrences that already started stay put when moving the whole series
+        moved = [
+            appointment for appointment in appointments
+            if scope == 'following' or appointment.start_time >= now
+        ] if moving else []
+        moved_ids = {appointment.id for appointment in moved}
+        if moving and not moved:
+            raise ValueError("No upcoming occurrences to move")
+
+        def to_local(dt):
+            return dt.astimezone(tz).replace(tzinfo=None)
+
+        def to_utc(local_dt):
+            return local_dt.replace(tzinfo=tz).astimezone(pytz.UTC)
+
+        shift = duration = None
+        if moving:
+            shift = to_local(validated_data['startDateTime']) - to_local(moved[0].start_time)
+            if 'endDateTime' in validated_data:
+                duration = validated_data['endDateTime'] - validated_data['startDateTime']
+
+        # Work out the new series definition before anything is pushed, rejecting rules it can't follow
+        series_update = {}
+        if scope == 'all':
+            if 'title' in validated_data:
+                series_update['title'] = validated_data['title']
+            if 'description' in validated_data:
+                series_update['description'] = validated_data['description']
+            if moving:
+                series_start = recurring_group.original_start_time
+                if recurring_group.rrule:
+                    series_update['rrule'] = recurrence.shift_rrule(recurring_group.rrule, series_start, shift, tz=tz)
+                series_update['exdates'] = recurrence.shift_exdates(recurring_group.exdates, series_start, shift, tz=tz)
+                original_start = to_utc(to_local(series_start) + shift)
+                series_update['original_end_time'] = original_start + (
+                    duration or recurring_group.original_end_time - series_start
+                )
+                series_update['original_start_time'] = original_start
+
+        # Compute every occurrence's new values up front
+        rows = []
+        for appointment in appointments:
+            update_data = {}
+            if 'title' in validated_data:
+                update_data['title'] = validated_data['title']
+                appointment.title = validated_data['title']
+            if 'description' in validated_data:
+                update_data['description'] = validated_data['description']
+                appointment.description = validated_data['description']
+            if appointment.id in moved_ids:
+                new_start = to_utc(to_local(appointment.start_time) + shift)
+                new_end = new_start + (duration or appointment.end_time - appointment.start_time)
+                update_data['startTime'] = new_start.isoformat()
+                update_data['endTime'] = new_end.isoformat()
+                appointment.start_time = new_start
+                appointment.end_time = new_end
+
+            if not update_data:
+                continue
+            rows.append({
+                'id': appointment.id,
+                'location_id': appointment.location_id,
+                'ghl_appointment_id': appointment.ghl_appointment_id,
+                'update_data': update_data,
+            })
+
+        # Push to GHL concurrently; only occurrences GHL accepted change locally
+        succeeded, failed = cls.run_ghl_requests(
+            [row for row in rows if row['ghl_appointment_id']],
+            lambda row, access_token: cls.update_ghl_appointment(
+                row['ghl_appointment_id'],
+                row['update_data'],
+                access_token
+            )
+        )
+        updated_ids = {row['id'] for row in succeeded}
+        updated_ids.update(row['id'] for row in rows if not row['ghl_appointment_id'])
+
+        updated_appointments = [appointment for appointment in appointments if appointment.id in updated_ids]
+        for appointment in updated_appointments:
+            appointment.updated_at = now
+        GHLAppointment.objects.bulk_update(
+            updated_appointments,
+            ['title', 'description', 'start_time', 'end_time', 'updated_at'],
+            batch_size=500
+        )
+
+        # Occurrences materialized later must follow the new series definition,
+        # but only once GHL holds every occurrence in scope at its new values;
+        # after a partial failure the failed occurrences are retried on their own
+        if series_update and not failed:
+            for field, value in series_update.items():
+                setattr(recurring_group, field, value)
+            recurring_group.save()
+        bump_location_version(recurring_group.location_id)
+
+        logger.info(
+            f"Updated {len(updated_appointments)} occurrence(s) of recurring group "
+            f"{recurring_group.group_id} ({scope}), {len(failed)} failed"
+        )
+        return updated_appointments, failed
+
+    @classmethod
+    def delete_appointment(cls, appointment_id):
+        """
+        Soft-delete an appointment with a single UPDATE and schedule the
+        reconciliation worker that pushes the deletion to GHL.
+        """
+        now = timezone.now()
+        updated = GHLAppointment.objects.filter(id=appointment_id, is_active=True).update(
+            is_active=False,
+            deleted_at=now,
+            updated_at=now
+        )
+        if not updated:
             raise ValueError("Appointment not found")
-        except Exception as e:
-            raise ValueError(f"Failed to delete appointment: {str(e)}")
 
+        bump_location_version(
+            GHLAppointment.objects.filter(id=appointment_id).values_list('location_id', flat=True).first()
+        )
+        transaction.on_commit(cls.schedule_reconciliation)
+        return True
+
+    @classmethod
+    def schedule_reconciliation(cls):
+        """Enqueue one reconciliation run for all deletes made in the next few seconds"""
+        from .tasks import reconcile_deleted_appointments
+
+        if cache.add('ghl:reconcile-scheduled', True, timeout=cls.RECONCILE_DELAY):
+            reconcile_deleted_appointments.apply_async(countdown=cls.RECONCILE_DELAY)
+
+    @classmethod
+    def run_ghl_requests(cls, rows, request):
+        """
+        Call ``request(row, access_token)`` for every row on a thread pool.
+
+        Credentials are fetched once per location and calls are rate limited
+        per location. Rows are dicts with at least 'id' and 'location_id'.
+
+        Returns:
+            Tuple (succeeded_rows, failed) where failed is a list of
+            {'appointment_id', 'error'} dicts
+        """
+        succeeded = []
+        failed = []
+
+        access_tokens = {}
+        limiters = {}
+        for location_id in {row['location_id'] for row in rows}:
+            try:
+                access_tokens[location_id] = cls.get_auth_credentials(location_id).access_token
+                limiters[location_id] = RateLimiter(cls.GHL_REQUESTS_PER_SECOND)
+            except ValueError as e:
+                failed.extend(
+                    {'appointment_id': row['id'], 'error': str(e)}
+                    for row in rows if row['location_id'] == location_id
+                )
+        rows = [row for row in rows if row['location_id'] in access_tokens]
+
+        def call(row):
+            limiters[row['location_id']].acquire()
+            request(row, access_tokens[row['location_id']])
+            return row
+
+        if rows:
+            with ThreadPoolExecutor(max_workers=min(cls.GHL_MAX_WORKERS, len(rows))) as executor:
+                futures = {executor.submit(call, row): row for row in rows}
+                for future in as_completed(futures):
+                    row = futures[future]
+                    try:
+                        succeeded.append(future.result())
+                    except Exception as e:
+                        logger.error(f"GHL request failed for appointment {row['id']}: {str(e)}")
+                        failed.append({'appointment_id': row['id'], 'error': str(e)})
+
+        return succeeded, failed
+
+    @classmethod
+    def delete_from_ghl(cls, appointments):
+        """
+        Delete appointments from GHL only, concurrently and rate limited.
+        Appointments without a GHL id count as deleted.
+
+        Args:
+            appointments: GHLAppointment queryset
+
+        Returns:
+            Tuple (deleted_ids, failed) where failed is a list of
+            {'appointment_id', 'error'} dicts
+        """
+        rows = list(appointments.values('id', 'ghl_appointment_id', 'location_id'))
+
+        deleted_ids = [row['id'] for row in rows if not row['ghl_appointment_id']]
+
+        succeeded, failed = cls.run_ghl_requests(
+            [row for row in rows if row['ghl_appointment_id']],
+            lambda row, access_token: cls.delete_ghl_appointment(
+                row['ghl_appointment_id'],
+                access_token,
+                missing_ok=True
+            )
+        )
+        deleted_ids.extend(row['id'] for row in succeeded)
+
+        return deleted_ids, failed
+
+    @classmethod
+    def bulk_delete_appointments(cls, appointments):
+        """
+        Delete many appointments from GHL and then remove the local rows that
+        are gone from GHL with a single query. No transaction is held open
+        during the network phase.
+
+        Returns the same (deleted_ids, failed) tuple as delete_from_ghl.
+        """
+        deleted_ids, failed = cls.delete_from_ghl(appointments)
+
+        if deleted_ids:
+            deleted = GHLAppointment.objects.filter(id__in=deleted_ids)
+            with transaction.atomic():
+                changes.log_deletions(deleted)
+                deleted.delete()
+
+        return deleted_ids, failed
+
+    @classmethod
+    def reconcile_deleted_appointments(cls):
+        """
+        Push soft-deleted appointments to GHL in batches.
+
+        Tombstones that GHL confirmed get ghl_deleted_at; failures keep their
+        tombstone and are retried on later runs until RECONCILE_MAX_ATTEMPTS.
+
+        Returns (synced_count, failed_count).
+        """
+        pending = GHLAppointment.objects.filter(
+            is_active=False,
+            deleted_at__isnull=False,
+            ghl_deleted_at__isnull=True,
+            ghl_delete_attempts__lt=cls.RECONCILE_MAX_ATTEMPTS
+        ).order_by('id')
+
+        synced_count = 0
+        failed_count = 0
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id).values_list('id', flat=True)[:cls.RECONCILE_BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1]
+
+            deleted_ids, failed = cls.delete_from_ghl(GHLAppointment.objects.filter(id__in=batch))
 
+            now = timezone.now()
+            if deleted_ids:
+                GHLAppointment.objects.filter(id__in=deleted_ids).update(ghl_deleted_at=now)
+            if failed:
+                GHLAppointment.objects.filter(
+                    id__in=[failure['appointment_id'] for failure in failed]
+                ).update(ghl_delete_attempts=F('ghl_delete_attempts') + 1)
 
+            synced_count += len(deleted_ids)
+            failed_count += len(failed)
 
+        logger.info(f"Reconciled deletions: {synced_count} pushed to GHL, {failed_count} failed")
+        return synced_count, failed_count
 
+    @classmethod
+    def purge_tombstones(cls):
+        """Hard-delete tombstones GHL confirmed more than TOMBSTONE_RETENTION ago"""
+        cutoff = timezone.now() - cls.TOMBSTONE_RETENTION
+        purged, _ = GHLAppointment.objects.filter(
+            is_active=False,
+            ghl_deleted_at__lt=cutoff
+        ).delete()
+        changes.prune_deletion_log()
+        return purged
+
+    @classmethod
+    def create_group_deletion_job(cls, recurring_group):
+        """
+        Mark a recurring group as deleting and create its deletion job.
+
+        Returns (job, started); an already running job for the group is
+        returned instead of starting a second one, and a stale one is
+        returned to be processed again.
+        """
+        with transaction.atomic():
+            group = RecurringAppointmentGroup.objects.select_for_update().get(pk=recurring_group.pk)
+
+            job = group.deletion_jobs.filter(
+                status__in=RecurringGroupDeletionJob.ACTIVE_STATUSES
+            ).first()
+            if job:
+                if job.updated_at >= timezone.now() - cls.DELETION_JOB_STALE_AFTER:
+                    return job, False
+                logger.warning(f"Resuming stale deletion job {job.job_id} ({job.status})")
+                job.save(update_fields=['updated_at'])
+                return job, True
+
+            group.is_deleting = True
+            group.save(update_fields=['is_deleting', 'updated_at'])
+            transaction.on_commit(lambda: bump_location_version(group.location_id))
+
+            job = RecurringGroupDeletionJob.objects.create(
+                recurring_group=group,
+                total_count=group.appointments.filter(is_active=True).count()
+            )
+            return job, True
+
+    @classmethod
+    def process_group_deletion_job(cls, job):
+        """
+        Delete a job's outstanding occurrences in batches, recording progress
+        after each batch. Only the job's retry queue is processed when an
+        earlier attempt left failures behind.
+
+        Returns the list of failed deletions.
+        """
+        RecurringGroupDeletionJob.objects.filter(pk=job.pk).update(
+            status='running',
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now()
+        )
+
+        appointments = GHLAppointment.objects.filter(recurring_group_id=job.recurring_group_id)
+        if job.failed_appointment_ids:
+            appointments = appointments.filter(id__in=job.failed_appointment_ids)
+        else:
+            appointments = appointments.filter(is_active=True)
+        appointment_ids = list(appointments.order_by('id').values_list('id', flat=True))
+
+        failed = []
+        for i in range(0, len(appointment_ids), cls.DELETION_BATCH_SIZE):
+            batch = appointment_ids[i:i + cls.DELETION_BATCH_SIZE]
+            deleted_ids, batch_failed = cls.bulk_delete_appointments(
+                GHLAppointment.objects.filter(id__in=batch)
+            )
+            failed.extend(batch_failed)
+
+            RecurringGroupDeletionJob.objects.filter(pk=job.pk).update(
+                deleted_count=F('deleted_count') + len(deleted_ids),
+                updated_at=timezone.now()
+            )
+            logger.info(f"Deletion job {job.job_id}: deleted {len(deleted_ids)}, failed {len(batch_failed)}")
+
+        job.refresh_from_db()
+        job.failed_appointment_ids = [failure['appointment_id'] for failure in failed]
+        job.errors = failed
+        job.save(update_fields=['failed_appointment_ids', 'errors', 'updated_at'])
+
+        return failed
+
+    @classmethod
+    def stale_group_deletion_jobs(cls):
+        """Active deletion jobs nothing has worked on for DELETION_JOB_STALE_AFTER"""
+        return RecurringGroupDeletionJob.objects.filter(
+            status__in=RecurringGroupDeletionJob.ACTIVE_STATUSES,
+            updated_at__lt=timezone.now() - cls.DELETION_JOB_STALE_AFTER
+        )
+
+    @classmethod
+    def fail_group_deletion_job(cls, job, error):
+        """Close a deletion job that crashed, keeping the error for the poller"""
+        job.refresh_from_db()
+        job.errors = list(job.errors) + [{'error': error}]
+        job.save(update_fields=['errors', 'updated_at'])
+        cls.finish_group_deletion_job(job, succeeded=False)
+
+    @classmethod
+    def finish_group_deletion_job(cls, job, succeeded):
+        """Close a deletion job and release (or deactivate) its group"""
+        job.status = 'completed' if succeeded else 'failed'
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'completed_at', 'updated_at'])
+
+        group_updates = {'is_deleting': False, 'updated_at': timezone.now()}
+        if succeeded:
+            group_updates['is_active'] = False
+        RecurringAppointmentGroup.objects.filter(pk=job.recurring_group_id).update(**group_updates)
+        bump_location_version(
+            RecurringAppointmentGroup.objects.filter(pk=job.recurring_group_id).values_list('location_id', flat=True).first()
+        )
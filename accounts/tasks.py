@@ -1,55 +1,163 @@
-import requests
+from datetime import date, timedelta
 from celery import shared_task
+from django.core.cache import cache
+from django.db.models import F
 from ghl_auth.models import GHLAuthCredentials
-from decouple import config
-from accounts.services import fetch_all_contacts
+from ghl_auth import token_provider
+from accounts.services import fetch_all_contacts, sync_all_users
+from accounts import archive, calendars, rollups
+
+# The daily refresh only rotates tokens that would expire before the next run
+SCHEDULED_REFRESH_MARGIN = timedelta(hours=12)
+
 
 @shared_task
 def make_api_call():
-    tokens = GHLAuthCredentials.objects.all()
-
-    for credentials in tokens:
-    
-        print("credentials tokenL", credentials)
-        refresh_token = credentials.refresh_token
-
-        
-        response = requests.post('https://services.leadconnectorhq.com/oauth/token', data={
-            'grant_type': 'refresh_token',
-            'client_id': config("GHL_CLIENT_ID"),
-            'client_secret': config("GHL_CLIENT_SECRET"),
-            'refresh_token': refresh_token
-        })
-        
-        new_tokens = response.json()
-        obj, created = GHLAuthCredentials.objects.update_or_create(
-                location_id= new_tokens.get("locationId"),
-                defaults={
-                    "access_token": new_tokens.get("access_token"),
-                    "refresh_token": new_tokens.get("refresh_token"),
-                    "expires_in": new_tokens.get("expires_in"),
-                    "scope": new_tokens.get("scope"),
-                    "user_type": new_tokens.get("userType"),
-                    "company_id": new_tokens.get("companyId"),
-                    "user_id":new_tokens.get("userId"),
-
-                }
-            )
-        print("refreshed: ", obj)
-
-
-@shared_task
-def async_fetch_all_contacts(location_id, access_token):
+    location_ids = GHLAuthCredentials.objects.filter(
+        is_approved=True
+    ).exclude(location_id__isnull=True).values_list('location_id', flat=True)
+
+    for location_id in location_ids:
+        try:
+            token = token_provider.refresh_credentials(location_id, min_remaining=SCHEDULED_REFRESH_MARGIN)
+            print("refreshed: ", location_id, token.expires_at)
+        except Exception as e:
+            print(f"Failed to refresh token for {location_id}: {e}")
+
+
+@shared_task
+def async_fetch_all_contacts(location_id, access_token=None):
     fetch_all_contacts(location_id, access_token)
 
 
 
-from accounts.models import RecurringAppointmentGroup
+from accounts.models import RecurringAppointmentGroup, RecurringGroupDeletionJob
+from accounts.services import GHLAppointmentService
+
+# Failed GHL deletes are retried with exponential backoff starting here (seconds)
+DELETION_RETRY_BACKOFF = 60
+
+
+@shared_task(bind=True, max_retries=5)
+def process_group_deletion_job(self, job_id):
+    job = RecurringGroupDeletionJob.objects.get(job_id=job_id)
+    if job.status in ('completed', 'failed'):
+        return
+
+    try:
+        failed = GHLAppointmentService.process_group_deletion_job(job)
+    except Exception as e:
+        # Don't leave the job active, it would block deleting the group again
+        print(f"Deletion job {job_id} crashed: {e}")
+        GHLAppointmentService.fail_group_deletion_job(job, str(e))
+        raise
+
+    if not failed:
+        GHLAppointmentService.finish_group_deletion_job(job, succeeded=True)
+        return
+
+    if self.request.retries < self.max_retries:
+        job.status = 'retrying'
+        job.save(update_fields=['status', 'updated_at'])
+        raise self.retry(countdown=DELETION_RETRY_BACKOFF * 2 ** self.request.retries)
+
+    GHLAppointmentService.finish_group_deletion_job(job, succeeded=False)
+
+
 @shared_task
 def deletion_task():
+    groups = RecurringAppointmentGroup.objects.filter(is_active=True, is_deleting=False)
+
+    for group in groups:
+        job, started = GHLAppointmentService.create_group_deletion_job(group)
+        if started:
+            process_group_deletion_job.delay(str(job.job_id))
+            print(f"started deletion job {job.job_id} for group {group.group_id}")
 
-    r = RecurringAppointmentGroup.objects.all()
 
-    for j in r:
-        res = requests.delete(f"http://localhost:8000/api/accounts/recurring-groups/{j.group_id}/delete/")
-        print(res.status_code, res.text)
\ No newline at end of file
+@shared_task
+def resume_stale_deletion_jobs():
+    for job in GHLAppointmentService.stale_group_deletion_jobs().select_related('recurring_group'):
+        job, started = GHLAppointmentService.create_group_deletion_job(job.recurring_group)
+        if started:
+            process_group_deletion_job.delay(str(job.job_id))
+            print(f"resumed deletion job {job.job_id}")
+
+
+@shared_task
+def reconcile_deleted_appointments():
+    synced, failed = GHLAppointmentService.reconcile_deleted_appointments()
+    print(f"reconciled deletions: {synced} synced, {failed} failed")
+
+
+@shared_task
+def purge_appointment_tombstones():
+    purged = GHLAppointmentService.purge_tombstones()
+    print(f"purged {purged} appointment tombstones")
+
+
+@shared_task
+def extend_recurring_windows():
+    groups = RecurringAppointmentGroup.objects.filter(
+        is_active=True,
+        is_deleting=False,
+        materialization='window',
+        materialized_count__lt=F('total_count')
+    )
+    horizon_end = GHLAppointmentService.get_materialization_horizon()
+
+    for group in groups.iterator():
+        # Skip groups another worker is already extending
+        lock_key = f"recurring-window:{group.group_id}"
+        if not cache.add(lock_key, True, timeout=600):
+            continue
+        try:
+            created, errors = GHLAppointmentService.extend_materialization_window(group, horizon_end)
+            print(f"extended {group.group_id}: {len(created)} created, {len(errors)} errors")
+        except Exception as e:
+            print(f"Failed to extend recurring group {group.group_id}: {e}")
+        finally:
+            cache.delete(lock_key)
+
+
+@shared_task
+def refresh_appointment_rollups(first_day=None, last_day=None, location_ids=None):
+    # Rebuilds delete and re-insert a location's days; don't overlap them
+    if not cache.add("appointment-rollups:refresh", True, timeout=900):
+        print("rollup refresh already running, skipping")
+        return
+
+    try:
+        first_day = date.fromisoformat(first_day) if first_day else None
+        last_day = date.fromisoformat(last_day) if last_day else None
+        written = rollups.recompute_rollups(first_day, last_day, location_ids)
+        print(f"refreshed rollups: {sum(written.values())} rows across {len(written)} locations")
+    finally:
+        cache.delete("appointment-rollups:refresh")
+
+
+@shared_task
+def sync_location_users(location_ids=None):
+    results = sync_all_users(location_ids)
+    for location_id, result in results.items():
+        print(f"user sync {location_id}: {result}")
+
+
+@shared_task
+def discover_location_calendars(location_ids=None):
+    results = calendars.discover_all_calendars(location_ids)
+    for location_id, result in results.items():
+        print(f"calendar discovery {location_id}: {result}")
+
+
+@shared_task
+def archive_past_appointments():
+    if not cache.add("appointment-archive:run", True, timeout=3600):
+        print("appointment archive already running, skipping")
+        return
+
+    try:
+        moved = archive.archive_appointments()
+        print(f"archived {moved} past appointments")
+    finally:
+        cache.delete("appointment-archive:run")
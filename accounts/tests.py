@@ -1,3 +1,1537 @@
-from django.test import TestCase
+import csv
+import json
+import re
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import pytz
+from celery.exceptions import Retry
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from calendar_app import db_routing
+from ghl_auth.models import GHLAuthCredentials
+from . import archive, calendars, changes, ics, rollups, services, tasks
+from .availability import AppointmentConflictError, find_conflicts, get_free_busy
+from .caching import bump_location_version
+from .contacts import upsert_contacts
+from .models import (
+    AppointmentDailyRollup, AppointmentDeletionLog, ArchivedAppointment, Contact, GHLAppointment, GHLUser,
+    RecurringAppointmentGroup, RecurringGroupDeletionJob
+)
+from .recurrence import (
+    build_rrule, count_occurrences, iter_occurrences, parse_rrule, rrule_frequency, shift_exdates, shift_rrule
+)
+from .services import GHLAppointmentService, upsert_location_users
+
+
+NEW_YORK = ZoneInfo('America/New_York')
+UTC = ZoneInfo('UTC')
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def connect_location(location_id='loc-1', tz='UTC'):
+    """Approved credentials with a token that needs no refresh"""
+    return GHLAuthCredentials.objects.create(
+        location_id=location_id,
+        access_token='token',
+        refresh_token='refresh',
+        expires_in=86399,
+        expires_at=timezone.now() + timedelta(hours=12),
+        timezone=tz,
+    )
+
+
+def make_user(user_id='user-1', location_id='loc-1', **fields):
+    values = {
+        'first_name': 'Test',
+        'last_name': 'User',
+        'name': f'Test User {user_id}',
+        'phone': '',
+        'calendar_id': f'calendar-{user_id}',
+        'location_id': location_id,
+    }
+    values.update(fields)
+    return GHLUser.objects.create(user_id=user_id, **values)
+
+
+def ghl_created(appointment_data, access_token):
+    """Stand-in for GHL's create endpoint"""
+    ghl_created.count = getattr(ghl_created, 'count', 0) + 1
+    return {'id': f"ghl-created-{ghl_created.count}"}
+
+
+def make_group(**fields):
+    start = fields.pop('original_start_time', timezone.now() + timedelta(days=1))
+    values = {
+        'title': 'Series',
+        'interval': 'weekly',
+        'every': 1,
+        'total_count': 3,
+        'materialized_count': 3,
+        'original_start_time': start,
+        'original_end_time': start + timedelta(hours=1),
+        'contact_id': 'contact-1',
+        'location_id': 'loc-1',
+        'user_ids': ['user-1'],
+    }
+    values.update(fields)
+    return RecurringAppointmentGroup.objects.create(**values)
+
+
+def make_series(group, **fields):
+    """Materialize a group's occurrences as appointments"""
+    return [
+        make_appointment(
+            recurring_group=group,
+            occurrence_number=number,
+            start_time=start,
+            end_time=end,
+            title=group.title,
+            description=group.description,
+            ghl_appointment_id=f"ghl-{group.pk}-{number}",
+            **fields
+        )
+        for number, start, end in GHLAppointmentService.iter_group_occurrences(group)
+    ]
+
+
+def make_appointment(**fields):
+    start = fields.pop('start_time', timezone.now() + timedelta(days=1))
+    values = {
+        'contact_id': 'contact-1',
+        'assigned_to': 'user-1',
+        'calendar_id': 'calendar-1',
+        'location_id': 'loc-1',
+        'title': 'Appointment',
+        'start_time': start,
+        'end_time': start + timedelta(hours=1),
+    }
+    values.update(fields)
+    return GHLAppointment.objects.create(**values)
+
+
+class RecurrenceDSTTests(SimpleTestCase):
+    """Recurring series keep their local wall-clock time across DST transitions"""
+
+    def test_weekly_series_across_spring_forward(self):
+        # DST starts in New York on 2026-03-08
+        start = datetime(2026, 3, 2, 10, 0, tzinfo=NEW_YORK)
+        occurrences = GHLAppointmentService.calculate_occurrence_dates(
+            start, start + timedelta(hours=1), 'weekly', 1, 3, tz=NEW_YORK
+        )
+
+        self.assertEqual(
+            [occurrence_start.astimezone(UTC).hour for occurrence_start, _ in occurrences],
+            [15, 14, 14]
+        )
+        for occurrence_start, occurrence_end in occurrences:
+            self.assertEqual(occurrence_start.astimezone(NEW_YORK).hour, 10)
+            self.assertEqual(occurrence_end - occurrence_start, timedelta(hours=1))
+
+    def test_weekly_series_across_fall_back(self):
+        # DST ends in New York on 2026-11-01
+        start = datetime(2026, 10, 26, 9, 30, tzinfo=NEW_YORK)
+        occurrences = GHLAppointmentService.calculate_occurrence_dates(
+            start, start + timedelta(minutes=45), 'weekly', 1, 2, tz=NEW_YORK
+        )
+
+        self.assertEqual(
+            [occurrence_start.astimezone(UTC).strftime('%H:%M') for occurrence_start, _ in occurrences],
+            ['13:30', '14:30']
+        )
+
+    def test_occurrences_are_returned_in_utc(self):
+        start = datetime(2026, 3, 2, 10, 0, tzinfo=NEW_YORK)
+        rule = build_rrule('daily', 1, 2, start)
+
+        for occurrence_start, occurrence_end in iter_occurrences(rule, start, timedelta(hours=1), tz=NEW_YORK):
+            self.assertEqual(occurrence_start.utcoffset(), timedelta(0))
+            self.assertEqual(occurrence_end.utcoffset(), timedelta(0))
+
+    def test_pytz_location_timezone_is_accepted(self):
+        location_tz = pytz.timezone('America/New_York')
+        start = location_tz.localize(datetime(2026, 3, 2, 10, 0))
+        occurrences = GHLAppointmentService.calculate_occurrence_dates(
+            start, start + timedelta(hours=1), 'weekly', 1, 2, tz=location_tz
+        )
+
+        self.assertEqual(occurrences[1][0].astimezone(NEW_YORK).hour, 10)
+
+    def test_byday_uses_local_weekday(self):
+        # 20:00 Monday in New York is already Tuesday in UTC
+        start = datetime(2026, 3, 2, 20, 0, tzinfo=NEW_YORK)
+        occurrences = list(iter_occurrences(
+            'FREQ=WEEKLY;BYDAY=MO,WE;COUNT=4', start, timedelta(hours=1), tz=NEW_YORK
+        ))
+
+        self.assertEqual(
+            [occurrence_start.astimezone(NEW_YORK).strftime('%a') for occurrence_start, _ in occurrences],
+            ['Mon', 'Wed', 'Mon', 'Wed']
+        )
+        self.assertTrue(all(occurrence_start.astimezone(NEW_YORK).hour == 20 for occurrence_start, _ in occurrences))
+
+    def test_exdates_are_local_dates(self):
+        start = datetime(2026, 3, 2, 20, 0, tzinfo=NEW_YORK)
+        occurrences = list(iter_occurrences(
+            'FREQ=DAILY;COUNT=3', start, timedelta(hours=1), exdates=['2026-03-03'], tz=NEW_YORK
+        ))
+
+        self.assertEqual(
+            [occurrence_start.astimezone(NEW_YORK).date() for occurrence_start, _ in occurrences],
+            [date(2026, 3, 2), date(2026, 3, 4)]
+        )
+
+    def test_until_in_utc_is_respected_across_dst(self):
+        start = datetime(2026, 3, 2, 10, 0, tzinfo=NEW_YORK)
+
+        self.assertEqual(
+            count_occurrences('FREQ=WEEKLY;UNTIL=20260316T140000Z', start, tz=NEW_YORK),
+            3
+        )
+
+    def test_group_expansion_uses_stored_timezone(self):
+        start = datetime(2026, 3, 2, 15, 0, tzinfo=UTC)
+        group = RecurringAppointmentGroup(
+            interval='weekly',
+            every=1,
+            total_count=2,
+            original_start_time=start,
+            original_end_time=start + timedelta(hours=1),
+            timezone='America/New_York'
+        )
+
+        occurrences = list(GHLAppointmentService.iter_group_occurrences(group))
+
+        self.assertEqual([occurrence_number for occurrence_number, _, _ in occurrences], [1, 2])
+        self.assertEqual(occurrences[1][1], datetime(2026, 3, 9, 14, 0, tzinfo=UTC))
+
+
+class RecurrenceRuleTests(SimpleTestCase):
+    """Stored RRULEs are validated and expanded like the legacy interval bookings"""
+
+    def test_monthly_on_the_31st_falls_back_to_month_end(self):
+        start = datetime(2026, 1, 31, 9, 0, tzinfo=UTC)
+        rule = build_rrule('monthly', 1, 3, start)
+
+        self.assertEqual(
+            [occurrence_start.date() for occurrence_start, _ in iter_occurrences(rule, start, timedelta(hours=1))],
+            [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)]
+        )
+
+    def test_byday_rule_with_until(self):
+        start = datetime(2026, 3, 2, 9, 0, tzinfo=UTC)
+        occurrences = list(iter_occurrences(
+            'RRULE:FREQ=WEEKLY;BYDAY=MO,FR;UNTIL=20260313T090000Z', start, timedelta(minutes=30)
+        ))
+
+        self.assertEqual(
+            [occurrence_start.date() for occurrence_start, _ in occurrences],
+            [date(2026, 3, 2), date(2026, 3, 6), date(2026, 3, 9), date(2026, 3, 13)]
+        )
+        self.assertEqual(rrule_frequency('FREQ=WEEKLY;INTERVAL=2;COUNT=4', start), ('weekly', 2))
+
+    def test_invalid_rules_are_rejected(self):
+        start = datetime(2026, 3, 2, 9, 0, tzinfo=UTC)
+        for rule in ('', 'FREQ=HOURLY;COUNT=3', 'FREQ=WEEKLY', 'FREQ=WEEKLY;BYDAY=XX;COUNT=2'):
+            with self.subTest(rule=rule), self.assertRaises(ValueError):
+                parse_rrule(rule, start)
+
+    def test_limit_caps_unbounded_expansion(self):
+        start = datetime(2026, 3, 2, 9, 0, tzinfo=UTC)
+
+        self.assertEqual(count_occurrences('FREQ=DAILY;COUNT=1000', start, limit=365), 365)
+
+    def test_shifted_rule_follows_its_occurrences(self):
+        # Mon/Wed 10:00 New York, every other week, moved to Tue/Thu 11:30
+        start = datetime(2026, 3, 2, 10, 0, tzinfo=NEW_YORK)
+        rule = 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;UNTIL=20260316T150000Z'
+        shift = timedelta(days=1, hours=1, minutes=30)
+
+        shifted = shift_rrule(rule, start, shift, tz=NEW_YORK)
+
+        self.assertEqual(shifted, 'FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH;UNTIL=20260317T163000Z;WKST=TU')
+        self.assertEqual(
+            [s.astimezone(NEW_YORK).replace(tzinfo=None) for s, _ in iter_occurrences(
+                shifted, start + shift, timedelta(hours=1), tz=NEW_YORK
+            )],
+            [s.astimezone(NEW_YORK).replace(tzinfo=None) + shift for s, _ in iter_occurrences(
+                rule, start, timedelta(hours=1), tz=NEW_YORK
+            )]
+        )
+        self.assertEqual(shift_exdates(['2026-03-04'], start, shift, tz=NEW_YORK), ['2026-03-05'])
+
+    def test_time_only_shift_keeps_the_rule(self):
+        start = datetime(2026, 3, 2, 10, 0, tzinfo=UTC)
+
+        self.assertEqual(
+            shift_rrule('FREQ=MONTHLY;BYMONTHDAY=28,29,30,31;BYSETPOS=-1;COUNT=3', start, timedelta(hours=2)),
+            'FREQ=MONTHLY;BYMONTHDAY=28,29,30,31;BYSETPOS=-1;COUNT=3'
+        )
+        self.assertEqual(shift_exdates(['2026-03-09'], start, timedelta(hours=2)), ['2026-03-09'])
+
+    def test_rules_that_cannot_move_to_another_day_are_rejected(self):
+        start = datetime(2026, 1, 31, 9, 0, tzinfo=UTC)
+        for rule in (
+            'FREQ=MONTHLY;BYMONTHDAY=28,29,30,31;BYSETPOS=-1;COUNT=3',
+            'FREQ=MONTHLY;BYDAY=-1FR;COUNT=3',
+            'FREQ=MONTHLY;BYMONTHDAY=28;COUNT=3',
+        ):
+            with self.subTest(rule=rule), self.assertRaises(ValueError):
+                shift_rrule(rule, start, timedelta(days=1))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkDeleteTests(TestCase):
+    """Bulk deletion removes what GHL deleted and keeps what failed"""
+
+    def setUp(self):
+        cache.clear()
+        connect_location()
+
+    def test_deleted_rows_are_removed_and_failures_kept(self):
+        deleted = make_appointment(ghl_appointment_id='ghl-ok')
+        failing = make_appointment(ghl_appointment_id='ghl-fail')
+        local_only = make_appointment(ghl_appointment_id=None)
+
+        def delete_in_ghl(ghl_appointment_id, access_token, missing_ok=False):
+            if ghl_appointment_id == 'ghl-fail':
+                raise ValueError("Failed to delete appointment in GHL")
+            return True
+
+        with mock.patch.object(GHLAppointmentService, 'delete_ghl_appointment', side_effect=delete_in_ghl) as delete:
+            deleted_ids, failed = GHLAppointmentService.bulk_delete_appointments(GHLAppointment.objects.all())
+
+        self.assertEqual(delete.call_count, 2)
+        self.assertCountEqual(deleted_ids, [deleted.id, local_only.id])
+        self.assertEqual([failure['appointment_id'] for failure in failed], [failing.id])
+        self.assertEqual(list(GHLAppointment.objects.values_list('id', flat=True)), [failing.id])
+        self.assertCountEqual(
+            AppointmentDeletionLog.objects.values_list('appointment_id', flat=True),
+            [deleted.id, local_only.id]
+        )
+
+    def test_missing_credentials_fail_their_rows_only(self):
+        other = make_appointment(ghl_appointment_id='ghl-other', location_id='loc-unknown')
+        ok = make_appointment(ghl_appointment_id='ghl-ok')
+
+        with mock.patch.object(GHLAppointmentService, 'delete_ghl_appointment', return_value=True):
+            deleted_ids, failed = GHLAppointmentService.bulk_delete_appointments(GHLAppointment.objects.all())
+
+        self.assertEqual(deleted_ids, [ok.id])
+        self.assertEqual([failure['appointment_id'] for failure in failed], [other.id])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GroupDeletionJobTests(TestCase):
+    """Deletion jobs finish, retry their failures, fail on crashes and resume when lost"""
+
+    def setUp(self):
+        cache.clear()
+        connect_location()
+        self.group = make_group()
+        self.appointments = make_series(self.group)
+
+    def start_job(self):
+        job, started = GHLAppointmentService.create_group_deletion_job(self.group)
+        self.assertTrue(started)
+        return job
+
+    def test_successful_job_completes_and_deactivates_group(self):
+        job = self.start_job()
+
+        with mock.patch.object(GHLAppointmentService, 'delete_ghl_appointment', return_value=True):
+            tasks.process_group_deletion_job(str(job.job_id))
+
+        job.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.deleted_count, 3)
+        self.assertFalse(self.group.is_active)
+        self.assertFalse(self.group.is_deleting)
+        self.assertFalse(GHLAppointment.objects.exists())
+
+    def test_failures_are_retried_alone(self):
+        job = self.start_job()
+        failing = self.appointments[1].ghl_appointment_id
+
+        def delete_in_ghl(ghl_appointment_id, access_token, missing_ok=False):
+            if ghl_appointment_id == failing:
+                raise ValueError("Failed to delete appointment in GHL")
+            return True
+
+        with mock.patch.object(GHLAppointmentService, 'delete_ghl_appointment', side_effect=delete_in_ghl):
+            with self.assertRaises(Retry):
+                tasks.process_group_deletion_job(str(job.job_id))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'retrying')
+        self.assertEqual(job.failed_appointment_ids, [self.appointments[1].id])
+
+        with mock.patch.object(GHLAppointmentService, 'delete_ghl_appointment', return_value=True) as delete:
+            tasks.process_group_deletion_job(str(job.job_id))
+
+        delete.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.deleted_count, 3)
+
+    def test_crash_marks_job_failed_and_releases_group(self):
+        job = self.start_job()
+
+        with mock.patch.object(GHLAppointmentService, 'bulk_delete_appointments', side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                tasks.process_group_deletion_job(str(job.job_id))
+
+        job.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.errors[-1], {'error': 'boom'})
+        self.assertFalse(self.group.is_deleting)
+        self.assertTrue(self.group.is_active)
+
+        # The group can be deleted again
+        self.start_job()
+
+    def test_active_job_is_not_started_twice(self):
+        job = self.start_job()
+        RecurringGroupDeletionJob.objects.filter(pk=job.pk).update(status='running')
+
+        again, started = GHLAppointmentService.create_group_deletion_job(self.group)
+
+        self.assertEqual(again.pk, job.pk)
+        self.assertFalse(started)
+
+    def test_stale_job_is_resumed(self):
+        job = self.start_job()
+        RecurringGroupDeletionJob.objects.filter(pk=job.pk).update(
+            status='running',
+            updated_at=timezone.now() - GHLAppointmentService.DELETION_JOB_STALE_AFTER - timedelta(minutes=1)
+        )
+        self.assertEqual(list(GHLAppointmentService.stale_group_deletion_jobs()), [job])
+
+        with mock.patch.object(tasks.process_group_deletion_job, 'delay') as delay:
+            tasks.resume_stale_deletion_jobs()
+
+        delay.assert_called_once_with(str(job.job_id))
+        self.assertFalse(GHLAppointmentService.stale_group_deletion_jobs().exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SoftDeleteReconcileTests(TestCase):
+    """Deletes are tombstoned locally and pushed to GHL by the reconciliation run"""
+
+    def setUp(self):
+        cache.clear()
+        connect_location()
+
+    def test_delete_leaves_a_tombstone_and_schedules_reconciliation(self):
+        appointment = make_appointment(ghl_appointment_id='ghl-1')
+
+        with mock.patch.object(tasks.reconcile_deleted_appointments, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                GHLAppointmentService.delete_appointment(appointment.id)
+
+        appointment.refresh_from_db()
+        self.assertFalse(appointment.is_active)
+        self.assertIsNotNone(appointment.deleted_at)
+        self.assertIsNone(appointment.ghl_deleted_at)
+        apply_async.assert_called_once()
+
+        with self.assertRaisesMessage(ValueError, "not found"):
+            GHLAppointmentService.delete_appointment(appointment.id)
+
+    def test_reconcile_pushes_tombstones_and_counts_failures(self):
+        now = timezone.now()
+        synced = make_appointment(ghl_appointment_id='ghl-ok', is_active=False, deleted_at=now)
+        failing = make_appointment(ghl_appointment_id='ghl-fail', is_active=False, deleted_at=now)
+        exhausted = make_appointment(
+            ghl_appointment_id='ghl-exhausted', is_active=False, deleted_at=now,
+            ghl_delete_attempts=GHLAppointmentService.RECONCILE_MAX_ATTEMPTS
+        )
+        active = make_appointment(ghl_appointment_id='ghl-active')
+
+        def delete_in_ghl(ghl_appointment_id, access_token, missing_ok=False):
+            if ghl_appointment_id == 'ghl-fail':
+                raise ValueError("Failed to delete appointment in GHL")
+            return True
+
+        with mock.patch.object(GHLAppointmentService, 'delete_ghl_appointment', side_effect=delete_in_ghl) as delete:
+            self.assertEqual(GHLAppointmentService.reconcile_deleted_appointments(), (1, 1))
+
+        self.assertCountEqual([call.args[0] for call in delete.call_args_list], ['ghl-ok', 'ghl-fail'])
+        for appointment in (synced, failing, exhausted, active):
+            appointment.refresh_from_db()
+        self.assertIsNotNone(synced.ghl_deleted_at)
+        self.assertIsNone(failing.ghl_deleted_at)
+        self.assertEqual(failing.ghl_delete_attempts, 1)
+        self.assertIsNone(exhausted.ghl_deleted_at)
+        self.assertTrue(active.is_active)
+
+    def test_purge_drops_only_confirmed_old_tombstones(self):
+        old = timezone.now() - GHLAppointmentService.TOMBSTONE_RETENTION - timedelta(days=1)
+        purged = make_appointment(is_active=False, deleted_at=old, ghl_deleted_at=old)
+        recent = make_appointment(is_active=False, deleted_at=old, ghl_deleted_at=timezone.now())
+        unconfirmed = make_appointment(is_active=False, deleted_at=old)
+
+        self.assertEqual(GHLAppointmentService.purge_tombstones(), 1)
+        self.assertCountEqual(
+            GHLAppointment.objects.values_list('id', flat=True),
+            [recent.id, unconfirmed.id]
+        )
+        self.assertFalse(GHLAppointment.objects.filter(id=purged.id).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@mock.patch.object(GHLAppointmentService, 'create_ghl_appointment', side_effect=ghl_created)
+class WindowMaterializationTests(TestCase):
+    """Windowed series only materialize occurrences inside the rolling horizon"""
+
+    def setUp(self):
+        cache.clear()
+        connect_location()
+        make_user()
+        self.now = timezone.now()
+        # Weekly occurrences on days 1, 8, 15, 22, 29, ...
+        self.group = make_group(
+            materialization='window',
+            total_count=10,
+            materialized_count=2,
+            original_start_time=self.now + timedelta(days=1),
+            original_end_time=self.now + timedelta(days=1, hours=1),
+        )
+
+    def test_extend_books_occurrences_entering_the_horizon(self, create):
+        created, errors = GHLAppointmentService.extend_materialization_window(
+            self.group, self.now + timedelta(days=28)
+        )
+
+        self.assertEqual(errors, [])
+        self.assertEqual([appointment.occurrence_number for appointment in created], [3, 4])
+        self.assertEqual(create.call_count, 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.materialized_count, 4)
+
+        # Nothing new inside the same horizon
+        created, _ = GHLAppointmentService.extend_materialization_window(self.group, self.now + timedelta(days=28))
+        self.assertEqual(created, [])
+        self.assertEqual(create.call_count, 2)
+
+    def test_extend_stops_at_total_count(self, create):
+        created, _ = GHLAppointmentService.extend_materialization_window(
+            self.group, self.now + timedelta(days=365)
+        )
+
+        self.assertEqual(len(created), 8)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.materialized_count, 10)
+        self.assertEqual(GHLAppointmentService.extend_materialization_window(self.group), ([], []))
+
+    def test_extend_skips_occurrences_that_conflict(self, create):
+        # Occurrence 3 (day 15) was taken by another booking after the series was made
+        taken = make_appointment(start_time=self.now + timedelta(days=15, minutes=30), recurring_group=None)
+
+        created, errors = GHLAppointmentService.extend_materialization_window(
+            self.group, self.now + timedelta(days=28)
+        )
+
+        self.assertEqual([appointment.occurrence_number for appointment in created], [4])
+        self.assertEqual(errors, [f"Occurrence 3 for user user-1 skipped: conflicts with appointment {taken.id}"])
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.materialized_count, 4)
+
+    def test_extend_keeps_conflicts_the_booking_allowed(self, create):
+        self.group.allow_conflicts = True
+        self.group.save()
+        make_appointment(start_time=self.now + timedelta(days=15, minutes=30))
+
+        created, errors = GHLAppointmentService.extend_materialization_window(
+            self.group, self.now + timedelta(days=28)
+        )
+
+        self.assertEqual(errors, [])
+        self.assertEqual([appointment.occurrence_number for appointment in created], [3, 4])
+
+    @override_settings(RECURRING_MATERIALIZATION_HORIZON=timedelta(days=28))
+    def test_task_extends_only_unfinished_window_series(self, create):
+        make_group(materialization='all', total_count=10, materialized_count=2)
+        make_group(materialization='window', total_count=3, materialized_count=3)
+
+        tasks.extend_recurring_windows()
+
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(
+            set(GHLAppointment.objects.values_list('recurring_group_id', flat=True)),
+            {self.group.pk}
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@mock.patch.object(GHLAppointmentService, 'update_ghl_appointment', return_value={})
+class SeriesUpdateTests(TestCase):
+    """Series edits move occurrences and the series definition together"""
+
+    def setUp(self):
+        cache.clear()
+        connect_location()
+        now = timezone.now()
+        # Next Monday at 10:00, at least two days out
+        monday = (now + timedelta(days=2 + (7 - (now + timedelta(days=2)).weekday()) % 7)).date()
+        self.start = datetime.combine(monday, datetime.min.time(), tzinfo=UTC).replace(hour=10)
+
+    def update(self, group, **data):
+        return self.client.put(
+            f'/api/accounts/recurring-groups/{group.group_id}/update/', data, content_type='application/json'
+        )
+
+    def test_all_moves_rule_and_exdates_to_the_new_day(self, update):
+        group = make_group(
+            rrule='FREQ=WEEKLY;BYDAY=MO,WE;COUNT=5',
+            exdates=[(self.start + timedelta(days=2)).date().isoformat()],
+            timezone='UTC',
+            total_count=4,
+            materialized_count=4,
+            original_start_time=self.start,
+            original_end_time=self.start + timedelta(hours=1),
+        )
+        make_series(group)
+        new_start = self.start + timedelta(days=1, hours=1)
+
+        response = self.update(group, scope='all', startDateTime=new_start.isoformat())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(update.call_count, 4)
+        group.refresh_from_db()
+        self.assertEqual(group.rrule, 'FREQ=WEEKLY;BYDAY=TU,TH;COUNT=5')
+        self.assertEqual(group.exdates, [(self.start + timedelta(days=3)).date().isoformat()])
+        self.assertEqual(group.original_start_time, new_start)
+        # Rows and the rewritten series agree
+        self.assertEqual(
+            list(group.appointments.order_by('occurrence_number').values_list('start_time', flat=True)),
+            [start for _, start, _ in GHLAppointmentService.iter_group_occurrences(group)]
+        )
+
+    def test_all_on_a_started_series_moves_upcoming_occurrences(self, update):
+        start = timezone.now().replace(microsecond=0) - timedelta(days=7) + timedelta(hours=2)
+        group = make_group(
+            timezone='UTC', original_start_time=start, original_end_time=start + timedelta(hours=1)
+        )
+        past, upcoming, last = make_series(group)
+
+        response = self.update(
+            group, scope='all', startDateTime=(upcoming.start_time + timedelta(hours=1)).isoformat()
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(update.call_count, 2)
+        past.refresh_from_db()
+        upcoming.refresh_from_db()
+        last.refresh_from_db()
+        self.assertEqual(past.start_time, start)
+        self.assertEqual(upcoming.start_time, start + timedelta(days=7, hours=1))
+        self.assertEqual(last.start_time, start + timedelta(days=14, hours=1))
+        group.refresh_from_db()
+        self.assertEqual(group.original_start_time, start + timedelta(hours=1))
+
+    def test_move_the_rule_cannot_follow_is_rejected(self, update):
+        group = make_group(
+            interval='monthly',
+            rrule='FREQ=MONTHLY;BYMONTHDAY=28,29,30,31;BYSETPOS=-1;COUNT=3',
+            timezone='UTC',
+            original_start_time=self.start,
+            original_end_time=self.start + timedelta(hours=1),
+        )
+        make_series(group)
+
+        response = self.update(group, scope='all', startDateTime=(self.start + timedelta(days=1)).isoformat())
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('recurrence rule', response.json()['error'])
+        update.assert_not_called()
+        group.refresh_from_db()
+        self.assertEqual(group.original_start_time, self.start)
+
+    def test_following_move_of_a_partly_materialized_series_is_rejected(self, update):
+        group = make_group(
+            materialization='window', total_count=10, materialized_count=3, timezone='UTC',
+            original_start_time=self.start, original_end_time=self.start + timedelta(hours=1),
+        )
+        make_series(group)
+
+        response = self.update(
+            group, scope='following', occurrence_number=2,
+            startDateTime=(self.start + timedelta(days=7, hours=1)).isoformat()
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('move all occurrences instead', response.json()['error'])
+        update.assert_not_called()
+
+    def test_following_updates_only_later_occurrences(self, update):
+        group = make_group(
+            timezone='UTC', original_start_time=self.start, original_end_time=self.start + timedelta(hours=1)
+        )
+        first, second, third = make_series(group)
+
+        response = self.update(group, scope='following', occurrence_number=2, title='Renamed')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(group.appointments.order_by('occurrence_number').values_list('title', flat=True)),
+            ['Series', 'Renamed', 'Renamed']
+        )
+        group.refresh_from_db()
+        self.assertEqual(group.title, 'Series')
+
+
+    def test_partial_failure_keeps_the_series_definition(self, update):
+        group = make_group(
+            rrule='FREQ=WEEKLY;COUNT=3', timezone='UTC',
+            original_start_time=self.start, original_end_time=self.start + timedelta(hours=1),
+        )
+        first, second, third = make_series(group)
+
+        def ghl_update(ghl_appointment_id, update_data, access_token):
+            if ghl_appointment_id == second.ghl_appointment_id:
+                raise ValueError("GHL rejected the update")
+            return {}
+
+        update.side_effect = ghl_update
+        response = self.update(group, scope='all', startDateTime=(self.start + timedelta(hours=2)).isoformat())
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([row['appointment_id'] for row in response.json()['failed_updates']], [second.id])
+        self.assertIn('series definition was left unchanged', response.json()['warning'])
+        group.refresh_from_db()
+        self.assertEqual((group.rrule, group.original_start_time), ('FREQ=WEEKLY;COUNT=3', self.start))
+        # Accepted occurrences moved, the failed one kept its time
+        self.assertEqual(
+            list(group.appointments.order_by('occurrence_number').values_list('start_time', flat=True)),
+            [first.start_time + timedelta(hours=2), second.start_time, third.start_time + timedelta(hours=2)]
+        )
+
+class AvailabilityTests(TestCase):
+    """Double-booking checks and free/busy come from one query over local appointments"""
+
+    def setUp(self):
+        cache.clear()
+        self.day = datetime(2026, 6, 1, tzinfo=UTC)
+        make_appointment(start_time=self.at(10), end_time=self.at(11))
+        make_appointment(start_time=self.at(12), end_time=self.at(16))
+        make_appointment(start_time=self.at(13), end_time=self.at(14), is_active=False)
+        make_appointment(assigned_to='user-2', start_time=self.at(9), end_time=self.at(10, 30))
+
+    def at(self, hour, minute=0):
+        return self.day.replace(hour=hour, minute=minute)
+
+    def test_conflicts_are_found_for_overlaps_only(self):
+        conflicts = find_conflicts(['user-1'], [
+            (self.at(9, 30), self.at(10, 30)),  # overlaps 10-11
+            (self.at(11), self.at(12)),  # touches both neighbours
+            (self.at(12, 30), self.at(13)),  # inside 12-16
+            (self.at(15), self.at(17)),  # overlaps 12-16 again
+        ])
+
+        self.assertEqual(
+            [(conflict['start_time'], conflict['conflicting_start_time']) for conflict in conflicts],
+            [
+                (self.at(9, 30).isoformat(), self.at(10).isoformat()),
+                (self.at(12, 30).isoformat(), self.at(12).isoformat()),
+                (self.at(15).isoformat(), self.at(12).isoformat()),
+            ]
+        )
+        self.assertEqual(find_conflicts(['user-3'], [(self.at(10), self.at(11))]), [])
+
+    def test_conflicting_series_is_rejected_before_any_ghl_call(self):
+        connect_location()
+        make_user()
+        Contact.objects.create(contact_id='contact-1', first_name='Ada', location_id='loc-1')
+        booking = {
+            'locationId': 'loc-1',
+            'contactId': 'contact-1',
+            'userIds': ['user-1'],
+            'type': 'recurring',
+            'interval': 'daily',
+            'every': 1,
+            'count': 3,
+            # The third day overlaps the 10-11 appointment
+            'startDateTime': self.at(10) - timedelta(days=2),
+            'endDateTime': self.at(11) - timedelta(days=2),
+        }
+
+        with mock.patch.object(GHLAppointmentService, 'create_ghl_appointment', side_effect=ghl_created) as create:
+            with self.assertRaises(AppointmentConflictError) as raised:
+                GHLAppointmentService.book_appointments(booking)
+            create.assert_not_called()
+            self.assertEqual(len(raised.exception.conflicts), 1)
+            self.assertFalse(RecurringAppointmentGroup.objects.exists())
+
+            created, errors = GHLAppointmentService.book_appointments(dict(booking, allowConflicts=True))
+
+        self.assertEqual((len(created), errors), (3, []))
+
+    def test_free_busy_merges_users_and_cuts_slots(self):
+        result = get_free_busy(['user-1', 'user-2'], self.at(9), self.at(17), slot_minutes=60)
+
+        user = result['users']['user-1']
+        self.assertEqual(user['busy'], [(self.at(10), self.at(11)), (self.at(12), self.at(16))])
+        self.assertEqual(
+            user['free'],
+            [(self.at(9), self.at(10)), (self.at(11), self.at(12)), (self.at(16), self.at(17))]
+        )
+        # Busy blocks of both users merge where they overlap
+        combined = result['combined']
+        self.assertEqual(combined['busy'], [(self.at(9), self.at(11)), (self.at(12), self.at(16))])
+        self.assertEqual(combined['slots'], [(self.at(11), self.at(12)), (self.at(16), self.at(17))])
+
+    def test_free_busy_is_clipped_to_the_window(self):
+        result = get_free_busy(['user-1'], self.at(10, 30), self.at(12, 30))
+
+        self.assertEqual(
+            result['users']['user-1']['busy'],
+            [(self.at(10, 30), self.at(11)), (self.at(12), self.at(12, 30))]
+        )
+        self.assertEqual(result['combined']['free'], [(self.at(11), self.at(12))])
+        self.assertNotIn('slots', result['combined'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CalendarStatsTests(TestCase):
+    """Calendar stats are aggregated per location and the user list is opt-in"""
+
+    def setUp(self):
+        cache.clear()
+        make_user('user-1')
+        make_user('user-2', calendar_id='')
+        make_user('user-3', calendar_id=None)
+        make_user('user-4', location_id='loc-2')
+
+    def test_stats_count_calendar_coverage(self):
+        response = self.client.get('/api/accounts/calendar-stats/loc-1/')
+
+        self.assertEqual(response.json()['stats'], {
+            'total_users': 3,
+            'users_with_calendar': 1,
+            'users_without_calendar': 2,
+            'calendar_coverage_percentage': 33.33,
+        })
+        self.assertNotIn('users', response.json())
+
+    def test_user_list_is_opt_in_and_paginated(self):
+        response = self.client.get('/api/accounts/calendar-stats/', {'include_users': 'true', 'page_size': 2})
+
+        users = response.json()['users']
+        self.assertEqual(users['count'], 4)
+        self.assertEqual(len(users['results']), 2)
+
+    def test_calendar_update_refreshes_cached_stats(self):
+        self.client.get('/api/accounts/calendar-stats/loc-1/')
+
+        self.client.post('/api/accounts/users/user-2/update-calendar/', {'calendar_id': 'calendar-2'})
+        response = self.client.get('/api/accounts/calendar-stats/loc-1/')
+
+        self.assertEqual(response.json()['stats']['users_with_calendar'], 2)
+
+
+@override_settings(GHL_SHARED_CALENDAR_ASSIGNEE_ID='shared-assignee')
+class BookingRollupTests(TestCase):
+    """Rollups count each user's bookings per local day"""
+
+    def setUp(self):
+        connect_location(tz='America/New_York')
+        # 21:00 New York on June 1st is already June 2nd in UTC
+        self.start = datetime(2026, 6, 2, 1, 0, tzinfo=UTC)
+        make_appointment(start_time=self.start)
+        make_appointment(start_time=self.start + timedelta(days=1), end_time=self.start + timedelta(days=1, minutes=30))
+        make_appointment(start_time=self.start, is_active=False)
+        # Shared calendar copies, stored locally and synced from GHL
+        make_appointment(start_time=self.start, assigned_to=' ')
+        make_appointment(start_time=self.start, assigned_to='shared-assignee')
+
+    def test_rollups_skip_shared_calendar_copies(self):
+        written = rollups.recompute_rollups(date(2026, 6, 1), date(2026, 6, 3))
+
+        self.assertEqual(written, {'loc-1': 2})
+        self.assertEqual(
+            list(AppointmentDailyRollup.objects.order_by('day').values_list(
+                'user_id', 'day', 'appointment_count', 'booked_minutes'
+            )),
+            [('user-1', date(2026, 6, 1), 1, 60), ('user-1', date(2026, 6, 2), 1, 30)]
+        )
+
+    def test_backfill_command_rebuilds_in_chunks(self):
+        AppointmentDailyRollup.objects.create(
+            location_id='loc-1', user_id='gone', day=date(2026, 6, 1), appointment_count=5, booked_minutes=300
+        )
+
+        out = StringIO()
+        call_command('backfill_rollups', '--from', '2026-05-01', '--to', '2026-06-30', '--chunk-days', '7', stdout=out)
+
+        self.assertEqual(
+            sorted(AppointmentDailyRollup.objects.values_list('user_id', 'day')),
+            [('user-1', date(2026, 6, 1)), ('user-1', date(2026, 6, 2))]
+        )
+        self.assertIn("Backfilled 2 rollup rows", out.getvalue())
+
+
+class ContactUpsertTests(TestCase):
+    """Contact upserts only overwrite the fields a payload carries"""
+
+    def setUp(self):
+        upsert_contacts([{
+            'id': 'contact-1',
+            'firstName': 'Ada',
+            'email': 'ada@example.com',
+            'tags': ['vip'],
+            'customFields': [{'id': 'field-1', 'value': 'x'}],
+            'locationId': 'loc-1',
+        }])
+
+    def test_partial_payload_keeps_missing_fields(self):
+        written = upsert_contacts([
+            {'id': 'contact-1', 'firstName': 'Ada L.', 'locationId': 'loc-1'},
+            {'id': 'contact-2', 'firstName': 'Grace', 'locationId': 'loc-1'},
+        ])
+
+        self.assertEqual(written, 2)
+        contact = Contact.objects.get(contact_id='contact-1')
+        self.assertEqual(contact.first_name, 'Ada L.')
+        self.assertEqual(contact.email, 'ada@example.com')
+        self.assertEqual(contact.tags, ['vip'])
+        self.assertEqual(contact.custom_fields, [{'id': 'field-1', 'value': 'x'}])
+        self.assertEqual(Contact.objects.get(contact_id='contact-2').tags, [])
+
+    def test_fields_present_in_the_payload_are_replaced(self):
+        upsert_contacts([{'id': 'contact-1', 'tags': [], 'email': None, 'locationId': 'loc-1'}])
+
+        contact = Contact.objects.get(contact_id='contact-1')
+        self.assertEqual(contact.tags, [])
+        self.assertIsNone(contact.email)
+        self.assertEqual(contact.first_name, 'Ada')
+
+    def test_last_payload_of_a_repeated_id_wins(self):
+        upsert_contacts([
+            {'id': 'contact-1', 'firstName': 'First', 'tags': ['a'], 'locationId': 'loc-1'},
+            {'id': 'contact-1', 'lastName': 'Lovelace', 'locationId': 'loc-1'},
+            {'firstName': 'No id'},
+        ])
+
+        contact = Contact.objects.get(contact_id='contact-1')
+        self.assertEqual((contact.first_name, contact.last_name, contact.tags), ('Ada', 'Lovelace', ['vip']))
+        self.assertEqual(Contact.objects.count(), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserUpsertTests(TestCase):
+    """Location user syncs upsert in one statement and delete only users every location dropped"""
+
+    def setUp(self):
+        cache.clear()
+
+    def users(self):
+        return dict(GHLUser.objects.values_list('user_id', 'location_id'))
+
+    def test_multi_location_user_keeps_its_location(self):
+        upsert_location_users('loc-1', [{'id': 'user-1', 'name': 'Ada'}, {'id': 'user-2', 'name': 'Grace'}])
+        GHLUser.objects.filter(user_id='user-1').update(calendar_id='calendar-1')
+
+        self.assertEqual(upsert_location_users('loc-2', [{'id': 'user-1', 'name': 'Ada L.'}, {'id': 'user-3'}]), 2)
+
+        self.assertEqual(self.users(), {'user-1': 'loc-1', 'user-2': 'loc-1', 'user-3': 'loc-2'})
+        user = GHLUser.objects.get(user_id='user-1')
+        self.assertEqual((user.name, user.calendar_id), ('Ada L.', 'calendar-1'))
+
+        # Syncing loc-1 again doesn't flip user-1 back and forth either
+        upsert_location_users('loc-1', [{'id': 'user-1', 'name': 'Ada L.'}, {'id': 'user-2'}])
+        self.assertEqual(self.users()['user-1'], 'loc-1')
+
+    def test_user_dropped_by_its_location_moves_to_another_one(self):
+        upsert_location_users('loc-1', [{'id': 'user-1'}, {'id': 'user-2'}])
+        upsert_location_users('loc-2', [{'id': 'user-1'}, {'id': 'user-3'}])
+        GHLUser.objects.filter(user_id='user-1').update(calendar_id='calendar-1')
+
+        pruned = services.prune_location_users(
+            {'loc-1': {'user-2'}, 'loc-2': {'user-1', 'user-3'}}, complete=True
+        )
+
+        self.assertEqual(pruned, {'loc-1': (1, 0), 'loc-2': (0, 0)})
+        self.assertEqual(self.users(), {'user-1': 'loc-2', 'user-2': 'loc-1', 'user-3': 'loc-2'})
+        self.assertEqual(GHLUser.objects.get(user_id='user-1').calendar_id, 'calendar-1')
+
+    def test_only_users_no_location_returned_are_deleted(self):
+        upsert_location_users('loc-1', [{'id': 'user-1'}, {'id': 'user-2'}])
+        upsert_location_users('loc-2', [{'id': 'user-3'}])
+        seen = {'loc-1': {'user-1'}, 'loc-2': {'user-3'}}
+
+        # Some location failed to fetch: user-2 may still be in it
+        self.assertEqual(services.prune_location_users(seen, complete=False)['loc-1'], (0, 0))
+        self.assertIn('user-2', self.users())
+
+        self.assertEqual(services.prune_location_users(seen, complete=True)['loc-1'], (0, 1))
+        # An empty response never prunes its location
+        self.assertEqual(services.prune_location_users({'loc-1': set()}, complete=True), {})
+        self.assertEqual(self.users(), {'user-1': 'loc-1', 'user-3': 'loc-2'})
+
+    def test_sync_all_users_prunes_after_fetching_every_location(self):
+        connect_location('loc-1')
+        connect_location('loc-2')
+        upsert_location_users('loc-1', [{'id': 'user-1'}, {'id': 'user-2'}, {'id': 'user-4'}])
+        responses = {'loc-1': [{'id': 'user-2'}], 'loc-2': [{'id': 'user-1'}, {'id': 'user-3'}]}
+
+        with mock.patch.object(services, 'fetch_location_users', side_effect=responses.get):
+            results = services.sync_all_users()
+
+        self.assertEqual(results, {'loc-1': (1, 1, 1), 'loc-2': (2, 0, 0)})
+        self.assertEqual(self.users(), {'user-1': 'loc-2', 'user-2': 'loc-1', 'user-3': 'loc-2'})
+
+        responses['loc-2'] = None
+        with mock.patch.object(services, 'fetch_location_users', side_effect=responses.get):
+            results = services.sync_all_users()
+
+        self.assertEqual(results['loc-2'], "Failed to fetch users")
+        self.assertEqual(self.users(), {'user-1': 'loc-2', 'user-2': 'loc-1', 'user-3': 'loc-2'})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CalendarDiscoveryTests(TestCase):
+    """Users are mapped to their best calendar without touching hand-picked ones"""
+
+    CALENDARS = [
+        {'id': 'team', 'teamMembers': [{'userId': 'user-1'}, {'userId': 'user-2'}, {'userId': 'user-3'}]},
+        {'id': 'primary', 'teamMembers': [{'userId': 'user-2', 'isPrimary': True}, {'userId': 'user-3'}]},
+        {'id': 'personal', 'calendarType': 'personal', 'teamMembers': [{'userId': 'user-3'}]},
+        {'id': 'inactive', 'isActive': False, 'calendarType': 'personal', 'teamMembers': [{'userId': 'user-1'}]},
+    ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_calendars_are_ranked_per_user(self):
+        self.assertEqual(
+            calendars.build_user_calendar_map(self.CALENDARS),
+            {'user-1': 'team', 'user-2': 'primary', 'user-3': 'personal'}
+        )
+
+    def test_discovery_fills_only_missing_calendars(self):
+        make_user('user-1', calendar_id=None)
+        make_user('user-2', calendar_id='picked-by-hand')
+        make_user('user-3', calendar_id='', location_id='loc-2')
+
+        calendar_map, updated = calendars.discover_calendars('loc-1', calendars=self.CALENDARS)
+
+        self.assertEqual(updated, 1)
+        self.assertEqual(
+            dict(GHLUser.objects.values_list('user_id', 'calendar_id')),
+            {'user-1': 'team', 'user-2': 'picked-by-hand', 'user-3': ''}
+        )
+        self.assertEqual(calendars.get_user_calendar_map('loc-1'), calendar_map)
+
+
+    def test_discover_all_calendars_reports_each_location(self):
+        connect_location('loc-1')
+        connect_location('loc-2')
+        make_user('user-1', calendar_id=None)
+
+        def fetch(location_id):
+            if location_id == 'loc-2':
+                raise ValueError("GHL is down")
+            return self.CALENDARS
+
+        with mock.patch.object(calendars, 'fetch_location_calendars', side_effect=fetch):
+            results = calendars.discover_all_calendars()
+
+        self.assertEqual(results, {'loc-1': 1, 'loc-2': 'GHL is down'})
+        self.assertEqual(GHLUser.objects.get(user_id='user-1').calendar_id, 'team')
+
+class DatabaseMetricsTests(SimpleTestCase):
+    """Connection checkouts are timed by the backend when Django connects, never eagerly"""
+
+    def test_new_connections_are_timed(self):
+        from django.db.backends.postgresql import base as postgresql
+        from calendar_app import db_metrics
+        from calendar_app.db_backend.base import DatabaseWrapper
+
+        wrapper = DatabaseWrapper({**connections['default'].settings_dict, 'NAME': 'metrics'}, alias='metrics')
+        before = db_metrics.get_metrics()['checkout']['count']
+
+        with mock.patch.object(postgresql.DatabaseWrapper, 'get_new_connection', return_value='connection') as connect:
+            self.assertEqual(wrapper.get_new_connection({}), 'connection')
+            connect.side_effect = OSError("connection refused")
+            with self.assertRaises(OSError):
+                wrapper.get_new_connection({})
+
+        self.assertEqual(db_metrics.get_metrics()['checkout']['count'], before + 2)
+
+    def test_requests_without_queries_do_not_connect(self):
+        self.assertNotIn('calendar_app.db_metrics.DatabaseMetricsMiddleware', settings.MIDDLEWARE)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTests(TestCase):
+    """Cached responses live until a write bumps their location's version"""
+
+    def setUp(self):
+        cache.clear()
+        make_user('user-1', first_name='Ada')
+
+    def search(self, kind, term):
+        response = self.client.get(f'/api/accounts/search/{kind}/', {'search': term})
+        return [row.get('user_id') or row.get('contact_id') for row in response.json()['results']]
+
+    def test_user_search_is_cached_until_a_bump(self):
+        self.assertEqual(self.search('users', 'Ada'), ['user-1'])
+
+        # Written behind the service layer's back: still served from cache
+        make_user('user-2', first_name='Ada')
+        self.assertEqual(self.search('users', 'Ada'), ['user-1'])
+
+        bump_location_version('loc-1')
+        self.assertCountEqual(self.search('users', 'Ada'), ['user-1', 'user-2'])
+
+    def test_contact_search_has_its_own_entries_and_follows_upserts(self):
+        upsert_contacts([{'id': 'contact-1', 'firstName': 'Ada', 'locationId': 'loc-1'}])
+
+        self.assertEqual(self.search('users', 'Ada'), ['user-1'])
+        self.assertEqual(self.search('contacts', 'Ada'), ['contact-1'])
+
+        upsert_contacts([{'id': 'contact-2', 'firstName': 'Ada', 'locationId': 'loc-2'}])
+        self.assertCountEqual(self.search('contacts', 'Ada'), ['contact-1', 'contact-2'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalListTests(TestCase):
+    """List endpoints answer revalidation with 304 until their rows change"""
+
+    def setUp(self):
+        cache.clear()
+        self.appointment = make_appointment()
+
+    def get(self, url, **headers):
+        return self.client.get(url, {'location_id': 'loc-1'}, headers=headers)
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.get('/api/accounts/appointments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        response = self.get('/api/accounts/appointments/', if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        response = self.get('/api/accounts/appointments/', if_modified_since=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_and_bumps_change_the_etag(self):
+        etag = self.get('/api/accounts/appointments/')['ETag']
+
+        GHLAppointment.objects.filter(id=self.appointment.id).update(
+            title='Moved', updated_at=timezone.now() + timedelta(seconds=1)
+        )
+        response = self.get('/api/accounts/appointments/', if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['appointments'][0]['title'], 'Moved')
+
+        etag = response['ETag']
+        bump_location_version('loc-1')
+        self.assertEqual(self.get('/api/accounts/appointments/', if_none_match=etag).status_code, 200)
+
+    def test_cached_responses_carry_validators(self):
+        first = self.get('/api/accounts/appointments/non-recurring/')
+        second = self.get('/api/accounts/appointments/non-recurring/')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(
+            self.get('/api/accounts/appointments/non-recurring/', if_none_match=second['ETag']).status_code, 304
+        )
+
+
+class ChangeFeedTests(TestCase):
+    """Change feed cursors page through updates and deletions exactly once"""
+
+    def setUp(self):
+        self.start = timezone.now() - timedelta(hours=1)
+        self.cursor = changes.encode_cursor({'appointments': (self.start, 0), 'deletions': (self.start, 0)})
+        self.appointments = [make_appointment(ghl_appointment_id=f'ghl-{n}') for n in range(5)]
+        make_appointment(location_id='loc-2')
+        # A bulk update stamps every row alike
+        GHLAppointment.objects.update(updated_at=self.start + timedelta(minutes=10))
+
+    def read_all(self, cursor, limit):
+        changed, deleted = [], []
+        while True:
+            feed = changes.get_changes('loc-1', cursor, limit=limit)
+            changed += [appointment.id for appointment in feed['changed']]
+            deleted += [row['id'] for row in feed['deleted']]
+            cursor = feed['cursor']
+            if not feed['has_more']:
+                return changed, deleted, cursor
+
+    @mock.patch.object(changes, 'SETTLE_DELAY', timedelta(0))
+    def test_pages_share_timestamps_and_deletions_without_gaps(self):
+        soft_deleted, hard_deleted = self.appointments[1], self.appointments[3]
+        GHLAppointmentService.delete_appointment(soft_deleted.id)
+        GHLAppointment.objects.filter(id=soft_deleted.id).update(updated_at=self.start + timedelta(minutes=10))
+
+        # First page, then an appointment the feed hasn't reached is deleted outright
+        feed = changes.get_changes('loc-1', self.cursor, limit=2)
+        hard = GHLAppointment.objects.filter(id=hard_deleted.id)
+        changes.log_deletions(hard)
+        hard.delete()
+
+        changed, deleted, cursor = self.read_all(feed['cursor'], limit=2)
+        changed += [appointment.id for appointment in feed['changed']]
+        deleted += [row['id'] for row in feed['deleted']]
+
+        expected = [appointment.id for appointment in self.appointments]
+        self.assertCountEqual(changed, [pk for pk in expected if pk not in (soft_deleted.id, hard_deleted.id)])
+        self.assertCountEqual(deleted, [soft_deleted.id, hard_deleted.id])
+
+        # Nothing is replayed from the final cursor
+        self.assertEqual(self.read_all(cursor, limit=2)[:2], ([], []))
+
+    def test_recent_rows_are_held_back_until_settled(self):
+        GHLAppointment.objects.filter(id=self.appointments[0].id).update(title='Just now', updated_at=timezone.now())
+
+        changed, _, cursor = self.read_all(self.cursor, limit=10)
+
+        self.assertEqual(len(changed), 4)
+        with mock.patch.object(changes, 'SETTLE_DELAY', timedelta(0)):
+            self.assertEqual(self.read_all(cursor, limit=10)[0], [self.appointments[0].id])
+
+    def test_invalid_and_expired_cursors(self):
+        url = '/api/accounts/appointments/changes/'
+        expired = changes.encode_cursor({
+            'appointments': (timezone.now() - timedelta(days=31), 0),
+            'deletions': (timezone.now(), 0),
+        })
+
+        self.assertEqual(self.client.get(url, {'location_id': 'loc-1', 'since': 'garbage'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'location_id': 'loc-1', 'since': expired}).status_code, 410)
+        response = self.client.get(url, {'location_id': 'loc-1'})
+        self.assertEqual((response.json()['changed'], response.json()['has_more']), ([], False))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FastRenderTests(TestCase):
+    """?fast=1 responses match the serializer output field for field"""
+
+    def setUp(self):
+        cache.clear()
+        connect_location(tz='America/New_York')
+        make_user()
+        self.group = make_group(timezone='America/New_York', description='Weekly check-in')
+        make_series(self.group)
+        make_appointment(title='Single, "quoted"', description=None)
+
+    def assertSameAsSerializer(self, url, params=None):
+        slow = self.client.get(url, params or {})
+        fast = self.client.get(url, {**(params or {}), 'fast': '1'})
+
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.json(), slow.json())
+
+    def test_appointment_list(self):
+        self.assertSameAsSerializer('/api/accounts/appointments/', {'location_id': 'loc-1'})
+
+    def test_recurring_group_appointments(self):
+        self.assertSameAsSerializer(f'/api/accounts/recurring-groups/{self.group.group_id}/appointments/')
+
+    def test_non_recurring_appointments(self):
+        self.assertSameAsSerializer('/api/accounts/appointments/non-recurring/')
+
+
+class ExportTests(TestCase):
+    """Exports stream every row, escaping what spreadsheets would evaluate"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', is_staff=True))
+        upsert_contacts([
+            {'id': 'contact-1', 'firstName': '=HYPERLINK("x")', 'phone': '+1 555 0100', 'tags': ['a', 'b'],
+             'locationId': 'loc-1'},
+            {'id': 'contact-2', 'firstName': 'Line\nbreak, "quoted"', 'locationId': 'loc-1'},
+            {'id': 'contact-3', 'firstName': 'Elsewhere', 'locationId': 'loc-2'},
+        ])
+
+    def export(self, **params):
+        response = self.client.get('/api/accounts/exports/contacts/', {'location_id': 'loc-1', **params})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_escapes_formulas_and_quotes(self):
+        rows = list(csv.DictReader(StringIO(self.export())))
+
+        self.assertEqual([row['contact_id'] for row in rows], ['contact-1', 'contact-2'])
+        self.assertEqual(rows[0]['first_name'], '\'=HYPERLINK("x")')
+        self.assertEqual(rows[0]['phone'], '+1 555 0100')
+        self.assertEqual(json.loads(rows[0]['tags']), ['a', 'b'])
+        self.assertEqual(rows[1]['first_name'], 'Line\nbreak, "quoted"')
+
+    def test_ndjson_has_one_object_per_line(self):
+        lines = self.export(file_format='ndjson').splitlines()
+
+        self.assertEqual([json.loads(line)['contact_id'] for line in lines], ['contact-1', 'contact-2'])
+
+    def test_exports_need_an_admin(self):
+        self.client.force_authenticate(get_user_model().objects.create_user('member'))
+
+        response = self.client.get('/api/accounts/exports/contacts/', {'location_id': 'loc-1'})
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CalendarFeedTests(TestCase):
+    """Feeds emit one RRULE series per group with EXDATEs and overrides"""
+
+    def setUp(self):
+        cache.clear()
+        make_user()
+        # Weekly at 10:00 New York across the 2026-03-08 DST change, March 9th excluded
+        start = datetime(2026, 3, 2, 10, 0, tzinfo=NEW_YORK)
+        self.group = make_group(
+            title='Check-in',
+            rrule='FREQ=WEEKLY;COUNT=4',
+            exdates=['2026-03-09'],
+            timezone='America/New_York',
+            original_start_time=start,
+            original_end_time=start + timedelta(hours=1),
+        )
+        first, second, third = make_series(self.group)
+        second.is_active = False
+        second.save()
+        third.start_time += timedelta(hours=1)
+        third.end_time += timedelta(hours=1)
+        third.save()
+        self.single = make_appointment(title='Intro; call', start_time=timezone.now() + timedelta(days=1))
+
+    def feed(self, **headers):
+        url = f'/api/accounts/feeds/users/user-1/calendar.ics?token={ics.feed_token("user", "user-1")}'
+        return self.client.get(url, headers=headers)
+
+    def lines(self, response):
+        # Unfold continuation lines
+        return response.content.decode().replace('\r\n ', '').split('\r\n')
+
+    def test_series_with_exdates_and_overrides(self):
+        lines = self.lines(self.feed())
+        uid = f'UID:{self.group.group_id}-user-1@{ics.UID_DOMAIN}'
+
+        self.assertEqual(lines.count(uid), 2)
+        self.assertIn('DTSTART;TZID=America/New_York:20260302T100000', lines)
+        self.assertIn('RRULE:FREQ=WEEKLY;COUNT=4', lines)
+        self.assertIn('EXDATE;TZID=America/New_York:20260309T100000,20260316T100000', lines)
+        self.assertIn('RECURRENCE-ID;TZID=America/New_York:20260323T100000', lines)
+        self.assertIn('DTSTART;TZID=America/New_York:20260323T110000', lines)
+        self.assertIn(f'UID:appointment-{self.single.id}@{ics.UID_DOMAIN}', lines)
+        self.assertIn('SUMMARY:Intro\\; call', lines)
+        self.assertEqual(lines.count('BEGIN:VEVENT'), 3)
+
+    def test_feed_needs_its_token_and_revalidates(self):
+        url = '/api/accounts/feeds/users/user-1/calendar.ics'
+        self.assertEqual(self.client.get(url, {'token': 'wrong'}).status_code, 403)
+
+        etag = self.feed()['ETag']
+        self.assertEqual(self.feed(if_none_match=etag).status_code, 304)
+
+        GHLAppointment.objects.filter(id=self.single.id).update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.feed(if_none_match=etag).status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ArchiveTests(TestCase):
+    """Past appointments move to the archive in batches unless something still needs them"""
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.cutoff = now - timedelta(days=90)
+        old = now - timedelta(days=200)
+
+        self.archivable = [make_appointment(start_time=old + timedelta(hours=n), title=f'Old {n}') for n in range(3)]
+        make_appointment(start_time=now - timedelta(days=10))
+        # Tombstones: GHL hasn't confirmed one, the other is confirmed and out of feed retention
+        make_appointment(start_time=old, is_active=False, deleted_at=old)
+        confirmed = make_appointment(start_time=old, is_active=False, deleted_at=old, ghl_deleted_at=old)
+        GHLAppointment.objects.filter(id=confirmed.id).update(updated_at=old)
+        self.archivable.append(confirmed)
+
+        finished = make_group(original_start_time=old, is_active=False)
+        self.archivable += make_series(finished)
+        # One occurrence of this series is still recent, so all of it stays
+        running = make_group(original_start_time=now - timedelta(days=100))
+        make_series(running)
+
+    def test_batches_move_only_archivable_rows(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = archive.archive_appointments(self.cutoff, batch_size=2)
+
+        expected = sorted(appointment.id for appointment in self.archivable)
+        self.assertEqual(moved, len(expected))
+        self.assertEqual(sorted(ArchivedAppointment.objects.values_list('id', flat=True)), expected)
+        self.assertFalse(GHLAppointment.objects.filter(id__in=expected).exists())
+        self.assertEqual(GHLAppointment.objects.count(), 5)
+        self.assertEqual(ArchivedAppointment.objects.get(id=self.archivable[0].id).title, 'Old 0')
+
+    def test_max_batches_and_interrupted_runs(self):
+        # A previous run archived this row but died before deleting it
+        first = GHLAppointment.objects.filter(id=self.archivable[0].id).values(*archive.ARCHIVE_FIELDS).get()
+        ArchivedAppointment.objects.create(**first)
+
+        self.assertEqual(archive.archive_appointments(self.cutoff, batch_size=2, max_batches=1), 2)
+        self.assertFalse(GHLAppointment.objects.filter(id=self.archivable[0].id).exists())
+        self.assertEqual(archive.archivable(self.cutoff).count(), len(self.archivable) - 2)
+
+
+    def test_backfill_counts_archived_appointments(self):
+        connect_location()
+        first_day = (timezone.now() - timedelta(days=210)).date()
+        last_day = timezone.now().date()
+        rollups.recompute_rollups(first_day, last_day)
+        before = sorted(AppointmentDailyRollup.objects.values_list('user_id', 'day', 'appointment_count', 'booked_minutes'))
+
+        archive.archive_appointments(self.cutoff)
+        call_command('backfill_rollups', '--from', first_day.isoformat(), '--to', last_day.isoformat(), stdout=StringIO())
+
+        self.assertTrue(ArchivedAppointment.objects.exists())
+        self.assertEqual(
+            sorted(AppointmentDailyRollup.objects.values_list('user_id', 'day', 'appointment_count', 'booked_minutes')),
+            before
+        )
+        self.assertEqual(
+            sum(AppointmentDailyRollup.objects.values_list('appointment_count', flat=True)),
+            GHLAppointment.objects.filter(is_active=True).count() + ArchivedAppointment.objects.filter(is_active=True).count()
+        )
+
+class QueryIndexTests(TestCase):
+    """Index migrations don't lock live tables and audit_queries covers every endpoint"""
+
+    def test_index_migrations_on_live_tables_build_concurrently(self):
+        from django.contrib.postgres.operations import AddIndexConcurrently
+        from django.db.migrations import AddIndex, CreateModel
+        from django.db.migrations.loader import MigrationLoader
+
+        # Applied everywhere before indexes were built concurrently
+        applied_before = {'0001_initial', '0002_ghlappointment_ghluser', '0003_recurringappointmentgroup_and_more'}
+
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        names = sorted(name for app_label, name in loader.disk_migrations if app_label == 'accounts')
+        self.assertTrue(applied_before < set(names))
+        for name in names:
+            if name in applied_before:
+                continue
+            migration = loader.get_migration('accounts', name)
+            created = {operation.name_lower for operation in migration.operations if isinstance(operation, CreateModel)}
+            with self.subTest(migration=name):
+                # Tables created by the migration itself are empty, so a plain index is fine there
+                self.assertFalse([
+                    operation.index.name for operation in migration.operations
+                    if type(operation) is AddIndex and operation.model_name_lower not in created
+                ])
+                if any(isinstance(operation, AddIndexConcurrently) for operation in migration.operations):
+                    self.assertFalse(migration.atomic)
+
+    def test_audit_queries_explains_each_endpoint(self):
+        make_group()
+        make_appointment()
+        out = StringIO()
+
+        call_command('audit_queries', '--location-id', 'loc-1', stdout=out)
+
+        output = out.getvalue()
+        for name in ('appointments by location', 'user search', 'contact search', 'free/busy', 'user calendar feed'):
+            self.assertRegex(output, rf'(OK|SCAN)\s+{re.escape(name)}')
+        self.assertIn('of the audited queries scan a whole table', output)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReplicaRoutingTests(TransactionTestCase):
+    """List reads go to the replica unless the reader or its location just wrote"""
+
+    def setUp(self):
+        cache.clear()
+        make_user('user-1')
+        make_appointment()
+        self.reads = []
+
+        def db_for_read(router, model, **hints):
+            self.reads.append(db_routing.reading_from_replica())
+            return None
+
+        for patcher in (
+            mock.patch.object(db_routing, 'replica_configured', return_value=True),
+            mock.patch.object(db_routing.ReplicaRouter, 'db_for_read', db_for_read),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def client_for(self, username):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(username))
+        return client
+
+    def list_reads(self, client, **params):
+        self.reads.clear()
+        response = client.get('/api/accounts/appointments/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.reads)
+        return set(self.reads)
+
+    def test_lists_read_from_the_replica(self):
+        self.assertEqual(self.list_reads(APIClient()), {True})
+        self.assertEqual(self.list_reads(APIClient(), location_id='loc-1'), {True})
+
+    def test_list_right_after_a_write_reads_from_the_primary(self):
+        writer, other = self.client_for('writer'), self.client_for('other')
+
+        response = writer.post('/api/accounts/users/user-1/update-calendar/', {'calendar_id': 'cal-1'})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.list_reads(writer), {False})
+        self.assertEqual(self.list_reads(other, location_id='loc-1'), {False})
+        self.assertEqual(self.list_reads(other), {True})
+
+    def test_bumped_location_reads_from_the_primary(self):
+        bump_location_version('loc-1')
+
+        self.assertEqual(self.list_reads(APIClient(), location_id='loc-1'), {False})
+        self.assertEqual(self.list_reads(APIClient(), location_id='loc-2'), {True})
+
+    def test_pins_expire(self):
+        with override_settings(DB_REPLICA_STICKY_SECONDS=0):
+            bump_location_version('loc-1')
+            db_routing.pin_to_primary(user_id=1)
+
+        self.assertFalse(db_routing.pinned_to_primary(user_id=1, location_ids=['loc-1']))
+        self.assertEqual(self.list_reads(APIClient(), location_id='loc-1'), {True})
+
+    def test_failed_writes_do_not_pin(self):
+        writer = self.client_for('writer')
+
+        response = writer.post('/api/accounts/users/missing/update-calendar/', {'calendar_id': 'cal-1'})
+        self.assertEqual(response.status_code, 404)
+
+        self.assertEqual(self.list_reads(writer), {True})
+
+    def test_transactions_read_from_the_primary(self):
+        with db_routing.replica_reads():
+            self.assertTrue(db_routing.reading_from_replica())
+            with transaction.atomic():
+                self.assertFalse(db_routing.reading_from_replica())
+
+    def test_without_a_replica_nothing_is_pinned(self):
+        with mock.patch.object(db_routing, 'replica_configured', return_value=False):
+            bump_location_version('loc-1')
+            self.assertEqual(self.list_reads(APIClient(), location_id='loc-1'), {False})
+
+        self.assertFalse(db_routing.pinned_to_primary(location_ids=['loc-1']))
@@ -2,15 +2,25 @@ from django.urls import path
 from accounts.views import (UpdateUserCalendarView,
                     CalendarStatsView,
                     AppointmentBookingView,
+                    FreeBusyView,
+                    BookingRollupView,
                     AppointmentUpdateView,
                     AppointmentDeleteView,
                     AppointmentListView,
+                    AppointmentChangesView,
+                    AppointmentExportView,
+                    ContactExportView,
+                    user_calendar_feed,
+                    location_calendar_feed,
+                    CalendarFeedLinksView,
                     AppointmentDetailView,
                     ContactSearchView,
                     GHLUserSearchView,
                     RecurringAppointmentGroupListView,
                     RecurringGroupAppointmentsView,
+                    RecurringGroupUpdateView,
                     delete_recurring_group,
+                    RecurringGroupDeletionJobView,
                     delete_single_appointment,
                     NonRecurringAppointmentsView
                     )
@@ -21,9 +31,17 @@ urlpatterns = [
     path('calendar-stats/<str:location_id>/', CalendarStatsView.as_view(), name='calendar-stats-by-location'),
     path('appointments/', AppointmentListView.as_view(), name='appointment-list'),
     path('appointments/book/', AppointmentBookingView.as_view(), name='appointment-book'),
+    path('appointments/changes/', AppointmentChangesView.as_view(), name='appointment-changes'),
+    path('exports/appointments/', AppointmentExportView.as_view(), name='export-appointments'),
+    path('exports/contacts/', ContactExportView.as_view(), name='export-contacts'),
+    path('feeds/links/', CalendarFeedLinksView.as_view(), name='calendar-feed-links'),
+    path('feeds/users/<str:user_id>/calendar.ics', user_calendar_feed, name='user-calendar-feed'),
+    path('feeds/locations/<str:location_id>/calendar.ics', location_calendar_feed, name='location-calendar-feed'),
     # path('appointments/<int:appointment_id>/', AppointmentDetailView.as_view(), name='appointment-detail'),
     # path('appointments/<int:appointment_id>/update/', AppointmentUpdateView.as_view(), name='appointment-update'),
     # path('appointments/<int:appointment_id>/delete/', AppointmentDeleteView.as_view(), name='appointment-delete'),
+    path('availability/free-busy/', FreeBusyView.as_view(), name='availability-free-busy'),
+    path('reports/bookings/', BookingRollupView.as_view(), name='booking-rollups'),
     path('search/contacts/', ContactSearchView.as_view(), name='search-contacts'),
     path('search/users/', GHLUserSearchView.as_view(), name='search-users'),
     path('recurring-groups/',RecurringAppointmentGroupListView.as_view(),name='recurring-groups-list'),
@@ -35,6 +53,13 @@ urlpatterns = [
         name='recurring-group-appointments'
     ),
     
+    # Update all or this-and-following occurrences of a recurring group
+    path(
+        'recurring-groups/<uuid:group_id>/update/',
+        RecurringGroupUpdateView.as_view(),
+        name='update-recurring-group'
+    ),
+    
     # Delete a recurring group (bulk delete)
     path(
         'recurring-groups/<uuid:group_id>/delete/',
@@ -42,6 +67,13 @@ urlpatterns = [
         name='delete-recurring-group'
     ),
     
+    # Poll a background recurring group deletion
+    path(
+        'recurring-groups/deletion-jobs/<uuid:job_id>/',
+        RecurringGroupDeletionJobView.as_view(),
+        name='recurring-group-deletion-job'
+    ),
+    
     # Delete a single appointment
     path(
         'appointments/<int:appointment_id>/delete/',
@@ -3,6 +3,12 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+from calendar_app.db_routing import ReplicaReadMixin, use_replica
 from .models import GHLUser,Contact
 from .serializers import GHLUserCalendarUpdateSerializer,GHLUserSerializer,ContactSerializer,AppointmentWithUserSerializer
 from rest_framework.permissions import IsAdminUser, AllowAny
@@ -14,18 +20,39 @@ from .serializers import (
     AppointmentUpdateSerializer,
     AppointmentResponseSerializer,
     RecurringAppointmentGroupSerializer,
-    GHLAppointmentSerializer
+    GHLAppointmentSerializer,
+    RecurringGroupDeletionJobSerializer,
+    RecurringSeriesUpdateSerializer,
+    FreeBusyQuerySerializer,
+    AppointmentChangesQuerySerializer,
+    ExportQuerySerializer,
+    BookingRollupQuerySerializer
 )
 from .services import GHLAppointmentService
+from .availability import AppointmentConflictError, get_free_busy
+from .rollups import query_rollups
+from .changes import CursorError, CursorExpired, get_changes
+from . import exports, ics
+from .fast_render import (
+    FastRenderMixin,
+    is_fast,
+    appointment_values,
+    group_appointment_values,
+    appointment_with_user_values,
+    with_adjusted_times,
+    with_user_names
+)
 
-from django.db.models import Q
+from django.db.models import Q, Count
 from .pagination import StandardResultsSetPagination
+from .caching import bump_location_version, cache_response, conditional_list
 
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.pagination import PageNumberPagination
 from django.db import transaction
-from .models import RecurringAppointmentGroup, GHLAppointment
+from .models import RecurringAppointmentGroup, GHLAppointment, RecurringGroupDeletionJob
+from .tasks import process_group_deletion_job
 import logging
 import requests
 
@@ -40,6 +67,7 @@ class UpdateUserCalendarView(APIView):
         if serializer.is_valid():
             calendar_id = serializer.validated_data.get('calendar_id', '').strip()
             serializer.save(calendar_id=calendar_id if calendar_id else None)
+            bump_location_version(user.location_id)
 
             return Response({
                 'success': True,
@@ -51,9 +79,10 @@ class UpdateUserCalendarView(APIView):
         return Response({'success': False, 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class CalendarStatsView(APIView):
+class CalendarStatsView(ReplicaReadMixin, APIView):
     permission_classes = [AllowAny]
 
+    @cache_response('calendar-stats', location_kwarg='location_id')
     def get(self, request, location_id=None):
         try:
             users = GHLUser.objects.all()
@@ -61,21 +90,30 @@ class CalendarStatsView(APIView):
             if location_id:
                 users = users.filter(location_id=location_id)
 
-            total = users.count()
-            with_cal = users.exclude(calendar_id__isnull=True).exclude(calendar_id='').count()
-            without_cal = total - with_cal
-            serializer = GHLUserSerializer(users, many=True)
+            counts = users.aggregate(
+                total=Count('id'),
+                with_cal=Count('id', filter=Q(calendar_id__isnull=False) & ~Q(calendar_id=''))
+            )
+            total = counts['total']
+            with_cal = counts['with_cal']
+            stats = {
+                'total_users': total,
+                'users_with_calendar': with_cal,
+                'users_without_calendar': total - with_cal,
+                'calendar_coverage_percentage': round((with_cal / total * 100) if total > 0 else 0, 2),
+            }
 
-            return Response({
-                'success': True,
-                'stats': {
-                    'total_users': total,
-                    'users_with_calendar': with_cal,
-                    'users_without_calendar': without_cal,
-                    'calendar_coverage_percentage': round((with_cal / total * 100) if total > 0 else 0, 2),
-                    "all_users":serializer.data
-                }
-            })
+            response_data = {'success': True, 'stats': stats}
+
+            # The user list is opt-in and paginated
+            if request.query_params.get('include_users', '').lower() in ('1', 'true', 'yes'):
+                paginator = StandardResultsSetPagination()
+                page = paginator.paginate_queryset(users.order_by('name', 'id'), request, view=self)
+                response_data['users'] = paginator.get_paginated_response(
+                    GHLUserSerializer(page, many=True).data
+                ).data
+
+            return Response(response_data)
 
         except Exception as e:
             return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -115,6 +153,11 @@ class AppointmentBookingView(APIView):
             
             return Response(response_data, status=status.HTTP_201_CREATED)
             
+        except AppointmentConflictError as e:
+            return Response(
+                {'error': str(e), 'conflicts': e.conflicts},
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -122,6 +165,76 @@ class AppointmentBookingView(APIView):
             )
 
 
+class FreeBusyView(APIView):
+    """Merged busy intervals and open slots per user from the local availability index"""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        serializer = FreeBusyQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid query', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        params = serializer.validated_data
+        free_busy = get_free_busy(
+            params['user_ids'],
+            params['start'],
+            params['end'],
+            location_id=params.get('location_id'),
+            slot_minutes=params.get('slot_minutes')
+        )
+
+        def as_json(result):
+            return {
+                key: [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in intervals]
+                for key, intervals in result.items()
+            }
+
+        return Response({
+            'location_id': params.get('location_id'),
+            'start': params['start'].isoformat(),
+            'end': params['end'].isoformat(),
+            'users': {user_id: as_json(result) for user_id, result in free_busy['users'].items()},
+            'combined': as_json(free_busy['combined'])
+        }, status=status.HTTP_200_OK)
+
+
+class BookingRollupView(ReplicaReadMixin, APIView):
+    """Per-day and per-user booking counts and booked hours from the daily rollups"""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        serializer = BookingRollupQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid query', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        params = serializer.validated_data
+        rows, totals = query_rollups(
+            params['location_id'],
+            params['start'],
+            params['end'],
+            user_ids=params.get('user_ids'),
+            group_by=params['group_by']
+        )
+
+        for row in rows + [totals]:
+            row['booked_hours'] = round(row['booked_minutes'] / 60, 2)
+
+        return Response({
+            'location_id': params['location_id'],
+            'start': params['start'].isoformat(),
+            'end': params['end'].isoformat(),
+            'group_by': params['group_by'],
+            'results': rows,
+            'totals': totals
+        }, status=status.HTTP_200_OK)
+
+
 class AppointmentUpdateView(APIView):
     """API endpoint for updating appointments"""
     # authentication_classes = [JWTAuthentication]
@@ -196,18 +309,18 @@ class AppointmentDeleteView(APIView):
             )
 
 
-class AppointmentListView(APIView):
+class AppointmentListView(ReplicaReadMixin, FastRenderMixin, APIView):
     """API endpoint for listing appointments"""
     # authentication_classes = [JWTAuthentication]
     permission_classes = [AllowAny]
-    
-    def get(self, request):
-        appointments = GHLAppointment.objects.all().order_by('-created_at')
+
+    def get_queryset(self):
+        appointments = GHLAppointment.objects.filter(is_active=True).order_by('-created_at')
         
         # Optional filtering
-        location_id = request.query_params.get('location_id')
-        contact_id = request.query_params.get('contact_id')
-        assigned_to = request.query_params.get('assigned_to')
+        location_id = self.request.query_params.get('location_id')
+        contact_id = self.request.query_params.get('contact_id')
+        assigned_to = self.request.query_params.get('assigned_to')
         
         if location_id:
             appointments = appointments.filter(location_id=location_id)
@@ -215,6 +328,15 @@ class AppointmentListView(APIView):
             appointments = appointments.filter(contact_id=contact_id)
         if assigned_to:
             appointments = appointments.filter(assigned_to=assigned_to)
+        return appointments
+    
+    @conditional_list()
+    def get(self, request):
+        appointments = self.get_queryset()
+
+        if is_fast(request):
+            rows = list(appointment_values(appointments))
+            return Response({'appointments': rows, 'count': len(rows)}, status=status.HTTP_200_OK)
         
         serializer = AppointmentResponseSerializer(appointments, many=True)
         
@@ -224,6 +346,128 @@ class AppointmentListView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class AppointmentChangesView(APIView):
+    """Appointments created, updated or deleted in a location since a cursor"""
+    # Stays on the primary: a lagging replica would let cursors skip rows
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        serializer = AppointmentChangesQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid query', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        params = serializer.validated_data
+        try:
+            feed = get_changes(params['location_id'], params.get('since'), params['limit'])
+        except CursorExpired as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+        except CursorError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'changed': AppointmentResponseSerializer(feed['changed'], many=True).data,
+            'deleted': feed['deleted'],
+            'cursor': feed['cursor'],
+            'has_more': feed['has_more']
+        }, status=status.HTTP_200_OK)
+
+
+class AppointmentExportView(APIView):
+    """Stream every appointment of a location as CSV or NDJSON"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        serializer = ExportQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid query', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        params = serializer.validated_data
+        return exports.streaming_export(
+            exports.appointment_rows(params['location_id'], params['include_inactive']),
+            exports.APPOINTMENT_EXPORT_FIELDS,
+            params['file_format'],
+            f"appointments-{params['location_id']}"
+        )
+
+
+class ContactExportView(APIView):
+    """Stream every contact of a location as CSV or NDJSON"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        serializer = ExportQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid query', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        params = serializer.validated_data
+        return exports.streaming_export(
+            exports.contact_rows(params['location_id']),
+            exports.CONTACT_EXPORT_FIELDS,
+            params['file_format'],
+            f"contacts-{params['location_id']}"
+        )
+
+
+def _ics_response(request, kind, key, name, rows):
+    if not ics.check_feed_token(kind, key, request.GET.get('token')):
+        return HttpResponseForbidden("Invalid feed token")
+
+    body, etag, last_modified = ics.get_feed(kind, key, name, rows)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+@require_GET
+@use_replica
+def user_calendar_feed(request, user_id):
+    """ICS feed of one user's appointments, for external calendar apps"""
+    user = get_object_or_404(GHLUser, user_id=user_id)
+    return _ics_response(request, 'user', user_id, user.name or user_id, ics.feed_rows(user_id=user_id))
+
+
+@require_GET
+@use_replica
+def location_calendar_feed(request, location_id):
+    """ICS feed of every appointment of a location"""
+    return _ics_response(request, 'location', location_id, location_id, ics.feed_rows(location_id=location_id))
+
+
+class CalendarFeedLinksView(APIView):
+    """Subscription URLs (with their secret tokens) of a user's or a location's feed"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user_id = request.query_params.get('user_id')
+        location_id = request.query_params.get('location_id')
+        if not user_id and not location_id:
+            return Response({'error': 'user_id or location_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        links = {}
+        if user_id:
+            url = reverse('user-calendar-feed', kwargs={'user_id': user_id})
+            links['user'] = request.build_absolute_uri(f"{url}?token={ics.feed_token('user', user_id)}")
+        if location_id:
+            url = reverse('location-calendar-feed', kwargs={'location_id': location_id})
+            links['location'] = request.build_absolute_uri(f"{url}?token={ics.feed_token('location', location_id)}")
+        return Response(links, status=status.HTTP_200_OK)
+
+
 class AppointmentDetailView(APIView):
     """API endpoint for getting appointment details"""
     # authentication_classes = [JWTAuthentication]
@@ -231,7 +475,7 @@ class AppointmentDetailView(APIView):
     
     def get(self, request, appointment_id):
         try:
-            appointment = GHLAppointment.objects.get(id=appointment_id)
+            appointment = GHLAppointment.objects.get(id=appointment_id, is_active=True)
             serializer = AppointmentResponseSerializer(appointment)
             
             return Response(
@@ -250,12 +494,16 @@ from django.db.models import Value, CharField
 from django.db.models.functions import Concat
 
 
-class ContactSearchView(generics.ListAPIView):
+class ContactSearchView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = ContactSerializer
     pagination_class = StandardResultsSetPagination
     permission_classes = [AllowAny]
     
 
+    @cache_response('contact-search')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         search = self.request.query_params.get('search', '')
         return Contact.objects.annotate(
@@ -272,11 +520,14 @@ class ContactSearchView(generics.ListAPIView):
             Q(full_name__icontains=search)  # <-- this enables "john simmons"
         )
 
-class GHLUserSearchView(generics.ListAPIView):
+class GHLUserSearchView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = GHLUserSerializer
     pagination_class = StandardResultsSetPagination
     permission_classes = [AllowAny]
 
+    @cache_response('user-search')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
         search = self.request.query_params.get('search', '')
@@ -302,7 +553,7 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class RecurringAppointmentGroupListView(generics.ListAPIView):
+class RecurringAppointmentGroupListView(ReplicaReadMixin, generics.ListAPIView):
     """
     List all recurring appointment groups with pagination
     """
@@ -310,6 +561,11 @@ class RecurringAppointmentGroupListView(generics.ListAPIView):
     serializer_class = RecurringAppointmentGroupSerializer
     permission_classes = [AllowAny]
     pagination_class = StandardResultsSetPagination
+
+    @conditional_list()
+    @cache_response('recurring-groups')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -326,13 +582,24 @@ class RecurringAppointmentGroupListView(generics.ListAPIView):
         return queryset
 
 
-class RecurringGroupAppointmentsView(generics.ListAPIView):
+class RecurringGroupAppointmentsView(ReplicaReadMixin, FastRenderMixin, generics.ListAPIView):
     """
     Retrieve all appointments under a specific recurring group
     """
     serializer_class = GHLAppointmentSerializer
     permission_classes = [AllowAny]
     pagination_class = StandardResultsSetPagination
+
+    @conditional_list()
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if not is_fast(request):
+            return super().list(request, *args, **kwargs)
+
+        rows = self.paginate_queryset(group_appointment_values(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(with_adjusted_times(rows))
     
     def get_queryset(self):
         group_id = self.kwargs['group_id']
@@ -347,66 +614,96 @@ class RecurringGroupAppointmentsView(generics.ListAPIView):
         ).order_by('occurrence_number', 'start_time')
 
 
-@api_view(['DELETE'])
-@permission_classes([AllowAny])
-def delete_recurring_group(request, group_id):
-    """
-    Delete a recurring group and all its appointments (bulk delete)
-    """
-    try:
-        with transaction.atomic():
-            # Get the recurring group
-            recurring_group = get_object_or_404(
-                RecurringAppointmentGroup,
-                group_id=group_id,
-                is_active=True
+class RecurringGroupUpdateView(APIView):
+    """API endpoint for rescheduling or editing all / following occurrences of a series"""
+    permission_classes = [AllowAny]
+
+    def put(self, request, group_id):
+        recurring_group = get_object_or_404(
+            RecurringAppointmentGroup,
+            group_id=group_id,
+            is_active=True,
+            is_deleting=False
+        )
+        serializer = RecurringSeriesUpdateSerializer(
+            data=request.data,
+            context={'recurring_group': recurring_group}
+        )
+
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid data', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Get all related appointments
-            appointments = GHLAppointment.objects.filter(
-                recurring_group=recurring_group,
-                is_active=True
+
+        try:
+            updated_appointments, failed_updates = GHLAppointmentService.update_series(
+                recurring_group,
+                serializer.validated_data
             )
-            
-            deleted_count = 0
-            failed_deletions = []
-            
-            # Delete each appointment from GHL and local DB
-            for appointment in appointments:
-                try:
-                    if appointment.ghl_appointment_id:
-                        # Delete from GHL using your existing service
-                        GHLAppointmentService.delete_appointment(appointment.id)
-                        deleted_count += 1
-                    else:
-                        # If no GHL ID, just delete locally
-                        appointment.delete()
-                        deleted_count += 1
-                        
-                except Exception as e:
-                    logger.error(f"Failed to delete appointment {appointment.id}: {str(e)}")
-                    failed_deletions.append({
-                        'appointment_id': appointment.id,
-                        'error': str(e)
-                    })
-            
-            # Mark the recurring group as inactive
-            recurring_group.is_active = False
-            recurring_group.save()
-            
+
             response_data = {
-                'message': 'Recurring group deleted successfully',
+                'message': f'Updated {len(updated_appointments)} appointment(s)',
                 'group_id': str(group_id),
-                'deleted_appointments_count': deleted_count,
-                'failed_deletions': failed_deletions
+                'scope': serializer.validated_data['scope'],
+                'appointments': GHLAppointmentSerializer(updated_appointments, many=True).data,
+                'failed_updates': failed_updates
             }
-            
-            if failed_deletions:
-                response_data['warning'] = 'Some appointments could not be deleted from GHL'
+
+            if failed_updates:
+                response_data['warning'] = 'Some appointments could not be updated in GHL'
+                if serializer.validated_data['scope'] == 'all':
+                    response_data['warning'] += '; the series definition was left unchanged'
                 return Response(response_data, status=status.HTTP_207_MULTI_STATUS)
-            
+
             return Response(response_data, status=status.HTTP_200_OK)
-            
+
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            logger.error(f"Error updating recurring group {group_id}: {str(e)}")
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def patch(self, request, group_id):
+        """Partial update using PATCH"""
+        return self.put(request, group_id)
+
+
+@api_view(['DELETE'])
+@permission_classes([AllowAny])
+def delete_recurring_group(request, group_id):
+    """
+    Start deleting a recurring group and all its appointments in the background.
+    Returns 202 with the deletion job to poll.
+    """
+    try:
+        # Get the recurring group
+        recurring_group = get_object_or_404(
+            RecurringAppointmentGroup,
+            group_id=group_id,
+            is_active=True
+        )
+
+        job, started = GHLAppointmentService.create_group_deletion_job(recurring_group)
+        if started:
+            process_group_deletion_job.delay(str(job.job_id))
+
+        return Response(
+            {
+                'message': 'Recurring group deletion started' if started else 'Recurring group deletion already in progress',
+                'group_id': str(group_id),
+                'job_id': str(job.job_id),
+                'job': RecurringGroupDeletionJobSerializer(job).data
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
     except RecurringAppointmentGroup.DoesNotExist:
         return Response(
             {'error': 'Recurring group not found'},
@@ -420,6 +717,16 @@ def delete_recurring_group(request, group_id):
         )
 
 
+class RecurringGroupDeletionJobView(generics.RetrieveAPIView):
+    """
+    Poll the progress of a recurring group deletion job
+    """
+    queryset = RecurringGroupDeletionJob.objects.select_related('recurring_group')
+    serializer_class = RecurringGroupDeletionJobSerializer
+    permission_classes = [AllowAny]
+    lookup_field = 'job_id'
+
+
 @api_view(['DELETE'])
 @permission_classes([AllowAny])
 def delete_single_appointment(request, appointment_id):
@@ -428,8 +735,7 @@ def delete_single_appointment(request, appointment_id):
     """
     try:
         # Use your existing service method
-        result = GHLAppointmentService.delete_appointment(appointment_id)
-        print("result: ", result)
+        GHLAppointmentService.delete_appointment(appointment_id)
         
         return Response(
             {
@@ -464,12 +770,22 @@ def delete_single_appointment(request, appointment_id):
 
 
 
-class NonRecurringAppointmentsView(APIView):
+class NonRecurringAppointmentsView(ReplicaReadMixin, FastRenderMixin, APIView):
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        return GHLAppointment.objects.filter(recurring_group__isnull=True, is_active=True).order_by('-created_at')
+
+    @conditional_list()
+    @cache_response('non-recurring-appointments')
     def get(self, request):
-        appointments = GHLAppointment.objects.filter(recurring_group__isnull=True).order_by('-created_at')
+        appointments = self.get_queryset()
         paginator = StandardResultsSetPagination()
+
+        if is_fast(request):
+            rows = paginator.paginate_queryset(appointment_with_user_values(appointments), request)
+            return paginator.get_paginated_response(with_user_names(rows))
+
         paginated_appointments = paginator.paginate_queryset(appointments, request)
         serializer = AppointmentWithUserSerializer(paginated_appointments, many=True)
         return paginator.get_paginated_response(serializer.data)
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""
+PostgreSQL backend that times connection checkouts for calendar_app.db_metrics.
+
+Django connects lazily, on a request's first query, so only requests that
+actually query the database are measured. Reused persistent connections
+don't connect and cost nothing.
+"""
+import time
+
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        # A new physical connection, or a checkout when the pool is enabled
+        start = time.monotonic()
+        try:
+            return super().get_new_connection(conn_params)
+        finally:
+            # Imported here: backends load before apps are ready, and db_metrics imports DRF
+            from calendar_app.db_metrics import record_checkout
+            record_checkout((time.monotonic() - start) * 1000)
@@ -0,0 +1,69 @@
+"""
+Database connection metrics.
+
+The ``calendar_app.db_backend`` engine times every connection it opens: a
+new physical connect, or a pool checkout when pooling is enabled. Requests
+reusing a persistent connection open none. With the psycopg pool enabled
+its own statistics (size, idle connections, queued requests, wait time)
+and saturation are reported too.
+
+Numbers are kept per process; ``GET /api/metrics/db/`` returns those of the
+process serving the request.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+
+_lock = threading.Lock()
+_checkouts = {
+    'count': 0,
+    'total_ms': 0.0,
+    'max_ms': 0.0,
+}
+
+
+def record_checkout(elapsed_ms):
+    with _lock:
+        _checkouts['count'] += 1
+        _checkouts['total_ms'] += elapsed_ms
+        _checkouts['max_ms'] = max(_checkouts['max_ms'], elapsed_ms)
+
+
+def pool_stats(alias='default'):
+    """psycopg pool statistics plus saturation, or None when pooling is off"""
+    pool = connections[alias].pool if settings.DB_POOL else None
+    if pool is None:
+        return None
+
+    stats = pool.get_stats()
+    in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+    stats['in_use'] = in_use
+    stats['saturation'] = round(in_use / stats['pool_max'], 3) if stats.get('pool_max') else None
+    return stats
+
+
+def get_metrics():
+    with _lock:
+        checkouts = dict(_checkouts)
+    checkouts['avg_ms'] = round(checkouts['total_ms'] / checkouts['count'], 3) if checkouts['count'] else 0.0
+
+    return {
+        'pid': os.getpid(),
+        'process_role': settings.PROCESS_ROLE,
+        'conn_max_age': settings.DATABASES['default']['CONN_MAX_AGE'],
+        'pgbouncer': settings.DB_PGBOUNCER,
+        'checkout': checkouts,
+        'pool': pool_stats(),
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def database_metrics(request):
+    return Response(get_metrics())
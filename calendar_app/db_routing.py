@@ -0,0 +1,162 @@
+"""
+Read-replica routing.
+
+With ``DB_REPLICA_HOST`` set, a ``replica`` database alias is configured and
+views that opt in with ``ReplicaReadMixin`` (list, search and stats
+endpoints) run their reads against it. Everything else, including every
+write, the service layer and Celery tasks, stays on ``default``.
+
+Replica reads are turned off again, falling back to the primary:
+
+- for the rest of a request once it wrote anything
+- inside transactions, which must see their own writes
+- for DB_REPLICA_STICKY_SECONDS after a write, covering replication lag
+  (read-your-writes): a successful unsafe request pins its authenticated
+  user, and every cache version bump pins the location it was made for.
+  Pins live in the cache, so they hold for any client (including SPAs on
+  another origin authenticating with JWT) and across processes
+
+Routing state lives in context variables, so it is per request under both
+threaded and async servers.
+"""
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_pinned = contextvars.ContextVar('replica_pinned', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def _pin_keys(user_id=None, location_ids=()):
+    keys = [f"replica-pin:location:{location_id or 'all'}" for location_id in location_ids]
+    if user_id is not None:
+        keys.append(f"replica-pin:user:{user_id}")
+    return keys
+
+
+def pin_to_primary(user_id=None, location_ids=()):
+    """
+    Read from the primary for DB_REPLICA_STICKY_SECONDS on behalf of a user
+    and of locations (None standing for unscoped reads) that just wrote
+    """
+    keys = _pin_keys(user_id, location_ids)
+    if keys and replica_configured():
+        cache.set_many(dict.fromkeys(keys, True), timeout=settings.DB_REPLICA_STICKY_SECONDS)
+
+
+def pinned_to_primary(user_id=None, location_ids=()):
+    """Whether any of the given user and locations is pinned"""
+    keys = _pin_keys(user_id, location_ids)
+    return bool(keys) and bool(cache.get_many(keys))
+
+
+def _request_pinned(request, location_id=None):
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    return pinned_to_primary(user_id, [location_id] if location_id else [])
+
+
+def reading_from_replica():
+    """Whether reads issued right now go to the replica"""
+    return (
+        _replica_reads.get()
+        and not _pinned.get()
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+@contextmanager
+def replica_reads():
+    """Send reads made inside the block to the replica, if there is one"""
+    reads_token = _replica_reads.set(replica_configured())
+    pinned_token = _pinned.set(_pinned.get())
+    try:
+        yield
+    finally:
+        _pinned.reset(pinned_token)
+        _replica_reads.reset(reads_token)
+
+
+def use_replica(view_func):
+    """Decorator form of ``replica_reads`` for function views"""
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return view_func(request, *args, **kwargs)
+        with replica_reads():
+            location_id = kwargs.get('location_id') or request.GET.get('location_id')
+            if _replica_reads.get() and _request_pinned(request, location_id):
+                _pinned.set(True)
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """Serve a view's safe requests from the replica"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Authentication has run, so JWT users are known by now
+        location_id = kwargs.get('location_id') or request.query_params.get('location_id')
+        if _replica_reads.get() and _request_pinned(request, location_id):
+            _pinned.set(True)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Reads later in the same request must see this write
+        if _replica_reads.get():
+            _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, REPLICA}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        if db == REPLICA:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Pin authenticated users to the primary for a while after they wrote"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_configured():
+            # DRF stores the user it authenticated (e.g. from a JWT) on the request
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user_id=user.pk)
+        return response
@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -67,6 +70,7 @@ CSRF_TRUSTED_ORIGINS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    'calendar_app.db_routing.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -141,17 +145,71 @@ WSGI_APPLICATION = 'calendar_app.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Web and Celery worker processes size their connections separately;
+# `celery` processes are detected, anything else is treated as web
+PROCESS_ROLE = config("PROCESS_ROLE", default='worker' if 'celery' in os.path.basename(sys.argv[0]) else 'web')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # django.db.backends.postgresql, timing connection checkouts (see calendar_app.db_metrics)
+        'ENGINE': 'calendar_app.db_backend',
         'NAME': config("NAME"),
         'USER': "postgres",
         'PASSWORD': config("PASSWORD"),
         'HOST': config("HOST"),
-        'PORT': '5432',
+        'PORT': config("DB_PORT", default='5432'),
+        # Persistent connections, checked before reuse
+        'CONN_MAX_AGE': config("DB_CONN_MAX_AGE", default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
     }
 }
 
+# Behind a transaction-pooling pgbouncer: server-side cursors can't span
+# transactions, and pgbouncer does the pooling
+DB_PGBOUNCER = config("DB_PGBOUNCER", default=False, cast=bool)
+
+# psycopg 3 connection pool (needs `psycopg[pool]` instead of psycopg2);
+# it replaces persistent connections
+DB_POOL = config("DB_POOL", default=False, cast=bool) and not DB_PGBOUNCER
+
+if DB_PGBOUNCER:
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+if DB_POOL:
+    # Fail at startup rather than on the first query
+    try:
+        import psycopg  # noqa: F401
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured("DB_POOL needs psycopg 3 and its pool: pip install 'psycopg[pool]'")
+
+    _pool_role = PROCESS_ROLE.upper()
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': config(f"DB_POOL_{_pool_role}_MIN_SIZE", default=2 if PROCESS_ROLE == 'web' else 1, cast=int),
+            'max_size': config(f"DB_POOL_{_pool_role}_MAX_SIZE", default=10 if PROCESS_ROLE == 'web' else 4, cast=int),
+            # Seconds a request waits for a free connection before failing
+            'timeout': config("DB_POOL_TIMEOUT", default=10, cast=float),
+        }
+    }
+
+# Optional read replica for list, search and stats endpoints (see
+# calendar_app.db_routing); users and locations that wrote read from the
+# primary for DB_REPLICA_STICKY_SECONDS to cover replication lag
+DB_REPLICA_HOST = config("DB_REPLICA_HOST", default='')
+DB_REPLICA_STICKY_SECONDS = config("DB_REPLICA_STICKY_SECONDS", default=10, cast=int)
+
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'PORT': config("DB_REPLICA_PORT", default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['calendar_app.db_routing.ReplicaRouter']
+
 
 
 # Password validation
@@ -196,6 +254,34 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Recurring series booked in 'window' mode only materialize occurrences
+# starting within this horizon; extend_recurring_windows rolls it forward
+RECURRING_MATERIALIZATION_MODE = config("RECURRING_MATERIALIZATION_MODE", default='all')
+RECURRING_MATERIALIZATION_HORIZON = timedelta(weeks=config("RECURRING_MATERIALIZATION_HORIZON_WEEKS", default=8, cast=int))
+
+# Optional shared calendars that get an extra copy of every booking, by
+# booking type, assigned to GHL_SHARED_CALENDAR_ASSIGNEE_ID; unset skips it
+GHL_SHARED_RECURRING_CALENDAR_ID = config("GHL_SHARED_RECURRING_CALENDAR_ID", default='')
+GHL_SHARED_SINGLE_CALENDAR_ID = config("GHL_SHARED_SINGLE_CALENDAR_ID", default='')
+GHL_SHARED_CALENDAR_ASSIGNEE_ID = config("GHL_SHARED_CALENDAR_ASSIGNEE_ID", default='')
+
+# Days before and after today the booking rollups are rebuilt for
+APPOINTMENT_ROLLUP_LOOKBACK_DAYS = config("APPOINTMENT_ROLLUP_LOOKBACK_DAYS", default=7, cast=int)
+APPOINTMENT_ROLLUP_LOOKAHEAD_DAYS = config("APPOINTMENT_ROLLUP_LOOKAHEAD_DAYS", default=90, cast=int)
+
+# Appointments that ended longer ago than this move to ghl_appointments_archive
+APPOINTMENT_ARCHIVE_AFTER_DAYS = config("APPOINTMENT_ARCHIVE_AFTER_DAYS", default=180, cast=int)
+APPOINTMENT_ARCHIVE_BATCH_SIZE = config("APPOINTMENT_ARCHIVE_BATCH_SIZE", default=1000, cast=int)
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config("REDIS_CACHE_URL", default='redis://localhost:6379/1'),
+    }
+}
+
+
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
@@ -211,6 +297,38 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'accounts.tasks.make_api_call',
         'schedule': crontab(hour=10),
     },
+    'extend-recurring-windows': {
+        'task': 'accounts.tasks.extend_recurring_windows',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'reconcile-deleted-appointments': {
+        'task': 'accounts.tasks.reconcile_deleted_appointments',
+        'schedule': 300.0,
+    },
+    'purge-appointment-tombstones': {
+        'task': 'accounts.tasks.purge_appointment_tombstones',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'refresh-appointment-rollups': {
+        'task': 'accounts.tasks.refresh_appointment_rollups',
+        'schedule': 900.0,
+    },
+    'sync-location-users': {
+        'task': 'accounts.tasks.sync_location_users',
+        'schedule': 3600.0,
+    },
+    'discover-location-calendars': {
+        'task': 'accounts.tasks.discover_location_calendars',
+        'schedule': 3600.0,
+    },
+    'resume-stale-deletion-jobs': {
+        'task': 'accounts.tasks.resume_stale_deletion_jobs',
+        'schedule': 900.0,
+    },
+    'archive-past-appointments': {
+        'task': 'accounts.tasks.archive_past_appointments',
+        'schedule': crontab(hour=4, minute=0),
+    },
     # 'make-api-call-every-minute1': {
     #     'task': 'accounts.tasks.deletion_task',
     #     'schedule': 60.0,
@@ -16,10 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path,include
+from calendar_app.db_metrics import database_metrics
 
 urlpatterns = [
     path('api/admin/', admin.site.urls),
     path('api/auth/', include('user_auth.urls')),
     path('api/access/', include('ghl_auth.urls')),
     path('api/accounts/', include('accounts.urls')),
+    path('api/metrics/db/', database_metrics, name='database-metrics'),
 ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ghl_auth', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ghlauthcredentials',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -20,6 +20,8 @@ def get_location_name(location_id: str, access_token: str) -> str:
 import requests
 from ghl_auth.models import GHLAuthCredentials
 from accounts.models import Contact
+from accounts.contacts import upsert_contacts
+from accounts.caching import bump_location_version
 
 def create_or_update_contact(data):
     try:
@@ -30,26 +32,9 @@ def create_or_update_contact(data):
 
         print("➡️ Attempting to create or update contact with ID:", contact_id)
 
-        defaults = {
-            "first_name": data.get("firstName"),
-            "last_name": data.get("lastName"),
-            "email": data.get("email"),
-            "phone": data.get("phone"),
-            "dnd": data.get("dnd") or False,
-            "country": data.get("country"),
-            "date_added": data.get("dateAdded"),
-            "location_id": data.get("locationId"),
-        }
+        upsert_contacts([data])
 
-        print("📝 Defaults to be used:", defaults)
-
-        contact, created = Contact.objects.update_or_create(
-            contact_id=contact_id,
-            defaults=defaults
-        )
-
-        action = "created" if created else "updated"
-        print(f"✅ Contact {action}: {contact} (ID: {contact_id})")
+        print(f"✅ Contact upserted (ID: {contact_id})")
 
     except Exception as e:
         print("❗ Error creating or updating contact:", str(e))
@@ -62,6 +47,7 @@ def delete_contact(data):
     try:
         contact = Contact.objects.get(contact_id=contact_id)
         contact.delete()
+        bump_location_version(contact.location_id)
         print("Contact deleted:", contact_id)
     except Contact.DoesNotExist:
         print("Contact not found for deletion:", contact_id)
\ No newline at end of file
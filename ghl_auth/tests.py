@@ -1,3 +1,119 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ghl_auth import token_provider
+from ghl_auth.models import GHLAuthCredentials
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def token_response(access_token="new-token"):
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {
+        "access_token": access_token,
+        "refresh_token": "new-refresh",
+        "expires_in": 86399,
+        "locationId": "loc-1",
+    }
+    return response
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RefreshCredentialsTests(TransactionTestCase):
+    """Token refreshes are single-flight and never spend a refresh token twice"""
+
+    def setUp(self):
+        cache.clear()
+        token_provider._local_tokens.clear()
+        GHLAuthCredentials.objects.create(
+            location_id="loc-1",
+            access_token="old-token",
+            refresh_token="old-refresh",
+            expires_in=86399,
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+
+    def test_concurrent_callers_share_one_refresh(self):
+        def slow_post(*args, **kwargs):
+            time.sleep(0.2)
+            return token_response()
+
+        results = []
+
+        def call():
+            try:
+                results.append(token_provider.refresh_credentials("loc-1").access_token)
+            finally:
+                connection.close()
+
+        with mock.patch.object(token_provider.requests, "post", side_effect=slow_post) as post:
+            threads = [threading.Thread(target=call) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(results, ["new-token"] * 5)
+        self.assertEqual(GHLAuthCredentials.objects.get().refresh_token, "new-refresh")
+
+    def test_fresh_token_is_not_refreshed(self):
+        GHLAuthCredentials.objects.update(expires_at=timezone.now() + timedelta(hours=1))
+
+        with mock.patch.object(token_provider.requests, "post") as post:
+            token = token_provider.refresh_credentials("loc-1")
+
+        post.assert_not_called()
+        self.assertEqual(token.access_token, "old-token")
+
+    @mock.patch.object(token_provider, "REFRESH_WAIT_TIMEOUT", 0.3)
+    @mock.patch.object(token_provider, "REFRESH_POLL_INTERVAL", 0.05)
+    def test_wait_timeout_does_not_refresh_without_the_lock(self):
+        # Another process holds the lock and never finishes
+        cache.add(token_provider._lock_key("loc-1"), "1", timeout=60)
+
+        with mock.patch.object(token_provider.requests, "post") as post:
+            with self.assertRaises(ValueError):
+                token_provider.refresh_credentials("loc-1")
+
+        post.assert_not_called()
+        self.assertEqual(GHLAuthCredentials.objects.get().refresh_token, "old-refresh")
+
+    @mock.patch.object(token_provider, "REFRESH_WAIT_TIMEOUT", 0.3)
+    @mock.patch.object(token_provider, "REFRESH_POLL_INTERVAL", 0.05)
+    def test_wait_timeout_returns_token_stored_by_the_holder(self):
+        cache.add(token_provider._lock_key("loc-1"), "1", timeout=60)
+
+        def holder_stores_token():
+            # The holder saved its token but died before priming the cache or releasing the lock
+            try:
+                GHLAuthCredentials.objects.update(
+                    access_token="holder-token", expires_at=timezone.now() + timedelta(hours=1)
+                )
+            finally:
+                connection.close()
+
+        holder = threading.Timer(0.1, holder_stores_token)
+        with mock.patch.object(token_provider.requests, "post") as post:
+            holder.start()
+            token = token_provider.refresh_credentials("loc-1")
+        holder.join()
+
+        post.assert_not_called()
+        self.assertEqual(token.access_token, "holder-token")
+
+    def test_expired_token_is_refreshed_and_lock_released(self):
+        with mock.patch.object(token_provider.requests, "post", return_value=token_response()) as post:
+            token = token_provider.refresh_credentials("loc-1")
+
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(token.access_token, "new-token")
+        self.assertIsNone(cache.get(token_provider._lock_key("loc-1")))
@@ -0,0 +1,237 @@
+"""
+Shared access-token provider for GHL locations.
+
+Access tokens are cached per location in process memory and in the Django
+cache (Redis), keyed by their expiry, so booking/deleting no longer reads
+GHLAuthCredentials from Postgres on every call.
+
+Refreshes are single-flight: within a process a per-location lock makes
+threads wait for the refresh that is already running, and across processes
+a short-lived cache lock (``cache.add``) does the same for other workers.
+Only the lock holder calls ``/oauth/token``; refresh tokens are single-use,
+so a waiter that gives up never refreshes on its own.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+import requests
+from decouple import config
+from django.core.cache import cache
+from django.utils import timezone
+
+from ghl_auth.models import GHLAuthCredentials
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URL = "https://services.leadconnectorhq.com/oauth/token"
+
+# Tokens are treated as expired this long before GHL actually expires them
+EXPIRY_MARGIN = timedelta(minutes=5)
+
+# Seconds a cross-process refresh lock is held before another worker may take over
+REFRESH_LOCK_TIMEOUT = 30
+
+# Seconds the token request may take; kept below REFRESH_LOCK_TIMEOUT so a
+# holder's request can't still be in flight once its lock has expired
+REFRESH_REQUEST_TIMEOUT = 15
+
+# Seconds a waiter polls for a refresh running in another process
+REFRESH_WAIT_TIMEOUT = 35
+REFRESH_POLL_INTERVAL = 0.2
+
+
+CachedToken = namedtuple("CachedToken", ["location_id", "access_token", "expires_at"])
+
+
+_local_tokens = {}
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _cache_key(location_id):
+    return f"ghl:token:{location_id}"
+
+
+def _lock_key(location_id):
+    return f"ghl:token-refresh:{location_id}"
+
+
+def _get_local_lock(location_id):
+    with _local_locks_guard:
+        lock = _local_locks.get(location_id)
+        if lock is None:
+            lock = _local_locks[location_id] = threading.Lock()
+        return lock
+
+
+def _is_fresh(token, margin=EXPIRY_MARGIN):
+    return (
+        token is not None
+        and token.expires_at is not None
+        and token.expires_at - margin > timezone.now()
+    )
+
+
+def _remember(token):
+    """Store a token in process memory and in the shared cache until it expires"""
+    _local_tokens[token.location_id] = token
+    ttl = int((token.expires_at - timezone.now()).total_seconds())
+    if ttl > 0:
+        cache.set(_cache_key(token.location_id), tuple(token), timeout=ttl)
+
+
+def _from_cache(location_id):
+    token = _local_tokens.get(location_id)
+    if _is_fresh(token):
+        return token
+
+    cached = cache.get(_cache_key(location_id))
+    if cached:
+        token = CachedToken(*cached)
+        if _is_fresh(token):
+            _local_tokens[location_id] = token
+            return token
+    return None
+
+
+def _from_db(location_id):
+    credentials = GHLAuthCredentials.objects.only(
+        "location_id", "access_token", "expires_at"
+    ).get(location_id=location_id, is_approved=True)
+    return CachedToken(credentials.location_id, credentials.access_token, credentials.expires_at)
+
+
+def store_token_response(token_data, **extra_defaults):
+    """
+    Persist a ``/oauth/token`` response and prime the token cache with it.
+
+    Used both by the OAuth callback and by refreshes so every writer records
+    ``expires_at`` the same way.
+    """
+    expires_in = token_data.get("expires_in")
+    defaults = {
+        "access_token": token_data.get("access_token"),
+        "refresh_token": token_data.get("refresh_token"),
+        "expires_in": expires_in,
+        "expires_at": timezone.now() + timedelta(seconds=expires_in) if expires_in else None,
+        "scope": token_data.get("scope"),
+        "user_type": token_data.get("userType"),
+        "company_id": token_data.get("companyId"),
+        "user_id": token_data.get("userId"),
+    }
+    defaults.update(extra_defaults)
+
+    credentials, created = GHLAuthCredentials.objects.update_or_create(
+        location_id=token_data.get("locationId"),
+        defaults=defaults,
+    )
+
+    if credentials.is_approved and credentials.expires_at:
+        _remember(CachedToken(credentials.location_id, credentials.access_token, credentials.expires_at))
+
+    return credentials, created
+
+
+def _request_new_token(location_id):
+    credentials = GHLAuthCredentials.objects.get(location_id=location_id)
+
+    response = requests.post(TOKEN_URL, data={
+        "grant_type": "refresh_token",
+        "client_id": config("GHL_CLIENT_ID"),
+        "client_secret": config("GHL_CLIENT_SECRET"),
+        "refresh_token": credentials.refresh_token,
+    }, timeout=REFRESH_REQUEST_TIMEOUT)
+    token_data = response.json()
+
+    if not token_data.get("access_token"):
+        logger.error(f"Token refresh failed for location {location_id}: {response.status_code} {token_data}")
+        raise ValueError(f"Failed to refresh access token for location {location_id}")
+
+    # The token endpoint does not always echo the location back
+    token_data.setdefault("locationId", location_id)
+    credentials, _ = store_token_response(token_data)
+    logger.info(f"Refreshed access token for location {location_id}")
+
+    return CachedToken(credentials.location_id, credentials.access_token, credentials.expires_at)
+
+
+def _wait_for_refresh(location_id, margin):
+    """Wait for a refresh another process is running; None if it never lands"""
+    deadline = time.monotonic() + REFRESH_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(REFRESH_POLL_INTERVAL)
+
+        token = _from_cache(location_id)
+        if _is_fresh(token, margin):
+            return token
+
+        if cache.get(_lock_key(location_id)) is None:
+            # The holder finished (or died) without priming the cache
+            token = _from_db(location_id)
+            return token if _is_fresh(token, margin) else None
+    return None
+
+
+def refresh_credentials(location_id, min_remaining=EXPIRY_MARGIN):
+    """
+    Refresh a location's access token unless it is still valid for
+    ``min_remaining``. Concurrent callers share one ``/oauth/token`` request.
+    """
+    with _get_local_lock(location_id):
+        # Another thread may have refreshed while we waited for the lock
+        token = _from_cache(location_id) or _from_db(location_id)
+        if _is_fresh(token, min_remaining):
+            _remember(token)
+            return token
+
+        if not cache.add(_lock_key(location_id), "1", timeout=REFRESH_LOCK_TIMEOUT):
+            token = _wait_for_refresh(location_id, min_remaining)
+            if token:
+                return token
+
+            # The holder failed or its lock expired; refresh only if we can
+            # take the lock over, never alongside another holder
+            if not cache.add(_lock_key(location_id), "1", timeout=REFRESH_LOCK_TIMEOUT):
+                token = _from_db(location_id)
+                if _is_fresh(token, min_remaining):
+                    _remember(token)
+                    return token
+                logger.warning(f"Timed out waiting for token refresh of location {location_id}")
+                raise ValueError(f"Timed out waiting for token refresh of location {location_id}")
+
+        try:
+            return _request_new_token(location_id)
+        finally:
+            cache.delete(_lock_key(location_id))
+
+
+def get_credentials(location_id):
+    """
+    Return a valid ``CachedToken`` for an approved location, refreshing it
+    when it is about to expire.
+
+    Raises GHLAuthCredentials.DoesNotExist when the location is not connected.
+    """
+    token = _from_cache(location_id)
+    if token:
+        return token
+
+    token = _from_db(location_id)
+    if _is_fresh(token):
+        _remember(token)
+        return token
+
+    return refresh_credentials(location_id)
+
+
+def get_access_token(location_id):
+    return get_credentials(location_id).access_token
+
+
+def invalidate(location_id):
+    """Drop a location's cached token, e.g. after it was revoked or disapproved"""
+    _local_tokens.pop(location_id, None)
+    cache.delete(_cache_key(location_id))
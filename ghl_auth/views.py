@@ -7,12 +7,13 @@ from django.shortcuts import redirect, render
 from ghl_auth.models import GHLAuthCredentials
 from django.views.decorators.csrf import csrf_exempt
 from ghl_auth.services import get_location_name
+from ghl_auth.token_provider import store_token_response, get_access_token
 from urllib.parse import urlencode
 from accounts.tasks import async_fetch_all_contacts
 
 from django.views import View
 from django.utils.decorators import method_decorator
-from accounts.models import GHLUser
+from accounts.services import upsert_location_users
 from ghl_auth.services import create_or_update_contact, delete_contact
 
 
@@ -79,19 +80,10 @@ def tokens(request):
         location_name, timezone = get_location_name(location_id=response_data.get("locationId"), access_token=response_data.get('access_token'))
         
 
-        obj, created = GHLAuthCredentials.objects.update_or_create(
-            location_id= response_data.get("locationId"),
-            defaults={
-                "access_token": response_data.get("access_token"),
-                "refresh_token": response_data.get("refresh_token"),
-                "expires_in": response_data.get("expires_in"),
-                "scope": response_data.get("scope"),
-                "user_type": response_data.get("userType"),
-                "company_id": response_data.get("companyId"),
-                "user_id":response_data.get("userId"),
-                "location_name":location_name,
-                "timezone": timezone
-            }
+        obj, created = store_token_response(
+            response_data,
+            location_name=location_name,
+            timezone=timezone
         )
 
         async_fetch_all_contacts.delay(
@@ -149,7 +141,7 @@ class GhlWebhookView(View):
 
         headers = {
         'Accept': 'application/json',
-        'Authorization': f'Bearer {token.access_token}',
+        'Authorization': f'Bearer {get_access_token(token.location_id)}',
         'Version': '2021-07-28'  # or '2021-04-15' for calendars endpoint
         }
 
@@ -159,17 +151,6 @@ class GhlWebhookView(View):
         )
 
         user = user_response.json()
-        user_id = user["id"]
-        GHLUser.objects.update_or_create(
-            user_id=user_id,
-            defaults={
-                "first_name": user.get("firstName", ""),
-                "last_name": user.get("lastName", ""),
-                "name": user.get("name", ""),
-                "email": user.get("email", ""),
-                "phone": user.get("phone", ""),
-                "location_id": token.location_id,
-            }
-        )
+        upsert_location_users(token.location_id, [user])
 
     
\ No newline at end of file